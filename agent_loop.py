@@ -0,0 +1,216 @@
+# agent_loop.py
+# Iterative converse -> tool -> converse loop สำหรับหนึ่ง user turn (ใช้ร่วมกันระหว่าง CLI demo และ Streamlit)
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import pytz
+from tools.deadline import Deadline
+from tools.serialization import ToolResult
+from tools.timezone_index import get_zone
+from bedrock_config import MAX_RECURSIONS, COMPACT_TOOL_RESULTS
+
+# เวลาขั้นต่ำที่ต้องเหลือก่อนจะส่ง converse รอบใหม่ (วินาที)
+MIN_BEDROCK_BUDGET = 1.5
+# เวลาขั้นต่ำที่ต้องเหลือก่อนจะเรียก tool
+MIN_TOOL_BUDGET = 0.5
+
+# token counters ที่รวมจาก usage ของทุก converse round (cache* มาจาก prompt caching)
+USAGE_KEYS = ("inputTokens", "outputTokens", "cacheReadInputTokens", "cacheWriteInputTokens")
+
+
+def _local_time(dt, tz_name, fmt):
+    if dt is None:
+        return "N/A"
+    try:
+        tz = get_zone(tz_name) if tz_name else pytz.utc
+    except pytz.UnknownTimeZoneError:
+        tz = pytz.utc
+    return datetime.fromtimestamp(dt, tz).strftime(fmt)
+
+
+def _format_time_result(result: Dict[str, Any]) -> str:
+    if result.get("error"):
+        return f"❌ Error getting time: {result.get('message', 'Unknown error')}"
+    if "results" in result:
+        lines = []
+        for item in result["results"]:
+            label = item.get("label") or item.get("timezone") or "?"
+            lines.append(f"- {label}: " + (f"❌ {item.get('message')}" if item.get("error") else item.get("current_time", "N/A")))
+        return "🕐 **เวลาปัจจุบัน:**\n" + "\n".join(lines)
+    note = " (โดยประมาณ)" if result.get("approximate") else ""
+    return f"🕐 Current time in {result.get('timezone', 'Asia/Bangkok')}{note}: {result.get('current_time', 'N/A')}"
+
+
+def _format_weather_result(result: ToolResult) -> str:
+    value = result.value
+    if value.get("error"):
+        return f"❌ Error getting weather: {value.get('message', 'Unknown error')}"
+    weather = result.compact
+    if weather is None:
+        error = (value.get("weather_data") or {}).get("daily_error") or {}
+        return f"❌ Weather data unavailable: {error.get('message', 'Unknown error')}"
+
+    place = weather.location or (f"{weather.lat}, {weather.lon}" if weather.lat is not None else "")
+    lines = [f"🌤️ **สภาพอากาศ {place}**" + (" (ข้อมูลที่เก็บไว้)" if weather.from_cache else "")]
+    if weather.current:
+        c = weather.current
+        lines.append(f"ตอนนี้: {c.description or 'N/A'}, {c.temp}°C (รู้สึกเหมือน {c.feels_like}°C), "
+                     f"ความชื้น {c.humidity}%, ลม {c.wind_speed} m/s")
+    if weather.next_hour is not None:
+        n = weather.next_hour
+        lines.append(f"ชั่วโมงหน้า: ฝน {n.minutes_with_precipitation} นาที (สูงสุด {n.max_mm_per_hour} mm/h)"
+                     if n.minutes_with_precipitation else "ชั่วโมงหน้า: ไม่มีฝน")
+    for h in weather.hourly[:12]:
+        lines.append(f"- {_local_time(h.dt, weather.timezone, '%H:%M')}: {h.description or 'N/A'}, {h.temp}°C, "
+                     f"โอกาสฝน {round((h.pop or 0) * 100)}%")
+    for day in weather.daily:
+        lines.append(f"- {_local_time(day.dt, weather.timezone, '%d-%m-%Y')}: {day.description or 'N/A'}, "
+                     f"{day.temp_min}–{day.temp_max}°C, โอกาสฝน {round((day.pop or 0) * 100)}%")
+    for alert in weather.alerts:
+        lines.append(f"⚠️ {alert.event} ({alert.sender})")
+    return "\n".join(lines)
+
+
+def format_tool_answer(tool_info: Dict[str, Any]) -> str:
+    """
+    Plain answer built from the last tool result (used when a turn stops before the model phrased one).
+    Weather results are rendered from ToolResult.compact (One Call current/hourly/daily/alerts or the
+    current-weather fallback).
+    """
+    result = tool_info.get("encoded_result") or ToolResult(tool_info.get("tool_result") or {})
+    if tool_info.get("tool_called") == "Time_Tool":
+        return _format_time_result(result.value)
+    if tool_info.get("tool_called") == "Weather_Tool":
+        return _format_weather_result(result)
+    return "✅ Tool executed successfully"
+
+
+class AgentLoop:
+    """
+    State machine for one agent turn:
+        SEND -> (tool_use) TOOLS -> SEND -> ... -> DONE
+    Stops at end_turn, after max_rounds converse calls, or when the deadline runs out (or is cancelled).
+    On a stop other than end_turn the best partial answer seen so far is returned.
+    """
+
+    SEND = "send"
+    TOOLS = "tools"
+    DONE = "done"
+
+    def __init__(self,
+                 send: Callable[[List[Dict[str, Any]], Deadline], Dict[str, Any]],
+                 invoke_tool: Callable[[Dict[str, Any], Deadline], Dict[str, Any]],
+                 max_rounds: int = MAX_RECURSIONS,
+                 on_event: Optional[Callable[[str, Any], None]] = None,
+                 format_partial: Optional[Callable[[Dict[str, Any]], str]] = None):
+        self.send = send
+        self.invoke_tool = invoke_tool
+        self.max_rounds = max_rounds
+        self.on_event = on_event or (lambda kind, payload: None)
+        self.format_partial = format_partial or format_tool_answer
+
+    def run(self, conversation: List[Dict[str, Any]], deadline: Deadline) -> Dict[str, Any]:
+        state = AgentLoop.SEND
+        rounds = 0
+        stop_reason = None
+        final_text = None
+        partial_texts: List[str] = []
+        last_message = None
+        tool_info = {"tool_called": None, "tool_input": None, "tool_result": None, "encoded_result": None}
+        usage = {key: 0 for key in USAGE_KEYS}
+        routing = []
+
+        while state != AgentLoop.DONE:
+            if state == AgentLoop.SEND:
+                if rounds >= self.max_rounds:
+                    stop_reason = "max_rounds"
+                    break
+                if deadline.expired(margin=MIN_BEDROCK_BUDGET):
+                    stop_reason = "cancelled" if deadline.cancelled else "deadline"
+                    break
+                self.on_event("call_to_bedrock", conversation)
+                model_response = self.send(conversation, deadline)
+                rounds += 1
+                for key, value in (model_response.get("usage") or {}).items():
+                    if key in usage:
+                        usage[key] += value
+                if model_response.get("routing"):
+                    routing.append(model_response["routing"])
+                    self.on_event("routing", model_response["routing"])
+
+                last_message = model_response["output"]["message"]
+                conversation.append(last_message)
+                model_stop = model_response.get("stopReason")
+                if model_stop == "tool_use":
+                    state = AgentLoop.TOOLS
+                else:
+                    texts = [b["text"] for b in last_message.get("content", []) if "text" in b]
+                    final_text = texts[0] if texts else ""
+                    stop_reason = model_stop
+                    state = AgentLoop.DONE
+
+            elif state == AgentLoop.TOOLS:
+                tool_results = []
+                for content_block in last_message["content"]:
+                    if "text" in content_block:
+                        partial_texts.append(content_block["text"])
+                        self.on_event("model_text", content_block["text"])
+                    if "toolUse" in content_block:
+                        tool_use = content_block["toolUse"]
+                        if deadline.expired(margin=MIN_TOOL_BUDGET):
+                            content = {"error": "deadline_exceeded", "message": "Time budget exhausted before the tool could run."}
+                        else:
+                            self.on_event("tool_use", tool_use)
+                            content = self.invoke_tool(tool_use, deadline)["content"]
+                        # encode ครั้งเดียวแล้วใช้ bytes ซ้ำ (payload store / API); model ได้รูปแบบ compact
+                        result = content if isinstance(content, ToolResult) else ToolResult(content)
+                        tool_info = {
+                            "tool_called": tool_use["name"],
+                            "tool_input": tool_use.get("input", {}),
+                            "tool_result": result.value,
+                            "encoded_result": result,
+                        }
+                        tool_results.append({
+                            "toolResult": {
+                                "toolUseId": tool_use["toolUseId"],
+                                "content": [result.model_content(compact=COMPACT_TOOL_RESULTS)],
+                            }
+                        })
+
+                if not tool_results:
+                    stop_reason = "no_tool_use"
+                    break
+                conversation.append({"role": "user", "content": tool_results})
+                state = AgentLoop.SEND
+
+        partial = stop_reason in ("deadline", "cancelled", "max_rounds", "no_tool_use")
+        if partial:
+            final_text = self._best_partial(partial_texts, tool_info, stop_reason)
+            if conversation and conversation[-1]["role"] == "user":
+                # จบกลางคัน (หลัง toolResult หรือก่อน converse รอบแรก): ปิด turn ด้วยคำตอบบางส่วน
+                # เพื่อให้ข้อความถัดไปของผู้ใช้ไม่กลายเป็น user message ซ้อนกัน (Converse จะตอบ ValidationException)
+                conversation.append({"role": "assistant", "content": [{"text": final_text}]})
+
+        return {
+            "success": True,
+            "response": final_text if final_text is not None else "Model response processed",
+            "conversation": conversation,
+            "stop_reason": stop_reason,
+            "partial": partial,
+            "rounds": rounds,
+            "elapsed": round(deadline.elapsed(), 3),
+            "usage": usage,
+            "routing": routing,
+            **tool_info,
+        }
+
+    def _best_partial(self, partial_texts, tool_info, stop_reason):
+        # ลำดับความสำคัญ: ผลลัพธ์ของ tool ที่จัดรูปแล้ว -> ข้อความล่าสุดของ model -> ข้อความทั่วไป
+        if tool_info["tool_called"] and self.format_partial:
+            return self.format_partial(tool_info)
+        if partial_texts:
+            return partial_texts[-1]
+        if stop_reason == "deadline":
+            return "Sorry, the request ran out of time before an answer was ready."
+        if stop_reason == "cancelled":
+            return "Request cancelled."
+        return "Maximum recursion reached."
@@ -1,45 +1,97 @@
 # backend/agent_server.py
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import Dict, Any
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
 from tools.weather_tool import WeatherTool
 from tools.time_tool import TimeTool
-from bedrock_config import SYSTEM_PROMPT
+from tools.deadline import Deadline
+from tools.serialization import ToolResult, dumps, encode_with
+from tools.profiling import get_profile_store, profile_turn
+from bedrock_config import SYSTEM_PROMPT, AGENT_DEADLINE_SECONDS
+from backend.http_cache import forecast_timestamp, parts_fetched_at, make_etag, cache_headers, is_not_modified
+from backend.session_store import SessionStore
+from backend.alerts import AlertScheduler, SubscriptionRegistry, Thresholds, webhook_error
+from backend.tool_choice import decide_tool_ai, has_location, is_follow_up
+from env_setup import Config
 import uuid
 
-app = FastAPI(title="AI Agent ToolUse Demo")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with tools.serialization (orjson when installed).
+    ToolResult values are written from their pre-encoded bytes instead of being encoded again.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, ToolResult):
+            return content.encoded
+        if isinstance(content, dict):
+            fragments = {k: v.encoded for k, v in content.items() if isinstance(v, ToolResult)}
+            if fragments:
+                return encode_with(content, fragments)
+        return dumps(content)
+
+
+app = FastAPI(title="AI Agent ToolUse Demo", default_response_class=FastJSONResponse)
+
+# บีบอัด response ขนาดใหญ่: ใช้ brotli ถ้าติดตั้ง brotli-asgi ไว้ (fallback เป็น gzip ในตัว)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1024, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 MAX_RECURSIONS = 5
 
 class UserMessage(BaseModel):
     text: str
+    session_id: Optional[str] = None
+    profile: bool = False
 
-# ---------------- AI Agent ----------------
-def decide_tool_ai(user_text: str) -> Dict[str, Any]:
-    """
-    AI Agent วิเคราะห์เองเพื่อเลือก Tool
-    heuristic: ถ้ามีเลข lat/lon หรือ city -> Weather_Tool, else -> Time_Tool
-    """
-    import re
-    latlon_match = re.findall(r"(-?\d+\.?\d*)", user_text)
-    city_match = re.findall(r"[ก-๙a-zA-Z\s]{2,20}", user_text)
+class AlertThresholds(BaseModel):
+    # ช่วงค่าเดียวกับ Thresholds.BOUNDS -> ค่านอกช่วง (เช่น rain_probability=60) ได้ 422 แทนที่จะไม่มีวันแจ้งเตือน
+    rain_probability: Optional[float] = Field(None, ge=Thresholds.BOUNDS["rain_probability"][0],
+                                              le=Thresholds.BOUNDS["rain_probability"][1])   # 0..1
+    heat_index: Optional[float] = Field(None, ge=Thresholds.BOUNDS["heat_index"][0],
+                                        le=Thresholds.BOUNDS["heat_index"][1])               # °C
+    wind_speed: Optional[float] = Field(None, ge=Thresholds.BOUNDS["wind_speed"][0],
+                                        le=Thresholds.BOUNDS["wind_speed"][1])               # m/s
+    official_alerts: bool = False
+
+class AlertSubscriptionRequest(BaseModel):
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    city: Optional[str] = None
+    label: Optional[str] = None
+    webhook_url: Optional[str] = None
+    thresholds: AlertThresholds
+
+sessions = SessionStore()
 
-    if latlon_match and len(latlon_match) >= 2:
-        return {"name": "Weather_Tool", "input": {"latitude": latlon_match[0], "longitude": latlon_match[1], "cnt": 3}, "toolUseId": str(uuid.uuid4())}
-    elif city_match:
-        city = city_match[0].strip()
-        return {"name": "Weather_Tool", "input": {"city": city, "cnt": 3}, "toolUseId": str(uuid.uuid4())}
+# alert subscriptions: scheduler ดึงข้อมูลครั้งเดียวต่อ grid cell แล้วแจ้งเฉพาะเมื่อสถานะเปลี่ยน
+alert_registry = SubscriptionRegistry()
+alert_scheduler = AlertScheduler(alert_registry)
 
-    # fallback
-    return {"name": "Time_Tool", "input": {"timezone": "Asia/Bangkok"}, "toolUseId": str(uuid.uuid4())}
+@app.on_event("startup")
+def start_alert_scheduler():
+    if Config.ALERT_SCHEDULER_ENABLED:
+        alert_scheduler.start()
 
-def invoke_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
+@app.on_event("shutdown")
+def stop_alert_scheduler():
+    alert_scheduler.stop()
+
+# ---------------- AI Agent ----------------
+# decide_tool_ai / is_follow_up อยู่ใน backend/tool_choice.py
+def invoke_tool(payload: Dict[str, Any], deadline: Deadline = None) -> Dict[str, Any]:
     tool_name = payload["name"]
     input_data = payload.get("input", {})
     tool_id = payload["toolUseId"]
 
     if tool_name == "Weather_Tool":
-        result = WeatherTool.fetch_weather_data(input_data)
+        result = WeatherTool.fetch_weather_data(input_data, deadline=deadline)
     elif tool_name == "Time_Tool":
         result = TimeTool.fetch_time_data(input_data)
     else:
@@ -47,22 +99,182 @@ def invoke_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
 
     return {"toolUseId": tool_id, "content": result}
 
-def process_agent(user_text: str, recursion: int = MAX_RECURSIONS) -> Dict[str, Any]:
+def process_agent(user_text: str, recursion: int = MAX_RECURSIONS, deadline: Deadline = None,
+                  previous_turn: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     if recursion <= 0:
         return {"error": "max_recursion", "message": "Maximum recursion reached."}
+    if deadline is None:
+        deadline = Deadline(AGENT_DEADLINE_SECONDS)
 
     tool_payload = decide_tool_ai(user_text)
-    tool_result = invoke_tool(tool_payload)
+    if previous_turn and is_follow_up(user_text) and not has_location(tool_payload):
+        # คำถามต่อเนื่องที่ไม่ระบุสถานที่ใหม่: ใช้ tool และ input เดิมจาก session (intent ใหม่ เช่น "พรุ่งนี้" ทับของเดิม)
+        input_data = dict(previous_turn["tool_input"])
+        if previous_turn["tool_called"] == "Weather_Tool":
+            input_data.update(WeatherTool.parse_intent(user_text))
+        tool_payload = {"name": previous_turn["tool_called"], "input": input_data, "toolUseId": str(uuid.uuid4())}
+    tool_result = invoke_tool(tool_payload, deadline)
     return {
         "user_input": user_text,
         "tool_called": tool_payload["name"],
         "tool_input": tool_payload.get("input", {}),
-        "tool_result": tool_result["content"],
+        "tool_result": ToolResult(tool_result["content"]),
         "system_prompt": SYSTEM_PROMPT
     }
 
 # ---------------- FastAPI endpoint ----------------
+def profile_requested(request: Request, flag: bool = False) -> bool:
+    """Profile this request when the body/query flag is set or the client sends `X-Profile: 1`."""
+    return flag or request.headers.get("x-profile", "").lower() in ("1", "true", "yes")
+
+def conditional_response(request: Request, content: Any, tool_result: Dict[str, Any], *key_parts,
+                         shared: bool = True) -> Response:
+    """
+    Attach ETag/Last-Modified/Cache-Control derived from the forecast timestamp (current.dt) and
+    the fetch time of every One Call part in the result (parts have their own cache TTLs, so e.g.
+    minutely can refresh while current is still cached). max-age ends when the first part expires.
+    Returns 304 with no body when the client already holds this forecast.
+    shared=False (POST /chat_agent): Cache-Control is private and only If-None-Match is honoured,
+    since the ETag is keyed by the query but Last-Modified is not.
+    """
+    ts = forecast_timestamp(tool_result)
+    if ts is None:
+        return FastJSONResponse(content)
+    fetched = parts_fetched_at(tool_result)
+    modified = max([ts, *fetched.values()])
+    # รวม shape ของผลลัพธ์ (forecast / fallback / stale cache) ไว้ใน ETag ด้วย
+    shape = sorted((tool_result.get("weather_data") or {}).keys())
+    etag = make_etag(ts, shape, fetched, *key_parts)
+    headers = cache_headers(modified, etag, shared=shared, max_age_cap=WeatherTool.parts_max_age(fetched))
+    if is_not_modified(request.headers, etag, modified, use_modified_since=shared):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
 @app.post("/chat_agent")
-def chat_agent(msg: UserMessage):
-    response = process_agent(msg.text, MAX_RECURSIONS)
-    return response
+def chat_agent(msg: UserMessage, request: Request):
+    # ไม่มี session_id -> ตอบแบบ stateless (ไม่สร้าง session ที่ client ไม่ได้ขอ)
+    session_id = msg.session_id
+    previous_turn = None
+    if session_id:
+        previous_turn = sessions.last_turn(session_id, lambda t: t["role"] == "assistant" and t.get("tool_called"))
+    with profile_turn("chat_agent", requested=profile_requested(request, msg.profile)) as turn:
+        response = process_agent(msg.text, MAX_RECURSIONS, previous_turn=previous_turn)
+    tool_result = response["tool_result"].value
+
+    if session_id:
+        # เก็บเฉพาะ tool + input ใน session (ไม่เก็บ raw tool_result) เพื่อให้ hot tier เล็ก
+        sessions.append(session_id, {"role": "user", "text": msg.text})
+        response["turn"] = sessions.append(session_id, {
+            "role": "assistant",
+            "tool_called": response.get("tool_called"),
+            "tool_input": response.get("tool_input"),
+            "error": tool_result.get("error"),
+        })
+        response["session_id"] = session_id
+    if turn is not None and turn.reason == "requested":
+        # profile ที่ขอมาจะส่งกลับใน body เสมอ (ไม่ตอบ 304)
+        response["profile"] = turn.summary()
+        return FastJSONResponse(response, headers={"X-Profile-File": turn.file})
+    if response.get("tool_called") != "Weather_Tool":
+        return FastJSONResponse(response)
+    # ETag ขึ้นกับคำถามและ input ที่ใช้จริงเท่านั้น (ไม่รวม session_id) เพื่อให้ poll ซ้ำได้ 304
+    return conditional_response(request, response, tool_result, msg.text, response["tool_input"], shared=False)
+
+@app.post("/sessions")
+def create_session():
+    # session_id สำหรับ POST /chat_agent (client จะตั้งเองก็ได้)
+    return {"session_id": SessionStore.new_session_id()}
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    return {"session_id": session_id, "turns": sessions.get(session_id)}
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    sessions.delete(session_id)
+    return {"session_id": session_id, "deleted": True}
+
+@app.get("/weather")
+def weather(request: Request, city: Optional[str] = None, latitude: Optional[str] = None,
+            longitude: Optional[str] = None, cnt: int = 3, intent: Optional[str] = None,
+            hours: Optional[int] = None, include_alerts: bool = False, profile: bool = False):
+    input_data = {"city": city, "latitude": latitude, "longitude": longitude, "cnt": cnt,
+                  "intent": intent, "hours": hours, "include_alerts": include_alerts or None}
+    input_data = {k: v for k, v in input_data.items() if v is not None}
+    with profile_turn("weather", requested=profile_requested(request, profile)) as turn:
+        result = WeatherTool.fetch_weather_data(input_data, deadline=Deadline(AGENT_DEADLINE_SECONDS))
+    # body เป็นผลพยากรณ์เดิม; ไฟล์ profile ดึงได้จาก GET /profiles/{name}
+    headers = {"X-Profile-File": turn.file} if turn is not None and turn.reason == "requested" else None
+    if result.get("error"):
+        return FastJSONResponse(result, status_code=400 if result["error"] == "invalid_input" else 502, headers=headers)
+    if headers:
+        return FastJSONResponse(ToolResult(result), headers=headers)
+    return conditional_response(request, ToolResult(result), result, input_data)
+
+@app.post("/alerts/subscriptions")
+def create_alert_subscription(req: AlertSubscriptionRequest):
+    thresholds = Thresholds.from_dict(req.thresholds.dict())
+    if thresholds.is_empty():
+        return FastJSONResponse({"error": "invalid_input", "message": "Set at least one threshold."}, status_code=400)
+    error = thresholds.error()
+    if error:
+        return FastJSONResponse({"error": "invalid_input", "message": error}, status_code=400)
+    if req.webhook_url:
+        error = webhook_error(req.webhook_url)
+        if error:
+            return FastJSONResponse({"error": "invalid_webhook_url", "message": error}, status_code=400)
+    lat, lon, label = req.latitude, req.longitude, req.label
+    if lat is None or lon is None:
+        if not req.city:
+            return FastJSONResponse({"error": "invalid_input", "message": "Provide 'city' or both 'latitude' and 'longitude'."}, status_code=400)
+        ge = WeatherTool._geocode_location(req.city, WeatherTool._get_api_key())
+        if ge.get("error"):
+            return FastJSONResponse({"error": ge["error"], "message": ge.get("message")}, status_code=502)
+        lat, lon, label = ge["lat"], ge["lon"], label or req.city
+    sub = alert_registry.add(lat, lon, thresholds, label=label, webhook_url=req.webhook_url)
+    return dict(sub.to_dict(), cell=alert_registry.cell_center(sub.cell))
+
+@app.get("/alerts/subscriptions/{sub_id}")
+def get_alert_subscription(sub_id: str):
+    sub = alert_registry.get(sub_id)
+    if sub is None:
+        raise HTTPException(status_code=404, detail="subscription not found")
+    return dict(sub.to_dict(), cell=alert_registry.cell_center(sub.cell), state=sub.last_state)
+
+@app.get("/alerts/subscriptions/{sub_id}/events")
+def get_alert_events(sub_id: str, since: int = 0):
+    # client จำ seq ล่าสุดไว้แล้วส่ง since=seq+1 ในรอบถัดไป
+    events = alert_scheduler.events(sub_id, since)
+    if events is None:
+        raise HTTPException(status_code=404, detail="subscription not found")
+    return {"subscription_id": sub_id, "events": events}
+
+@app.delete("/alerts/subscriptions/{sub_id}")
+def delete_alert_subscription(sub_id: str):
+    return {"subscription_id": sub_id, "deleted": alert_registry.remove(sub_id)}
+
+@app.get("/stats/alerts")
+def alert_stats():
+    return alert_scheduler.stats()
+
+@app.get("/stats/sessions")
+def session_stats():
+    return sessions.stats()
+
+@app.get("/stats/weather")
+def weather_stats():
+    # counters ของแต่ละ path (One Call / fallback / cache) และสถานะ circuit breaker
+    return WeatherTool.get_path_stats()
+
+@app.get("/profiles")
+def list_profiles():
+    # ไฟล์ .prof ล่าสุด (ทั้งที่ขอผ่าน X-Profile และที่สุ่มตาม PROFILE_SAMPLE_RATE)
+    store = get_profile_store()
+    return {"directory": store.directory, "keep": store.keep, "profiles": store.list()}
+
+@app.get("/profiles/{name}")
+def get_profile(name: str):
+    path = get_profile_store().path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
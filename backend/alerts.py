@@ -0,0 +1,455 @@
+# backend/alerts.py
+# Weather alert subscriptions: ลงทะเบียน location + threshold, scheduler ดึง One Call ครั้งเดียวต่อ grid cell
+# แล้ว diff กับ snapshot ก่อนหน้า แจ้งเตือนเฉพาะเมื่อสถานะเปลี่ยน (outbox ในหน่วยความจำ + webhook)
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import requests
+from env_setup import Config
+from tools.serialization import dumps
+from tools.weather_tool import WeatherTool
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alert_subscriptions (
+    id      TEXT PRIMARY KEY,
+    payload TEXT NOT NULL
+);
+"""
+
+Cell = Tuple[int, int]
+
+
+def heat_index_c(temp_c: float, humidity: float) -> float:
+    """NOAA heat index (Rothfusz regression) in °C; below ~27°C the air temperature is returned."""
+    t = temp_c * 9 / 5 + 32
+    if t < 80:
+        return temp_c
+    rh = humidity
+    hi = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh - 6.83783e-3 * t * t
+          - 5.481717e-2 * rh * rh + 1.22874e-3 * t * t * rh + 8.5282e-4 * t * rh * rh - 1.99e-6 * t * t * rh * rh)
+    if rh < 13 and t <= 112:
+        hi -= ((13 - rh) / 4) * math.sqrt((17 - abs(t - 95)) / 17)
+    elif rh > 85 and t <= 87:
+        hi += ((rh - 85) / 10) * ((87 - t) / 5)
+    return (hi - 32) * 5 / 9
+
+
+def webhook_error(url: str, allowed_hosts: str = None) -> Optional[str]:
+    """
+    Why url may not be used as a webhook (None = allowed). The server POSTs to it, so only https
+    URLs on ALERT_WEBHOOK_ALLOWED_HOSTS are accepted (no requests to internal hosts on a client's behalf).
+    """
+    allowed_hosts = Config.ALERT_WEBHOOK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    allowed = [h.strip().lower() for h in allowed_hosts.split(",") if h.strip()]
+    if not allowed:
+        return "Webhooks are disabled (ALERT_WEBHOOK_ALLOWED_HOSTS is not set)."
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        parts.port  # ValueError when the port is malformed
+    except ValueError:
+        return "Invalid webhook_url."
+    if parts.scheme != "https" or not host or parts.username or parts.password:
+        return "webhook_url must be an https URL without credentials."
+    for entry in allowed:
+        if host == entry or (entry.startswith(".") and host.endswith(entry)):
+            return None
+    return f"Webhook host '{host}' is not in ALERT_WEBHOOK_ALLOWED_HOSTS."
+
+
+class Thresholds:
+    """What a subscriber wants to hear about; None / False = not watched."""
+
+    FIELDS = ("rain_probability", "heat_index", "wind_speed", "official_alerts")
+    # ช่วงค่าที่ยอมรับ (min, max): rain เป็นสัดส่วน 0..1 เหมือน One Call `pop` (60 = เปอร์เซ็นต์ ไม่ใช่ 0.6)
+    BOUNDS = {
+        "rain_probability": (0.0, 1.0),
+        "heat_index": (-50.0, 80.0),    # °C
+        "wind_speed": (0.0, 120.0),     # m/s
+    }
+
+    def __init__(self, rain_probability: float = None, heat_index: float = None, wind_speed: float = None,
+                 official_alerts: bool = False):
+        self.rain_probability = rain_probability    # 0..1 (One Call `pop`)
+        self.heat_index = heat_index                # °C
+        self.wind_speed = wind_speed                # m/s
+        self.official_alerts = bool(official_alerts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f: getattr(self, f) for f in Thresholds.FIELDS}
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "Thresholds":
+        return Thresholds(**{f: data.get(f) for f in Thresholds.FIELDS if data.get(f) is not None})
+
+    def is_empty(self) -> bool:
+        return self.rain_probability is None and self.heat_index is None and self.wind_speed is None \
+            and not self.official_alerts
+
+    def error(self) -> Optional[str]:
+        """Why these thresholds cannot be watched (None = valid)."""
+        for field, (low, high) in Thresholds.BOUNDS.items():
+            value = getattr(self, field)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+                return f"{field} must be a number."
+            if not low <= value <= high:
+                hint = " (a fraction: 0.6 means 60%)" if field == "rain_probability" else ""
+                return f"{field} must be between {low:g} and {high:g}{hint}."
+        return None
+
+
+class Subscription:
+    __slots__ = ("id", "lat", "lon", "label", "thresholds", "webhook_url", "created_at",
+                 "cell", "last_state", "events", "next_seq")
+
+    def __init__(self, id: str, lat: float, lon: float, thresholds: Thresholds, label: str = None,
+                 webhook_url: str = None, created_at: float = None):
+        self.id = id
+        self.lat = float(lat)
+        self.lon = float(lon)
+        self.label = label
+        self.thresholds = thresholds
+        self.webhook_url = webhook_url
+        self.created_at = created_at or time.time()
+        self.cell = None
+        # สถานะล่าสุดที่ประเมินได้ (None = ยังไม่เคยประเมิน) และ outbox ของ event
+        self.last_state: Optional[Dict[str, Any]] = None
+        self.events = deque(maxlen=Config.ALERT_EVENTS_MAX)
+        self.next_seq = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "latitude": self.lat, "longitude": self.lon, "label": self.label,
+            "thresholds": self.thresholds.to_dict(), "webhook_url": self.webhook_url, "created_at": self.created_at,
+        }
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> "Subscription":
+        return Subscription(data["id"], data["latitude"], data["longitude"], Thresholds.from_dict(data["thresholds"]),
+                            data.get("label"), data.get("webhook_url"), data.get("created_at"))
+
+
+class SubscriptionRegistry:
+    """
+    Subscriptions by id and by grid cell (ALERT_GRID_DEGREES, ~11 km at 0.1°).
+    Definitions are persisted in SQLite; evaluation state and event outboxes live in memory,
+    so after a restart currently active conditions are reported once more.
+    """
+
+    def __init__(self, path: str = None, grid_degrees: float = None):
+        self.path = path or Config.ALERT_DB_PATH
+        self.grid = grid_degrees or Config.ALERT_GRID_DEGREES
+        self._subs: Dict[str, Subscription] = {}
+        self._cells: Dict[Cell, Dict[str, Subscription]] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        for (payload,) in self._db.execute("SELECT payload FROM alert_subscriptions"):
+            self._index(Subscription.from_dict(json.loads(payload)))
+
+    def cell_of(self, lat: float, lon: float) -> Cell:
+        return (int(math.floor(lat / self.grid)), int(math.floor(lon / self.grid)))
+
+    def cell_center(self, cell: Cell) -> Tuple[float, float]:
+        return (round((cell[0] + 0.5) * self.grid, 4), round((cell[1] + 0.5) * self.grid, 4))
+
+    def _index(self, sub: Subscription):
+        sub.cell = self.cell_of(sub.lat, sub.lon)
+        self._subs[sub.id] = sub
+        self._cells.setdefault(sub.cell, {})[sub.id] = sub
+
+    def add(self, lat: float, lon: float, thresholds: Thresholds, label: str = None,
+            webhook_url: str = None) -> Subscription:
+        sub = Subscription(uuid.uuid4().hex, lat, lon, thresholds, label, webhook_url)
+        with self._lock:
+            self._db.execute("INSERT INTO alert_subscriptions (id, payload) VALUES (?, ?)",
+                             (sub.id, json.dumps(sub.to_dict(), ensure_ascii=False)))
+            self._index(sub)
+        return sub
+
+    def remove(self, sub_id: str) -> bool:
+        with self._lock:
+            sub = self._subs.pop(sub_id, None)
+            if sub is None:
+                return False
+            members = self._cells.get(sub.cell)
+            if members is not None:
+                members.pop(sub_id, None)
+                if not members:
+                    del self._cells[sub.cell]
+            self._db.execute("DELETE FROM alert_subscriptions WHERE id = ?", (sub_id,))
+            return True
+
+    def get(self, sub_id: str) -> Optional[Subscription]:
+        with self._lock:
+            return self._subs.get(sub_id)
+
+    def cells(self) -> List[Tuple[Cell, List[Subscription]]]:
+        """Snapshot of (cell, subscriptions) pairs for one scheduler pass."""
+        with self._lock:
+            return [(cell, list(members.values())) for cell, members in self._cells.items()]
+
+    def __len__(self):
+        return len(self._subs)
+
+
+# ---------------- Snapshot evaluation / diff ----------------
+def trim_snapshot(onecall: Dict[str, Any], horizon_hours: int) -> Dict[str, Any]:
+    """Only the parts alerts are evaluated on (kept per cell between passes)."""
+    return {
+        "current": onecall.get("current") or {},
+        "hourly": (onecall.get("hourly") or [])[:horizon_hours],
+        "alerts": onecall.get("alerts") or [],
+    }
+
+
+def fingerprint(snapshot: Dict[str, Any]) -> str:
+    # `current.dt` เปลี่ยนทุก ~10 นาทีแม้ค่าไม่เปลี่ยน จึงไม่รวมไว้
+    body = dict(snapshot, current={k: v for k, v in snapshot["current"].items() if k != "dt"})
+    return hashlib.sha1(dumps(body)).hexdigest()
+
+
+# เวลาที่เลื่อนไปตาม sliding window ทุกรอบ (ชั่วโมงแรกที่เข้าเงื่อนไข / ชั่วโมงที่ค่าสูงสุด) -> แสดงใน event แต่ไม่ใช้ diff
+MOVING_FIELDS = ("from", "at")
+
+
+def _onset(points: List[Dict[str, Any]], hits: List[Dict[str, Any]]) -> Any:
+    # เข้าเงื่อนไขตั้งแต่จุดแรกของ window แล้ว = "ongoing"; ยังไม่เริ่ม = เวลาเริ่ม (คงที่ถ้าพยากรณ์ไม่เปลี่ยน)
+    return "ongoing" if hits[0] is points[0] else hits[0].get("dt")
+
+
+def evaluate(snapshot: Dict[str, Any], thresholds: Thresholds) -> Dict[str, Any]:
+    """
+    Conditions currently met, in a coarse form (onset + rounded magnitude) so that small
+    forecast wiggles do not count as a change. `from` / `at` are informational only
+    (see comparable_state).
+    """
+    state = {}
+    hours = snapshot["hourly"]
+    current = snapshot["current"]
+
+    if thresholds.rain_probability is not None:
+        hits = [h for h in hours if (h.get("pop") or 0) >= thresholds.rain_probability]
+        if hits:
+            state["rain"] = {"onset": _onset(hours, hits), "from": hits[0].get("dt"),
+                             "max_probability": round(max(h["pop"] for h in hits), 1)}
+
+    if thresholds.heat_index is not None:
+        points = [p for p in [current] + hours if p.get("temp") is not None and p.get("humidity") is not None]
+        hits = [p for p in points if heat_index_c(p["temp"], p["humidity"]) >= thresholds.heat_index]
+        if hits:
+            peak = max(hits, key=lambda p: heat_index_c(p["temp"], p["humidity"]))
+            state["heat"] = {"onset": _onset(points, hits),
+                             "peak_heat_index": round(heat_index_c(peak["temp"], peak["humidity"])),
+                             "at": peak.get("dt")}
+
+    if thresholds.wind_speed is not None:
+        points = [p for p in [current] + hours if p.get("wind_speed") is not None]
+        hits = [p for p in points if p["wind_speed"] >= thresholds.wind_speed]
+        if hits:
+            peak = max(hits, key=lambda p: p["wind_speed"])
+            state["wind"] = {"onset": _onset(points, hits), "max_wind_speed": round(peak["wind_speed"]),
+                             "at": peak.get("dt")}
+
+    if thresholds.official_alerts and snapshot["alerts"]:
+        state["alerts"] = sorted(
+            ({"event": a.get("event"), "sender": a.get("sender_name"), "start": a.get("start"), "end": a.get("end")}
+             for a in snapshot["alerts"]),
+            key=lambda a: (a["start"] or 0, a["event"] or ""))
+    return state
+
+
+def comparable_state(value: Any) -> Any:
+    """A condition without its moving timestamps: only onset and magnitude decide whether it changed."""
+    if isinstance(value, dict):
+        return {k: v for k, v in value.items() if k not in MOVING_FIELDS}
+    return value
+
+
+def diff_states(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """{'started': {...}, 'changed': {...}, 'cleared': [...]} with empty parts omitted."""
+    changes = {
+        "started": {k: v for k, v in current.items() if k not in previous},
+        "changed": {k: v for k, v in current.items()
+                    if k in previous and comparable_state(previous[k]) != comparable_state(v)},
+        "cleared": sorted(k for k in previous if k not in current),
+    }
+    return {k: v for k, v in changes.items() if v}
+
+
+# ---------------- Scheduler ----------------
+class _CellState:
+    __slots__ = ("next_due", "fingerprint")
+
+    def __init__(self, next_due: float):
+        self.next_due = next_due
+        self.fingerprint = None
+
+
+class AlertScheduler:
+    """
+    Each pass fetches every due grid cell once (shared by all subscriptions in it) on a bounded
+    pool, skips evaluation when the cell's snapshot is unchanged, and notifies subscribers whose
+    evaluated state changed. Cells are re-polled every ALERT_POLL_SECONDS (±10% to spread load).
+    A newly seen cell is first due at a random point within one poll interval (so a restart with
+    many subscriptions does not fetch every cell at once), and at most ALERT_MAX_CELLS_PER_TICK
+    cells are fetched per pass, most overdue first; the rest wait for the next tick.
+    """
+
+    def __init__(self, registry: SubscriptionRegistry, poll_seconds: float = None, tick_seconds: float = None,
+                 max_workers: int = None, horizon_hours: int = None, max_cells_per_tick: int = None,
+                 fetch: Callable[[float, float, bool], Dict[str, Any]] = None):
+        self.registry = registry
+        self.poll_seconds = poll_seconds or Config.ALERT_POLL_SECONDS
+        self.tick_seconds = tick_seconds or Config.ALERT_TICK_SECONDS
+        self.max_cells_per_tick = max_cells_per_tick or Config.ALERT_MAX_CELLS_PER_TICK
+        self.horizon_hours = horizon_hours or Config.ALERT_HORIZON_HOURS
+        self.fetch = fetch or AlertScheduler._fetch_onecall
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or Config.ALERT_FETCH_WORKERS,
+                                            thread_name_prefix="alert-fetch")
+        # webhook แยก pool เพื่อไม่ให้ปลายทางที่ช้าถ่วงการ fetch
+        self._webhook_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="alert-webhook")
+        self._pass_lock = threading.Lock()
+        self._cells: Dict[Cell, _CellState] = {}
+        self._counters = Counter()
+        self._lock = threading.Lock()
+        # outbox ของทุก subscription: fetch worker เขียน, request thread อ่าน
+        self._events_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _fetch_onecall(lat: float, lon: float, include_alerts: bool) -> Dict[str, Any]:
+        api_key = WeatherTool._get_api_key()
+        if not api_key:
+            return {"error": "no_api_key", "message": "OpenWeather API key not configured."}
+        exclude = "minutely,daily" if include_alerts else "minutely,daily,alerts"
+        # breaker ของ scheduler เอง ("onecall_alerts"): poll ที่ล้มเหลวไม่เปิด breaker ของ chat flow; ไม่ hedge
+        return WeatherTool._guarded_call("onecall_alerts", lambda: WeatherTool._call_daily_forecast(
+            lat, lon, api_key, exclude=exclude, timeout=10), hedge=False)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def run_once(self, now: float = None) -> int:
+        """One pass over all due cells; returns the number of cells fetched."""
+        with self._pass_lock:
+            return self._run_pass(time.monotonic() if now is None else now)
+
+    def _run_pass(self, now: float) -> int:
+        due = []
+        with self._lock:
+            live = set()
+            for cell, subs in self.registry.cells():
+                live.add(cell)
+                state = self._cells.get(cell)
+                if state is None:
+                    # cell ใหม่ (หรือทุก cell หลัง restart): กระจายรอบแรกไปทั่ว poll interval
+                    state = self._cells[cell] = _CellState(now + random.uniform(0, self.poll_seconds))
+                if state.next_due <= now:
+                    due.append((cell, subs, state))
+            # ลืม cell ที่ไม่มี subscription แล้ว
+            for cell in [c for c in self._cells if c not in live]:
+                del self._cells[cell]
+        if len(due) > self.max_cells_per_tick:
+            # เกินโควตาต่อรอบ: เอา cell ที่เลยกำหนดนานที่สุดก่อน ที่เหลือยัง due อยู่ในรอบถัดไป
+            due.sort(key=lambda item: item[2].next_due)
+            self._count("deferred", len(due) - self.max_cells_per_tick)
+            due = due[:self.max_cells_per_tick]
+        for future in [self._executor.submit(self._poll_cell, *item, now) for item in due]:
+            future.result()
+        self._count("passes")
+        return len(due)
+
+    def _poll_cell(self, cell: Cell, subs: List[Subscription], state: _CellState, now: float):
+        state.next_due = now + self.poll_seconds * random.uniform(0.9, 1.1)
+        lat, lon = self.registry.cell_center(cell)
+        data = self.fetch(lat, lon, any(s.thresholds.official_alerts for s in subs))
+        self._count("fetches")
+        if not isinstance(data, dict) or data.get("error"):
+            self._count("fetch_errors")
+            return
+
+        snapshot = trim_snapshot(data, self.horizon_hours)
+        fp = fingerprint(snapshot)
+        if fp == state.fingerprint:
+            # snapshot เดิม: ประเมินเฉพาะ subscription ใหม่ที่ยังไม่เคยถูกประเมิน
+            subs = [s for s in subs if s.last_state is None]
+            self._count("unchanged")
+        state.fingerprint = fp
+
+        for sub in subs:
+            new_state = evaluate(snapshot, sub.thresholds)
+            changes = diff_states(sub.last_state or {}, new_state)
+            sub.last_state = new_state
+            if changes:
+                self._notify(sub, changes, new_state)
+
+    def _notify(self, sub: Subscription, changes: Dict[str, Any], state: Dict[str, Any]):
+        with self._events_lock:
+            event = {"seq": sub.next_seq, "ts": int(time.time()), "subscription_id": sub.id, "label": sub.label,
+                     "changes": changes, "state": state}
+            sub.next_seq += 1
+            sub.events.append(event)
+        self._count("notifications")
+        if sub.webhook_url:
+            # ตรวจอีกครั้งตอนส่ง: subscription เก่าใน SQLite อาจถูกสร้างก่อน allow-list ปัจจุบัน
+            if webhook_error(sub.webhook_url):
+                self._count("webhook_blocked")
+            else:
+                self._webhook_executor.submit(self._post_webhook, sub.webhook_url, dumps(event))
+
+    def _post_webhook(self, url: str, body: bytes):
+        try:
+            # ไม่ตาม redirect: ปลายทางที่อนุญาตต้องไม่พา request ไปยัง host อื่น
+            r = requests.post(url, data=body, timeout=5, headers={"Content-Type": "application/json"},
+                              allow_redirects=False)
+            r.raise_for_status()
+            self._count("webhook_ok")
+        except requests.RequestException:
+            self._count("webhook_errors")
+
+    def events(self, sub_id: str, since: int = 0) -> Optional[List[Dict[str, Any]]]:
+        sub = self.registry.get(sub_id)
+        if sub is None:
+            return None
+        with self._events_lock:
+            return [e for e in sub.events if e["seq"] >= since]
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="alert-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                self._count("pass_errors")
+            self._stop.wait(self.tick_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            cells = len(self._cells)
+        return {"subscriptions": len(self.registry), "cells": cells, "poll_seconds": self.poll_seconds,
+                "running": self._thread is not None and self._thread.is_alive(), **counters}
@@ -0,0 +1,88 @@
+# backend/http_cache.py
+# ETag / Last-Modified / Cache-Control สำหรับ weather routes (อิงจากเวลาของข้อมูลพยากรณ์เอง: current.dt
+# และเวลาที่ดึงแต่ละ One Call part มา)
+import hashlib
+import json
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional
+from env_setup import Config
+
+
+def forecast_timestamp(tool_result: Dict[str, Any]) -> Optional[int]:
+    """
+    Return the observation timestamp (unix, UTC) of a WeatherTool result:
+    One Call `current.dt`, or `dt` of the current-weather fallback. None if absent.
+    """
+    weather = (tool_result or {}).get("weather_data") or {}
+    daily = weather.get("daily_forecast")
+    if isinstance(daily, dict) and isinstance(daily.get("current"), dict) and daily["current"].get("dt"):
+        return int(daily["current"]["dt"])
+    current = weather.get("current_weather")
+    if isinstance(current, dict) and current.get("dt"):
+        return int(current["dt"])
+    return None
+
+
+def parts_fetched_at(tool_result: Dict[str, Any]) -> Dict[str, int]:
+    """{part: fetch time} of the One Call parts in a WeatherTool result ({} for the fallback paths)."""
+    weather = (tool_result or {}).get("weather_data") or {}
+    return dict(weather.get("parts_fetched_at") or {})
+
+
+def make_etag(ts: int, *parts: Any) -> str:
+    # weak ETag: body may be gzip/brotli encoded, so byte-for-byte equality is not promised
+    key = json.dumps([ts, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return 'W/"%s"' % hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def cache_headers(ts: int, etag: str, ttl: int = None, now: float = None, shared: bool = True,
+                  max_age_cap: int = None) -> Dict[str, str]:
+    """
+    Headers for a forecast observed at ts: max-age runs until the next expected upstream update.
+    max_age_cap bounds it further (e.g. the first part to expire from the per-part cache).
+    shared=False marks the response `private` (per-client data, e.g. POST /chat_agent with a session).
+    """
+    ttl = Config.WEATHER_FORECAST_TTL if ttl is None else ttl
+    now = time.time() if now is None else now
+    max_age = int(max(0, min(ttl, ttl - (now - ts))))
+    if max_age_cap is not None:
+        max_age = min(max_age, int(max_age_cap))
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(ts, usegmt=True),
+        "Cache-Control": f"{'public' if shared else 'private'}, max-age={max_age}",
+    }
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def is_not_modified(request_headers, etag: str, ts: int, use_modified_since: bool = True) -> bool:
+    """
+    RFC 7232: If-None-Match takes precedence; If-Modified-Since is only checked without it.
+    use_modified_since=False ignores If-Modified-Since: on a POST the URL does not identify the
+    resource, so a timestamp alone cannot tell one query's answer from another's.
+    """
+    inm = request_headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    if not use_modified_since:
+        return False
+    ims = request_headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(parsedate_to_datetime(ims).timestamp()) >= ts
+        except (TypeError, ValueError):
+            return False
+    return False
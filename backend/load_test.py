@@ -0,0 +1,224 @@
+# backend/load_test.py
+"""
+Async open-loop load generator for agent_server.
+
+Drives /chat_agent (or any POST route that takes {"text": ...}) at a Poisson arrival
+rate with a configurable query mix, and reports throughput, latency percentiles and
+error rate per time window.
+
+    # in-process, against stubbed OpenWeather (no network, no API keys);
+    # backend/stubs.py also provides StubBedrockClient for the Bedrock-backed agents
+    # (plug it in with bedrock_client.set_bedrock_client)
+    python -m backend.load_test --rate 50 --duration 30 --mix weather=0.6,coords=0.2,time=0.2
+
+    # against a running server (start it with stubs: python -m backend.load_test --serve)
+    python -m backend.load_test --target http://localhost:8000 --rate 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import httpx
+
+# Thai/English query corpus grouped by kind (mix weights refer to these keys)
+CORPUS: Dict[str, List[str]] = {
+    "weather": [
+        "อากาศเป็นอย่างไร ที่เชียงใหม่",
+        "ฝนตกไหม ที่บางแสน",
+        "สภาพอากาศในอีก 3 วันข้างหน้า ที่ภูเก็ต",
+        "อุณหภูมิวันนี้ที่ขอนแก่น",
+        "What's the weather in Bangkok?",
+        "Weather forecast for Hat Yai",
+        "Will it rain in Pattaya tomorrow?",
+        "Temperature today in Chiang Rai",
+    ],
+    "coords": [
+        "Weather for 13.7563, 100.5018",
+        "อากาศที่ 18.7883, 98.9853",
+        "forecast at 7.8804, 98.3923",
+        "13.3611, 100.9847 ฝนตกไหม",
+    ],
+    "time": [
+        "ตอนนี้กี่โมงแล้ว",
+        "เวลาเท่าไหร่",
+        "วันนี้วันที่เท่าไหร่",
+        "What time is it now?",
+        "Current time",
+    ],
+}
+
+
+@dataclass
+class Sample:
+    started: float      # seconds since test start
+    latency: float      # seconds
+    ok: bool
+    status: int
+
+
+@dataclass
+class Report:
+    samples: List[Sample] = field(default_factory=list)
+    dropped: int = 0    # arrivals skipped because max in-flight was reached
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in CORPUS:
+            raise ValueError(f"unknown query kind '{kind}' (choose from {', '.join(CORPUS)})")
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(samples: List[Sample], seconds: float) -> Dict[str, float]:
+    latencies = [s.latency for s in samples if s.ok]
+    errors = sum(1 for s in samples if not s.ok)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / seconds, 2) if seconds > 0 else 0.0,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def _one_request(client, route, text, t0, report, sem):
+    started = time.monotonic()
+    status = 0
+    try:
+        r = await client.post(route, json={"text": text})
+        status = r.status_code
+        ok = status < 400
+    except httpx.HTTPError:
+        ok = False
+    finally:
+        sem.release()
+    report.samples.append(Sample(started - t0, time.monotonic() - started, ok, status))
+
+
+async def run_load(client, routes, rate, duration, mix, max_in_flight=500, seed=None) -> Report:
+    """Open-loop Poisson arrivals at `rate` req/s for `duration` seconds."""
+    rng = random.Random(seed)
+    kinds = [k for k, _ in mix]
+    weights = [w for _, w in mix]
+    report = Report()
+    sem = asyncio.Semaphore(max_in_flight)
+    tasks = []
+
+    t0 = time.monotonic()
+    next_at = t0
+    while True:
+        next_at += rng.expovariate(rate)
+        if next_at - t0 >= duration:
+            break
+        delay = next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if sem.locked():
+            report.dropped += 1
+            continue
+        await sem.acquire()
+        kind = rng.choices(kinds, weights)[0]
+        text = rng.choice(CORPUS[kind])
+        route = rng.choice(routes)
+        tasks.append(asyncio.create_task(_one_request(client, route, text, t0, report, sem)))
+
+    if tasks:
+        await asyncio.gather(*tasks)
+    return report
+
+
+def print_report(report: Report, duration: float, window: float, as_json: bool):
+    windows = []
+    n_windows = max(1, int(-(-duration // window)))
+    for i in range(n_windows):
+        lo, hi = i * window, min((i + 1) * window, duration)
+        bucket = [s for s in report.samples if lo <= s.started < hi]
+        windows.append(dict(start_s=round(lo, 1), **summarize(bucket, hi - lo)))
+    total = dict(summarize(report.samples, duration), dropped=report.dropped)
+
+    if as_json:
+        print(json.dumps({"windows": windows, "total": total}, indent=2))
+        return
+
+    header = f"{'t(s)':>6} {'req':>6} {'rps':>7} {'err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}"
+    print(header)
+    print("-" * len(header))
+    for w in windows + [dict(total, start_s="total")]:
+        print(f"{w['start_s']!s:>6} {w['requests']:>6} {w['throughput_rps']:>7} {w['error_rate'] * 100:>6.2f} "
+              f"{w['p50_ms']:>8} {w['p95_ms']:>8} {w['p99_ms']:>8} {w['max_ms']:>8}")
+    if report.dropped:
+        print(f"dropped arrivals (max in-flight reached): {report.dropped}")
+
+
+def install_stubs(args):
+    from backend.stubs import StubOpenWeather
+    import env_setup
+
+    # WeatherTool ต้องมี API key ถึงจะเรียก endpoint (stub ไม่ตรวจค่า)
+    env_setup.Config.API_OPEN_WEATHER = env_setup.Config.API_OPEN_WEATHER or "stub-key"
+    StubOpenWeather(latency=args.ow_latency, error_rate=args.ow_error_rate, seed=args.seed).install()
+
+
+async def _main(args):
+    mix = parse_mix(args.mix)
+    if args.target == "inproc":
+        install_stubs(args)
+        from backend.agent_server import app
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.max_in_flight))
+    async with client:
+        report = await run_load(client, args.route or ["/chat_agent"], args.rate, args.duration, mix,
+                                max_in_flight=args.max_in_flight, seed=args.seed)
+    print_report(report, args.duration, args.window, args.json)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Load test for the agent_server FastAPI app")
+    p.add_argument("--target", default="inproc", help="'inproc' (ASGI, stubbed backends) or a base URL")
+    p.add_argument("--route", action="append", help="POST route(s) to drive; repeatable (default /chat_agent)")
+    p.add_argument("--rate", type=float, default=20.0, help="mean arrival rate, requests/second")
+    p.add_argument("--duration", type=float, default=30.0, help="test duration, seconds")
+    p.add_argument("--mix", default="weather=0.6,coords=0.2,time=0.2", help="query mix weights by kind")
+    p.add_argument("--window", type=float, default=5.0, help="report window, seconds")
+    p.add_argument("--max-in-flight", type=int, default=500)
+    p.add_argument("--timeout", type=float, default=60.0, help="client timeout per request, seconds")
+    p.add_argument("--ow-latency", type=float, default=0.08, help="stub OpenWeather latency, seconds")
+    p.add_argument("--ow-error-rate", type=float, default=0.0, help="stub OpenWeather 503 rate")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.add_argument("--serve", action="store_true", help="run agent_server with stubbed backends instead of load")
+    p.add_argument("--port", type=int, default=8000)
+    args = p.parse_args(argv)
+
+    if args.serve:
+        import uvicorn
+        install_stubs(args)
+        from backend.agent_server import app
+        uvicorn.run(app, host="127.0.0.1", port=args.port)
+        return
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# backend/session_store.py
+# Multi-turn session state สำหรับ agent_server: append-only log ใน SQLite + hot tier ในหน่วยความจำ
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from env_setup import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq        INTEGER NOT NULL,
+    ts         REAL NOT NULL,
+    payload    TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS turns_ts ON turns (ts);
+"""
+
+
+class _HotSession:
+    __slots__ = ("turns", "next_seq", "last_access")
+
+    def __init__(self, turns, next_seq):
+        self.turns = turns
+        self.next_seq = next_seq
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Conversation turns per session.
+    - append(): one INSERT into the append-only log + list append in the hot tier (O(1))
+    - get(): served from the hot tier; a cold session is reloaded with one indexed range scan
+    - hot sessions are evicted when idle for idle_seconds or when more than max_hot are held;
+      log rows older than retention_seconds are purged
+    seq is taken from the log inside the INSERT's write transaction, so several processes sharing
+    the database never write the same (session_id, seq). The hot tier is per process, though: run
+    agent_server with one worker, or route each session to the same worker, or a worker may serve
+    turns that miss what another worker appended until its hot copy is evicted or it appends itself.
+    """
+
+    def __init__(self, path: str = None, max_hot: int = None, max_turns: int = None,
+                 idle_seconds: float = None, retention_seconds: float = None):
+        self.path = path or Config.SESSION_DB_PATH
+        self.max_hot = max_hot or Config.SESSION_HOT_MAX
+        self.max_turns = max_turns or Config.SESSION_MAX_TURNS
+        self.idle_seconds = idle_seconds or Config.SESSION_IDLE_SECONDS
+        self.retention_seconds = retention_seconds or Config.SESSION_RETENTION_SECONDS
+        self._hot: "OrderedDict[str, _HotSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._last_purge = time.monotonic()
+
+    @staticmethod
+    def new_session_id() -> str:
+        return uuid.uuid4().hex
+
+    def _load(self, session_id: str) -> _HotSession:
+        rows = self._db.execute(
+            "SELECT seq, ts, payload FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.max_turns)).fetchall()
+        turns = [dict(json.loads(payload), seq=seq, ts=ts) for seq, ts, payload in reversed(rows)]
+        next_seq = rows[0][0] + 1 if rows else 0
+        return _HotSession(turns, next_seq)
+
+    def _hot_session(self, session_id: str) -> _HotSession:
+        session = self._hot.get(session_id)
+        if session is None:
+            session = self._load(session_id)
+            self._hot[session_id] = session
+        self._hot.move_to_end(session_id)
+        session.last_access = time.monotonic()
+        return session
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._hot:
+            session_id, session = next(iter(self._hot.items()))
+            if len(self._hot) > self.max_hot or now - session.last_access > self.idle_seconds:
+                del self._hot[session_id]
+            else:
+                break
+        if now - self._last_purge > 300:
+            self._last_purge = now
+            self._db.execute("DELETE FROM turns WHERE ts < ?", (time.time() - self.retention_seconds,))
+
+    def append(self, session_id: str, turn: Dict[str, Any]) -> int:
+        """Append one turn; returns its sequence number within the session."""
+        payload = json.dumps(turn, ensure_ascii=False)
+        with self._lock:
+            session = self._hot_session(session_id)
+            ts = time.time()
+            # BEGIN IMMEDIATE ถือ write lock ของ SQLite ตั้งแต่อ่าน MAX(seq) จนถึง INSERT
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (seq,) = self._db.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM turns WHERE session_id = ?",
+                                          (session_id,)).fetchone()
+                self._db.execute("INSERT INTO turns (session_id, seq, ts, payload) VALUES (?, ?, ?, ?)",
+                                 (session_id, seq, ts, payload))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if seq != session.next_seq:
+                # process อื่นเขียน session นี้ไปแล้ว: hot copy ไม่ครบ -> โหลดใหม่จาก log (รวม turn นี้)
+                session = self._hot[session_id] = self._load(session_id)
+            else:
+                session.next_seq += 1
+                session.turns.append(dict(turn, seq=seq, ts=ts))
+                if len(session.turns) > self.max_turns:
+                    del session.turns[0]
+            self._evict()
+            return seq
+
+    def get(self, session_id: str) -> List[Dict[str, Any]]:
+        """Most recent turns (up to max_turns), oldest first. Empty list for unknown sessions."""
+        with self._lock:
+            if session_id in self._hot:
+                turns = list(self._hot_session(session_id).turns)
+            else:
+                session = self._load(session_id)
+                if not session.turns:
+                    # id ที่ไม่มีใน log: ไม่สร้าง hot entry ว่าง ๆ (id สุ่มจาก client จะดัน session จริงออกจาก hot tier)
+                    return []
+                self._hot[session_id] = session
+                turns = list(session.turns)
+            self._evict()
+            return turns
+
+    def last_turn(self, session_id: str, predicate=None) -> Optional[Dict[str, Any]]:
+        for turn in reversed(self.get(session_id)):
+            if predicate is None or predicate(turn):
+                return turn
+        return None
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._hot.pop(session_id, None)
+            self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hot_sessions": len(self._hot),
+                "hot_turns": sum(len(s.turns) for s in self._hot.values()),
+                "max_hot": self.max_hot,
+                "idle_seconds": self.idle_seconds,
+            }
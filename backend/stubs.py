@@ -0,0 +1,172 @@
+# backend/stubs.py
+# Stub backends (OpenWeather + Bedrock) สำหรับ load test / การทดสอบแบบไม่ต่อเน็ต
+import random
+import threading
+import time
+import json
+from tools.weather_tool import WeatherTool
+
+
+class StubResponse:
+    """Minimal stand-in for requests.Response (status_code, text, json(), raise_for_status())."""
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            from requests.exceptions import HTTPError
+            raise HTTPError(f"{self.status_code} Error (stub)")
+
+
+def _sample_onecall(lat, lon, now, exclude=""):
+    excluded = set(filter(None, (exclude or "").split(",")))
+    daily = []
+    for i in range(8):
+        daily.append({
+            "dt": now - now % 86400 + 5 * 3600 + i * 86400,
+            "temp": {"day": 31.5 + i * 0.2, "min": 25.1, "max": 34.0, "night": 27.2, "eve": 30.1, "morn": 26.0},
+            "feels_like": {"day": 37.0, "night": 29.5, "eve": 34.2, "morn": 27.1},
+            "humidity": 68, "pressure": 1008, "wind_speed": 3.4, "wind_deg": 210,
+            "weather": [{"id": 500, "main": "Rain", "description": "ฝนเล็กน้อย", "icon": "10d"}],
+            "clouds": 60, "pop": 0.65, "rain": 2.3, "uvi": 9.1,
+        })
+    hour = now - now % 3600
+    hourly = [{
+        "dt": hour + i * 3600, "temp": 30.0 + (i % 12) * 0.4, "feels_like": 35.5, "humidity": 70, "pressure": 1008,
+        "wind_speed": 3.0 + (i % 5) * 0.3, "wind_deg": 210, "clouds": 50, "pop": 0.2 if i < 6 else 0.7,
+        "weather": [{"id": 500, "main": "Rain", "description": "ฝนเล็กน้อย", "icon": "10d"}],
+    } for i in range(48)]
+    data = {
+        "lat": float(lat), "lon": float(lon), "timezone": "Asia/Bangkok", "timezone_offset": 25200,
+        "current": {
+            "dt": now - now % 600, "temp": 31.2, "feels_like": 36.8, "humidity": 66, "pressure": 1008,
+            "uvi": 7.2, "clouds": 40, "wind_speed": 3.1, "wind_deg": 200,
+            "weather": [{"id": 802, "main": "Clouds", "description": "เมฆกระจาย", "icon": "03d"}],
+        },
+        "minutely": [{"dt": now - now % 60 + i * 60, "precipitation": 0.0 if i < 30 else 0.4} for i in range(61)],
+        "hourly": hourly,
+        "daily": daily,
+        "alerts": [{
+            "sender_name": "Thai Meteorological Department", "event": "Heavy rain",
+            "start": hour, "end": hour + 12 * 3600, "description": "Heavy rain (stub)", "tags": ["Rain"],
+        }],
+    }
+    # ตัด part ตาม exclude แบบเดียวกับ One Call จริง
+    return {k: v for k, v in data.items() if k not in excluded}
+
+
+def _sample_current(lat, lon, now):
+    return {
+        "coord": {"lat": float(lat), "lon": float(lon)},
+        "weather": [{"id": 802, "main": "Clouds", "description": "เมฆกระจาย", "icon": "03d"}],
+        "main": {"temp": 31.2, "feels_like": 36.8, "pressure": 1008, "humidity": 66},
+        "wind": {"speed": 3.1, "deg": 200}, "dt": now - now % 600, "name": "Stub",
+    }
+
+
+class StubOpenWeather:
+    """
+    Fake OpenWeather HTTP backend plugged in through WeatherTool._http_get.
+    latency/jitter are in seconds; error_rate is the fraction of calls answered with HTTP 503.
+    """
+
+    def __init__(self, latency=0.08, jitter=0.04, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._previous = None
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=10):
+        params = params or {}
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+        time.sleep(min(delay, timeout))
+        if fail:
+            return StubResponse(503, {"cod": 503, "message": "stub unavailable"})
+
+        now = int(time.time())
+        lat, lon = params.get("lat", 13.75), params.get("lon", 100.50)
+        if "/geo/1.0/direct" in url:
+            return StubResponse(200, [{"name": params.get("q", "Bangkok"), "lat": 13.7563, "lon": 100.5018, "country": "TH"}])
+        if "/data/3.0/onecall" in url:
+            return StubResponse(200, _sample_onecall(lat, lon, now, params.get("exclude", "")))
+        if "/data/2.5/weather" in url:
+            return StubResponse(200, _sample_current(lat, lon, now))
+        return StubResponse(404, {"cod": 404, "message": "stub: unknown endpoint"})
+
+    def install(self):
+        """Route all WeatherTool HTTP calls to this stub (process-wide)."""
+        self._previous = WeatherTool.__dict__["_http_get"]
+        WeatherTool._http_get = staticmethod(self.get)
+        return self
+
+    def uninstall(self):
+        if self._previous is not None:
+            WeatherTool._http_get = self._previous
+            self._previous = None
+
+
+class StubBedrockClient:
+    """
+    Fake bedrock-runtime client implementing converse().
+    First round asks for a tool (Time_Tool for time questions, Weather_Tool otherwise);
+    once a toolResult is in the conversation it answers with end_turn text.
+    throttle_rate is the fraction of calls that raise ThrottlingException; throttle_models limits
+    throttling to those model ids (None = every model). model_calls records the modelId of each call.
+    """
+
+    TIME_WORDS = ("time", "กี่โมง", "เวลา", "วันที่")
+
+    def __init__(self, latency=0.4, jitter=0.15, throttle_rate=0.0, seed=None, throttle_models=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.throttle_models = set(throttle_models) if throttle_models else None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.model_calls = []
+
+    def converse(self, modelId=None, messages=None, system=None, toolConfig=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+            self.model_calls.append(modelId)
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            throttled = self._rng.random() < self.throttle_rate and \
+                (self.throttle_models is None or modelId in self.throttle_models)
+        time.sleep(delay)
+        if throttled:
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded (stub)"}}, "Converse")
+
+        usage = {"inputTokens": 900, "outputTokens": 60, "totalTokens": 960}
+        last = messages[-1]["content"] if messages else []
+        if any("toolResult" in block for block in last):
+            return {
+                "stopReason": "end_turn",
+                "output": {"message": {"role": "assistant", "content": [{"text": "สรุปผลจาก tool (stub)"}]}},
+                "usage": usage,
+            }
+
+        text = " ".join(block.get("text", "") for block in last).lower()
+        if any(word in text for word in StubBedrockClient.TIME_WORDS):
+            tool_use = {"toolUseId": f"stub-{n}", "name": "Time_Tool", "input": {"timezone": "Asia/Bangkok"}}
+        else:
+            tool_use = {"toolUseId": f"stub-{n}", "name": "Weather_Tool", "input": {"city": "Bangkok", "cnt": 3}}
+        return {
+            "stopReason": "tool_use",
+            "output": {"message": {"role": "assistant", "content": [{"toolUse": tool_use}]}},
+            "usage": usage,
+        }
@@ -0,0 +1,82 @@
+# backend/tool_choice.py
+# heuristic agent ของ agent_server: เลือก Tool จากข้อความ, หาชื่อสถานที่, และตรวจคำถามต่อเนื่อง
+# (แยกจาก agent_server เพื่อให้ทดสอบได้โดยไม่ต้องมี FastAPI)
+import re
+import uuid
+from typing import Any, Dict
+from tools.weather_tool import WeatherTool
+
+# คำที่บ่งว่าเป็นคำถามต่อเนื่อง -> ใช้ location จาก turn ก่อนหน้าใน session (เฉพาะเมื่อข้อความไม่มี location ของตัวเอง)
+# ภาษาไทยไม่เว้นวรรคระหว่างคำ -> เทียบ substring; ภาษาอังกฤษเทียบทั้งคำ
+FOLLOW_UP_WORDS_TH = ("ที่เดิม", "ที่นั่น", "พรุ่งนี้", "ล่ะ")
+FOLLOW_UP_WORDS_EN = ("same place", "tomorrow", "what about", "how about")
+# คำทั่วไปที่ไม่ใช่ชื่อสถานที่ ตัดออกก่อนหา city
+FILLER_WORDS_TH = ("อากาศ", "ฝนจะตก", "ฝนตก", "ฝน", "วันนี้", "ไหม", "มั้ย", "เป็นยังไง", "บ้าง", "ครับ", "ค่ะ")
+FILLER_WORDS_EN = ("weather", "rain", "forecast", "today", "the", "in", "at", "for", "is", "it", "will",
+                   "near", "around", "of", "on")
+# คำบุพบทหน้าชื่อสถานที่ ("อากาศที่เชียงใหม่", "ฝนตกแถวสีลม") ตัดเฉพาะเมื่อขึ้นต้นช่วงข้อความที่เหลือ
+# ไม่ตัดกลางคำ เพราะชื่อสถานที่อาจมีตัวอักษรชุดเดียวกันอยู่ข้างใน
+PREPOSITIONS_TH = ("ที่", "ใน", "แถว")
+# คำถามเรื่องเวลา -> Time_Tool
+TIME_QUESTION_WORDS = ("กี่โมง", "what time", "time is it", "current time")
+
+_THAI = re.compile(r"[ก-๙]")
+
+def _en_words(words, plural=False):
+    suffix = "s?" if plural else ""
+    return re.compile(r"\b(?:%s)%s\b" % ("|".join(re.escape(w) for w in words), suffix), re.IGNORECASE)
+
+# คำที่ WeatherTool.parse_intent ใช้ (next hour, tonight, พรุ่งนี้, ...) ก็ไม่ใช่ชื่อสถานที่เช่นกัน
+_INTENT_WORDS_TH = tuple(w for w in WeatherTool.INTENT_WORDS if _THAI.search(w))
+_INTENT_WORDS_EN = tuple(w for w in WeatherTool.INTENT_WORDS if not _THAI.search(w))
+
+_FOLLOW_UP_EN = _en_words(FOLLOW_UP_WORDS_EN)
+_NON_LOCATION_EN = _en_words(FOLLOW_UP_WORDS_EN + _INTENT_WORDS_EN + FILLER_WORDS_EN, plural=True)
+# คำยาวก่อน: "ฝนตก" ต้องถูกตัดก่อน "ฝน", "ที่เดิม" ก่อนคำบุพบท "ที่"
+_NON_LOCATION_TH = sorted(set(FOLLOW_UP_WORDS_TH + _INTENT_WORDS_TH + FILLER_WORDS_TH), key=len, reverse=True)
+_HORIZON = re.compile("|".join((WeatherTool.HOURS_PATTERN, WeatherTool.DAYS_PATTERN)), re.IGNORECASE)
+_LEADING_PREPOSITION_TH = re.compile(r"^(?:%s)+" % "|".join(PREPOSITIONS_TH))
+
+def location_text(user_text: str) -> str:
+    """
+    user_text without follow-up cues, intent/horizon words and filler words: what is left names the place, if any.
+    Removed words become ", " so the pieces around them stay separate ("Bangkok tomorrow Tokyo" -> "Bangkok, Tokyo").
+    """
+    text = _HORIZON.sub("|", user_text)
+    text = _NON_LOCATION_EN.sub("|", text)
+    for word in _NON_LOCATION_TH:
+        text = text.replace(word, "|")
+    pieces = (_LEADING_PREPOSITION_TH.sub("", " ".join(piece.split())).strip() for piece in text.split("|"))
+    return ", ".join(piece for piece in pieces if piece)
+
+# ---------------- AI Agent ----------------
+def decide_tool_ai(user_text: str) -> Dict[str, Any]:
+    """
+    AI Agent วิเคราะห์เองเพื่อเลือก Tool
+    heuristic: ถ้ามีเลข lat/lon หรือ city -> Weather_Tool, else -> Time_Tool
+    """
+    latlon_match = re.findall(r"(-?\d+\.?\d*)", user_text)
+    city_match = [m for m in re.findall(r"[ก-๙a-zA-Z\s]{2,20}", location_text(user_text)) if len(m.strip()) >= 2]
+
+    if any(word in user_text.lower() for word in TIME_QUESTION_WORDS):
+        if latlon_match and len(latlon_match) >= 2:
+            return {"name": "Time_Tool", "input": {"latitude": latlon_match[0], "longitude": latlon_match[1]}, "toolUseId": str(uuid.uuid4())}
+        return {"name": "Time_Tool", "input": {"timezone": "Asia/Bangkok"}, "toolUseId": str(uuid.uuid4())}
+
+    # intent / horizon (next hour, hourly, daily, alerts) -> WeatherTool ขอเฉพาะ One Call part ที่ต้องใช้
+    intent = WeatherTool.parse_intent(user_text)
+    if latlon_match and len(latlon_match) >= 2:
+        return {"name": "Weather_Tool", "input": {"latitude": latlon_match[0], "longitude": latlon_match[1], "cnt": 3, **intent}, "toolUseId": str(uuid.uuid4())}
+    elif city_match:
+        city = " ".join(city_match[0].split())
+        return {"name": "Weather_Tool", "input": {"city": city, "cnt": 3, **intent}, "toolUseId": str(uuid.uuid4())}
+
+    # fallback
+    return {"name": "Time_Tool", "input": {"timezone": "Asia/Bangkok"}, "toolUseId": str(uuid.uuid4())}
+
+def has_location(tool_payload: Dict[str, Any]) -> bool:
+    input_data = tool_payload.get("input", {})
+    return bool(input_data.get("city") or input_data.get("latitude"))
+
+def is_follow_up(user_text: str) -> bool:
+    return bool(_FOLLOW_UP_EN.search(user_text)) or any(word in user_text for word in FOLLOW_UP_WORDS_TH)
@@ -0,0 +1,277 @@
+# bedrock_client.py
+# Process-wide Bedrock invocation layer: shared client, AIMD concurrency limit per model, fair queue, throttle retries
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from env_setup import Config
+from bedrock_config import AWS_REGION
+
+# Error codes that mean "slow down" (AIMD decrease) vs. transient errors that are only retried
+THROTTLE_CODES = ("ThrottlingException", "TooManyRequestsException")
+RETRYABLE_CODES = THROTTLE_CODES + ("ServiceUnavailableException", "ModelNotReadyException")
+
+
+class BedrockQueueTimeout(Exception):
+    """Raised when a converse call could not get a concurrency slot before its deadline."""
+
+
+class _Ticket:
+    __slots__ = ("event", "enqueued_at")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class AIMDLimiter:
+    """
+    Adaptive cap on in-flight calls.
+    - success: limit += increase / limit   (about +1 per limit's worth of successes)
+    - throttle: limit *= decrease          (multiplicative back-off), at most once per window:
+      throttles from calls that started before the last decrease were sent under the old limit
+      and are already accounted for, so they do not shrink it again
+    Waiters are queued per session and served round-robin across sessions, so one busy
+    session cannot starve the others.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16, increase=1.0, decrease=0.5):
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.throttles_ignored = 0
+        self._last_decrease = float("-inf")
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _has_capacity(self):
+        return self.in_flight < int(self.limit)
+
+    def _grant_waiters(self):
+        # ปล่อย waiter ตามลำดับ round-robin ระหว่าง session จนกว่าจะเต็ม limit
+        while self._queues and self._has_capacity():
+            session_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            self.in_flight += 1
+            ticket.event.set()
+
+    def acquire(self, session_id="default", timeout=None):
+        """Block until a slot is free; returns seconds spent waiting. Raises BedrockQueueTimeout."""
+        with self._lock:
+            if not self._queues and self._has_capacity():
+                self.in_flight += 1
+                return 0.0
+            ticket = _Ticket()
+            self._queues.setdefault(session_id, deque()).append(ticket)
+
+        if ticket.event.wait(timeout):
+            return time.monotonic() - ticket.enqueued_at
+
+        with self._lock:
+            if ticket.event.is_set():
+                # ได้ slot พอดีตอน timeout
+                return time.monotonic() - ticket.enqueued_at
+            queue = self._queues.get(session_id)
+            if queue is not None:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[session_id]
+        raise BedrockQueueTimeout(f"No Bedrock capacity within {timeout:.1f}s (limit={int(self.limit)})")
+
+    def release(self, throttled=False, success=True, started_at=None):
+        """started_at: time.monotonic() when the call was sent (None = treat every throttle as new)."""
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                if started_at is None or started_at >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = time.monotonic()
+                else:
+                    self.throttles_ignored += 1
+            elif success:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._grant_waiters()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": sum(len(q) for q in self._queues.values()),
+                "sessions_waiting": len(self._queues),
+                "saturation": round(self.in_flight / max(1, int(self.limit)), 2),
+                "throttles_ignored": self.throttles_ignored,
+            }
+
+
+class _Window:
+    """Small rolling window for percentile metrics."""
+
+    def __init__(self, size=500):
+        self._values = deque(maxlen=size)
+
+    def add(self, value):
+        self._values.append(value)
+
+    def percentile(self, pct):
+        if not self._values:
+            return 0.0
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class BedrockInvoker:
+    """
+    Shared entry point for converse(); safe to use from many threads.
+    Bedrock quotas are per model, so each modelId gets its own AIMD limiter: a throttle on one
+    model does not shrink the limit of another.
+    """
+
+    def __init__(self, client=None, limiter_factory=None, max_retries=None, base_backoff=0.5, max_backoff=8.0):
+        self.client = client or BedrockInvoker._build_client()
+        self._limiter_factory = limiter_factory or BedrockInvoker._new_limiter
+        self.limiters: "OrderedDict[str, AIMDLimiter]" = OrderedDict()
+        self.max_retries = Config.BEDROCK_MAX_RETRIES if max_retries is None else max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._counts = {"calls": 0, "ok": 0, "throttled": 0, "retries": 0, "errors": 0, "gave_up": 0,
+                        "fail_fast": 0, "queue_timeouts": 0}
+        self._queue_wait = _Window()
+        self._latency = _Window()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_client():
+        # retry ของ botocore ปิดไว้ (total_max_attempts=1) เพราะ layer นี้จัดการ throttle retry เอง
+        return boto3.client(
+            "bedrock-runtime",
+            region_name=AWS_REGION,
+            config=BotoConfig(
+                max_pool_connections=Config.BEDROCK_MAX_POOL,
+                retries={"total_max_attempts": 1, "mode": "standard"},
+                connect_timeout=5,
+                read_timeout=Config.BEDROCK_READ_TIMEOUT,
+                tcp_keepalive=True,
+            ),
+        )
+
+    @staticmethod
+    def _new_limiter():
+        return AIMDLimiter(
+            initial=Config.BEDROCK_INITIAL_CONCURRENCY,
+            min_limit=Config.BEDROCK_MIN_CONCURRENCY,
+            max_limit=Config.BEDROCK_MAX_CONCURRENCY,
+        )
+
+    def limiter_for(self, model_id):
+        with self._lock:
+            limiter = self.limiters.get(model_id)
+            if limiter is None:
+                limiter = self.limiters[model_id] = self._limiter_factory()
+            return limiter
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def converse(self, session_id="default", deadline=None, max_retries=None, **kwargs):
+        """
+        client.converse(**kwargs) under the model's concurrency limit, retrying throttles with backoff.
+        max_retries overrides the configured retry count for this call (0 = fail fast: a throttle is
+        counted as fail_fast, not gave_up, since the caller has somewhere else to go).
+        """
+        fail_fast = max_retries == 0
+        max_retries = self.max_retries if max_retries is None else max_retries
+        limiter = self.limiter_for(kwargs.get("modelId"))
+        attempt = 0
+        while True:
+            timeout = deadline.remaining() if deadline is not None else None
+            try:
+                waited = limiter.acquire(session_id, timeout)
+            except BedrockQueueTimeout:
+                self._count("queue_timeouts")
+                raise
+            self._queue_wait.add(waited)
+            self._count("calls")
+
+            started = time.monotonic()
+            try:
+                response = self.client.converse(**kwargs)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                throttled = code in THROTTLE_CODES
+                limiter.release(throttled=throttled, success=False, started_at=started)
+                self._count("throttled" if throttled else "errors")
+                if code not in RETRYABLE_CODES or attempt >= max_retries:
+                    if code in RETRYABLE_CODES:
+                        self._count("fail_fast" if fail_fast else "gave_up")
+                    raise
+                # full jitter backoff; give up early if the deadline would pass while sleeping
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+                if deadline is not None and delay >= deadline.remaining():
+                    self._count("gave_up")
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            except Exception:
+                limiter.release(success=False)
+                self._count("errors")
+                raise
+
+            limiter.release(success=True)
+            self._latency.add(time.monotonic() - started)
+            self._count("ok")
+            return response
+
+    def metrics(self):
+        """Saturation metrics for sizing deployments (totals across models, plus each model's limiter)."""
+        with self._lock:
+            counts = dict(self._counts)
+            limiters = dict(self.limiters)
+        models = {model_id: limiter.snapshot() for model_id, limiter in limiters.items()}
+        return {
+            "limit": round(sum(m["limit"] for m in models.values()), 2),
+            "in_flight": sum(m["in_flight"] for m in models.values()),
+            "queued": sum(m["queued"] for m in models.values()),
+            "saturation": max((m["saturation"] for m in models.values()), default=0.0),
+            **counts,
+            "queue_wait_p50_ms": round(self._queue_wait.percentile(50) * 1000, 1),
+            "queue_wait_p95_ms": round(self._queue_wait.percentile(95) * 1000, 1),
+            "latency_p50_ms": round(self._latency.percentile(50) * 1000, 1),
+            "latency_p95_ms": round(self._latency.percentile(95) * 1000, 1),
+            "models": models,
+        }
+
+
+_invoker = None
+_invoker_lock = threading.Lock()
+
+
+def get_bedrock_invoker():
+    """Process-wide BedrockInvoker (one client + connection pool shared by every agent)."""
+    global _invoker
+    if _invoker is None:
+        with _invoker_lock:
+            if _invoker is None:
+                _invoker = BedrockInvoker()
+    return _invoker
+
+
+def set_bedrock_client(client):
+    """Swap in another client (e.g. backend.stubs.StubBedrockClient) and reset the shared invoker."""
+    global _invoker
+    with _invoker_lock:
+        _invoker = BedrockInvoker(client=client)
+    return _invoker
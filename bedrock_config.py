@@ -1,6 +1,9 @@
 # bedrock_config.py
 from enum import Enum
+from functools import lru_cache
 from env_setup import Config
+from tools.weather_tool import WeatherTool
+from tools.time_tool import TimeTool
 
 AWS_REGION = Config.REGION_NAME
 
@@ -10,6 +13,12 @@ class SupportedModels(Enum):
 
 MODEL_ID = SupportedModels.CLAUDE_HAIKU.value
 
+# Model tiers for latency-tiered routing, fastest first
+MODEL_TIERS = {
+    "fast": Config.BEDROCK_MODEL_FAST or MODEL_ID,
+    "standard": Config.BEDROCK_MODEL_STANDARD or MODEL_ID,
+}
+
 SYSTEM_PROMPT = """
 You are a weather and time assistant that ONLY uses Weather_Tool and Time_Tool. 
 Follow these strict rules:
@@ -39,3 +48,31 @@ Goal: Always provide accurate, real-time weather and Thailand local time data us
 
 
 MAX_RECURSIONS = SupportedModels.MAX_RECURSIONS.value
+AGENT_DEADLINE_SECONDS = Config.AGENT_DEADLINE_SECONDS
+
+PROMPT_CACHING = Config.BEDROCK_PROMPT_CACHING
+COMPACT_TOOL_RESULTS = Config.BEDROCK_COMPACT_TOOL_RESULTS
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+@lru_cache(maxsize=None)
+def get_system_prompt():
+    """
+    System blocks for converse, built once per process.
+    With PROMPT_CACHING a cache point is placed after the prompt so Bedrock can reuse it across rounds.
+    NOTE: shared object — do not mutate.
+    """
+    blocks = [{"text": SYSTEM_PROMPT}]
+    if PROMPT_CACHING:
+        blocks.append(CACHE_POINT)
+    return blocks
+
+
+@lru_cache(maxsize=None)
+def get_tool_config():
+    """Tool config (Weather_Tool + Time_Tool specs) for converse, built once per process. Do not mutate."""
+    tools = [WeatherTool.get_tool_spec(), TimeTool.get_tool_spec()]
+    if PROMPT_CACHING:
+        tools.append(CACHE_POINT)
+    return {"tools": tools}
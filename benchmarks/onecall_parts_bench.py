@@ -0,0 +1,50 @@
+# benchmarks/onecall_parts_bench.py
+"""
+Upstream One Call payload size and parse time per intent (WeatherTool.select_parts)
+compared with requesting every part, using the stub One Call payload shape.
+
+    python -m benchmarks.onecall_parts_bench --iterations 2000
+"""
+import argparse
+import json
+import time
+
+from backend.stubs import _sample_onecall
+from tools.weather_tool import WeatherTool
+
+CASES = [
+    ("all parts", {"intent": "daily"}, ""),
+    ("next_hour", {"intent": "next_hour"}, None),
+    ("hourly", {"intent": "hourly", "hours": 12}, None),
+    ("daily (default)", {}, None),
+    ("current", {"intent": "current"}, None),
+    ("alerts", {"intent": "alerts"}, None),
+]
+
+
+def _parse_time(body: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        json.loads(body)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="One Call part selection benchmark")
+    p.add_argument("--iterations", type=int, default=2000)
+    args = p.parse_args(argv)
+
+    now = int(time.time())
+    print(f"{'request':<18} {'parts':<38} {'bytes':>8} {'parse µs':>10}")
+    for name, input_data, exclude in CASES:
+        parts, _ = WeatherTool.select_parts(input_data)
+        if exclude is None:
+            exclude = ",".join(p for p in WeatherTool.ONECALL_PARTS if p not in parts)
+        else:
+            parts = WeatherTool.ONECALL_PARTS
+        body = json.dumps(_sample_onecall(13.7563, 100.5018, now, exclude), ensure_ascii=False)
+        print(f"{name:<18} {'+'.join(parts):<38} {len(body.encode('utf-8')):>8} {_parse_time(body, args.iterations):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
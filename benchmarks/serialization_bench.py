@@ -0,0 +1,90 @@
+# benchmarks/serialization_bench.py
+"""
+Serialization cost of one Weather_Tool result, current path vs. tools/serialization.py.
+
+Current path (stdlib json, every consumer encodes on its own):
+    FastAPI JSONResponse body + PayloadStore file + st.json on each rerun + Bedrock toolResult (raw dict)
+Fast path:
+    one ToolResult.encoded (orjson when installed) reused for the body, the payload file and st.json,
+    plus the compact struct for the Bedrock toolResult
+
+    python -m benchmarks.serialization_bench --iterations 5000 --reruns 3
+"""
+import argparse
+import json
+import time
+from typing import Callable
+
+from backend.stubs import _sample_onecall
+from tools.serialization import HAS_ORJSON, ToolResult, dumps, encode_with
+
+
+def sample_result(days: int = 8):
+    onecall = _sample_onecall(13.7563, 100.5018, int(time.time()), exclude="minutely,hourly,alerts")
+    onecall["daily"] = onecall["daily"][:days]
+    return {
+        "weather_data": {"daily_forecast": onecall},
+        "geocoding": {"name": "Bangkok", "lat": 13.7563, "lon": 100.5018, "country": "TH",
+                      "local_names": {"th": "กรุงเทพมหานคร", "en": "Bangkok", "ja": "バンコク"}},
+    }
+
+
+def _stdlib_response(content):
+    # same options as starlette.responses.JSONResponse.render
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def current_path(result, reruns: int):
+    envelope = {"user_input": "อากาศที่กรุงเทพ", "tool_called": "Weather_Tool", "tool_result": result}
+    _stdlib_response(envelope)                       # HTTP body
+    json.dumps(result, ensure_ascii=False)           # PayloadStore.put
+    for _ in range(reruns):
+        json.dumps(result, default=repr)             # st.json(dict) on every rerun that shows it
+    json.dumps({"json": result})                     # botocore request body (toolResult block)
+
+
+def fast_path(result, reruns: int):
+    tool_result = ToolResult(result)
+    envelope = {"user_input": "อากาศที่กรุงเทพ", "tool_called": "Weather_Tool"}
+    encode_with(envelope, {"tool_result": tool_result.encoded})   # HTTP body
+    tool_result.encoded                                             # PayloadStore.put (same bytes)
+    for _ in range(reruns):
+        tool_result.text                                            # st.json(str)
+    json.dumps(tool_result.model_content())                         # botocore request body (compact)
+
+
+def _time(fn: Callable[[], None], iterations: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Serialization benchmark for Weather_Tool results")
+    p.add_argument("--iterations", type=int, default=5000)
+    p.add_argument("--days", type=int, default=8, help="forecast days in the sample One Call result")
+    p.add_argument("--reruns", type=int, default=3, help="Streamlit reruns that display the raw result")
+    args = p.parse_args(argv)
+
+    result = sample_result(args.days)
+    tool_result = ToolResult(result)
+    rows = [
+        ("encode result, stdlib json", _time(lambda: _stdlib_response(result), args.iterations)),
+        ("encode result, tools.serialization", _time(lambda: dumps(result), args.iterations)),
+        ("compact toolResult block", _time(lambda: ToolResult(result).model_content(), args.iterations)),
+        ("per result, current path", _time(lambda: current_path(result, args.reruns), args.iterations)),
+        ("per result, fast path", _time(lambda: fast_path(result, args.reruns), args.iterations)),
+    ]
+
+    print(f"orjson: {'yes' if HAS_ORJSON else 'no (stdlib fallback)'} · days={args.days} · reruns={args.reruns}")
+    for name, micros in rows:
+        print(f"{name:<38} {micros:>9.1f} µs")
+    raw_block = len(json.dumps({"json": result}).encode("utf-8"))
+    compact_block = len(json.dumps(tool_result.model_content()).encode("utf-8"))
+    print(f"{'Bedrock toolResult bytes (raw/compact)':<38} {raw_block:>9} / {compact_block}")
+
+
+if __name__ == "__main__":
+    main()
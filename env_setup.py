@@ -18,6 +18,85 @@ class Config:
     # OpenWeather API
     API_OPEN_WEATHER = os.getenv('API_OPEN_WEATHER')
 
+    # Bedrock prompt caching (cachePoint on system prompt + tool specs); model must support it
+    BEDROCK_PROMPT_CACHING = os.getenv('BEDROCK_PROMPT_CACHING', 'false').lower() in ('1', 'true', 'yes')
+    # Send weather tool results to the model in compact form (tools/serialization.py) instead of raw OpenWeather JSON
+    BEDROCK_COMPACT_TOOL_RESULTS = os.getenv('BEDROCK_COMPACT_TOOL_RESULTS', 'true').lower() in ('1', 'true', 'yes')
+
+    # Shared Bedrock invocation layer (connection pool, AIMD concurrency limit, throttle retries)
+    BEDROCK_MAX_POOL = int(os.getenv('BEDROCK_MAX_POOL', '50'))
+    BEDROCK_INITIAL_CONCURRENCY = int(os.getenv('BEDROCK_INITIAL_CONCURRENCY', '4'))
+    BEDROCK_MIN_CONCURRENCY = int(os.getenv('BEDROCK_MIN_CONCURRENCY', '1'))
+    BEDROCK_MAX_CONCURRENCY = int(os.getenv('BEDROCK_MAX_CONCURRENCY', '16'))
+    BEDROCK_MAX_RETRIES = int(os.getenv('BEDROCK_MAX_RETRIES', '4'))
+    BEDROCK_READ_TIMEOUT = float(os.getenv('BEDROCK_READ_TIMEOUT', '60'))
+
+    # Model routing tiers (inference profile ARNs / model ids); empty = use the default MODEL_ID
+    BEDROCK_MODEL_FAST = os.getenv('BEDROCK_MODEL_FAST', '')
+    BEDROCK_MODEL_STANDARD = os.getenv('BEDROCK_MODEL_STANDARD', '')
+    # a tier whose recent p95 latency exceeds this is treated as slow and skipped (ms)
+    ROUTER_SLOW_MS = float(os.getenv('ROUTER_SLOW_MS', '8000'))
+
+    # Profiling: fraction of agent turns profiled automatically (0 = only on request),
+    # rotating directory for .prof files and how many files to keep
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '100'))
+    # Profile every CLI turn from the start (toggle with /profile)
+    AGENT_PROFILE = os.getenv('AGENT_PROFILE', 'false').lower() in ('1', 'true', 'yes')
+
+    # End-to-end time budget for one agent turn (seconds)
+    AGENT_DEADLINE_SECONDS = float(os.getenv('AGENT_DEADLINE_SECONDS', '30'))
+
+    # Streamlit session limits (ring-buffered chat history / tool log, messages per page)
+    STREAMLIT_HISTORY_MAX = int(os.getenv('STREAMLIT_HISTORY_MAX', '200'))
+    STREAMLIT_TOOL_LOG_MAX = int(os.getenv('STREAMLIT_TOOL_LOG_MAX', '50'))
+    STREAMLIT_PAGE_SIZE = int(os.getenv('STREAMLIT_PAGE_SIZE', '20'))
+    # Raw payloads of a session idle this long (seconds) are deleted from disk
+    STREAMLIT_PAYLOAD_TTL = float(os.getenv('STREAMLIT_PAYLOAD_TTL', '3600'))
+    # Background agent turns: shared worker pool size and UI poll interval
+    STREAMLIT_WORKERS = int(os.getenv('STREAMLIT_WORKERS', '8'))
+    STREAMLIT_POLL_SECONDS = float(os.getenv('STREAMLIT_POLL_SECONDS', '0.7'))
+
+    # agent_server sessions: SQLite append-only log + in-memory hot tier
+    SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'agent_sessions.db')
+    SESSION_HOT_MAX = int(os.getenv('SESSION_HOT_MAX', '1000'))
+    SESSION_MAX_TURNS = int(os.getenv('SESSION_MAX_TURNS', '50'))
+    SESSION_IDLE_SECONDS = float(os.getenv('SESSION_IDLE_SECONDS', '1800'))
+    SESSION_RETENTION_SECONDS = float(os.getenv('SESSION_RETENTION_SECONDS', str(7 * 24 * 3600)))
+
+    # Weather alert subscriptions (backend/alerts.py): grid cell size for deduplicating fetches,
+    # per-cell poll interval, scheduler tick, fetch concurrency, hours ahead evaluated, events kept per subscription
+    ALERT_DB_PATH = os.getenv('ALERT_DB_PATH', 'agent_alerts.db')
+    ALERT_GRID_DEGREES = float(os.getenv('ALERT_GRID_DEGREES', '0.1'))
+    ALERT_POLL_SECONDS = float(os.getenv('ALERT_POLL_SECONDS', '600'))
+    ALERT_TICK_SECONDS = float(os.getenv('ALERT_TICK_SECONDS', '30'))
+    ALERT_FETCH_WORKERS = int(os.getenv('ALERT_FETCH_WORKERS', '8'))
+    ALERT_HORIZON_HOURS = int(os.getenv('ALERT_HORIZON_HOURS', '12'))
+    ALERT_EVENTS_MAX = int(os.getenv('ALERT_EVENTS_MAX', '50'))
+    # Most grid cells fetched in one scheduler pass (the rest wait for the next tick)
+    ALERT_MAX_CELLS_PER_TICK = int(os.getenv('ALERT_MAX_CELLS_PER_TICK', '50'))
+    # webhook_url must be https on one of these hosts ('.example.com' also matches subdomains); empty = webhooks off
+    ALERT_WEBHOOK_ALLOWED_HOSTS = os.getenv('ALERT_WEBHOOK_ALLOWED_HOSTS', '')
+    ALERT_SCHEDULER_ENABLED = os.getenv('ALERT_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    # The scheduler's own One Call circuit breaker ("onecall_alerts"), separate from the chat one
+    ALERT_BREAKER_FAILURES = int(os.getenv('ALERT_BREAKER_FAILURES', '5'))
+    ALERT_BREAKER_RESET_SECONDS = float(os.getenv('ALERT_BREAKER_RESET_SECONDS', '120'))
+
+    # OpenWeather updates current/forecast data roughly every 10 minutes (seconds)
+    WEATHER_FORECAST_TTL = int(os.getenv('WEATHER_FORECAST_TTL', '600'))
+
+    # One Call parts are cached separately; TTL per part (seconds) and max cached (location, part) entries
+    WEATHER_PART_TTLS = os.getenv('WEATHER_PART_TTLS', 'current=600,minutely=120,hourly=900,daily=3600,alerts=600')
+    WEATHER_PART_CACHE_MAX = int(os.getenv('WEATHER_PART_CACHE_MAX', '2048'))
+
+    # OpenWeather resilience (circuit breaker / hedged requests)
+    WEATHER_BREAKER_FAILURES = int(os.getenv('WEATHER_BREAKER_FAILURES', '3'))
+    WEATHER_BREAKER_RESET_SECONDS = float(os.getenv('WEATHER_BREAKER_RESET_SECONDS', '30'))
+    WEATHER_HEDGE_ENABLED = os.getenv('WEATHER_HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    WEATHER_HEDGE_PERCENTILE = float(os.getenv('WEATHER_HEDGE_PERCENTILE', '95'))
+    WEATHER_HEDGE_WORKERS = int(os.getenv('WEATHER_HEDGE_WORKERS', '32'))
+
     @staticmethod
     def print_env():
         print("Environment variables set successfully:")
@@ -0,0 +1,194 @@
+# model_router.py
+# เลือก model tier ต่อ converse round ตามขั้นตอน (tool selection / final phrasing), ความซับซ้อนของคำถาม
+# และเวลาที่เหลือ พร้อม fallback ไป tier อื่นเมื่อ tier ที่ต้องการช้าหรือโดน throttle
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from botocore.exceptions import ClientError
+from env_setup import Config
+from bedrock_config import MODEL_TIERS
+from bedrock_client import BedrockQueueTimeout, THROTTLE_CODES, get_bedrock_invoker
+
+TOOL_SELECTION = "tool_selection"
+FINAL_PHRASING = "final_phrasing"
+
+_TIME_WORDS = ("time", "กี่โมง", "เวลา", "วันที่")
+_WEATHER_WORDS = ("weather", "forecast", "rain", "temperature", "อากาศ", "ฝน", "อุณหภูมิ", "พยากรณ์")
+_JOIN_WORDS = (" and ", ",", "และ", "กับ", " vs ", "เทียบ")
+
+
+def query_complexity(text: str) -> int:
+    """Rough complexity score: combined tools, several places, long horizons, long questions."""
+    text = (text or "").lower()
+    score = 0
+    if any(w in text for w in _TIME_WORDS) and any(w in text for w in _WEATHER_WORDS):
+        score += 1
+    if sum(text.count(w) for w in _JOIN_WORDS) >= 2:
+        score += 1
+    days = [int(n) for n in re.findall(r"(\d+)\s*(?:days?|วัน)", text)]
+    if days and max(days) > 3:
+        score += 1
+    if len(text) > 160:
+        score += 1
+    return score
+
+
+class RoutingPolicy:
+    """
+    Which tier to try first for a round.
+    - final phrasing (rendering tool results as text) -> fast tier
+    - tool selection -> standard tier when the query is complex, otherwise fast
+    - if the remaining budget would not cover the preferred tier's p95 latency, or the tier
+      is currently slow, a faster tier is preferred
+    """
+
+    def __init__(self, tiers: List[str] = None, complex_threshold: int = 2, slow_ms: float = None,
+                 budget_factor: float = 1.5):
+        self.tiers = tiers or list(MODEL_TIERS)   # fastest first
+        self.complex_threshold = complex_threshold
+        self.slow_ms = Config.ROUTER_SLOW_MS if slow_ms is None else slow_ms
+        self.budget_factor = budget_factor
+
+    def preferred(self, step: str, query: str) -> str:
+        if step == TOOL_SELECTION and query_complexity(query) >= self.complex_threshold:
+            return self.tiers[-1]
+        return self.tiers[0]
+
+    def order(self, step: str, query: str, remaining: Optional[float], p95: Dict[str, float]) -> List[str]:
+        """Tiers to try, preferred first, then the rest as fallbacks."""
+        first = self.preferred(step, query)
+        idx = self.tiers.index(first)
+        # ลดลงไป tier ที่เร็วกว่าถ้า tier นี้ช้า หรือเวลาที่เหลือไม่พอสำหรับ p95 ของมัน
+        while idx > 0:
+            tier_p95 = p95.get(self.tiers[idx], 0.0)
+            too_slow = tier_p95 * 1000 > self.slow_ms
+            no_budget = remaining is not None and tier_p95 * self.budget_factor > remaining
+            if not (too_slow or no_budget):
+                break
+            idx -= 1
+        first = self.tiers[idx]
+        return [first] + [t for t in self.tiers if t != first]
+
+
+class _TierStats:
+    def __init__(self, size=200):
+        self.latencies = deque(maxlen=size)
+        self.calls = 0
+        self.errors = 0
+        self.throttled = 0
+        self.fallbacks_from = 0
+
+    def p(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class ModelRouter:
+    """
+    Routes each converse round to a model tier and records per-tier latency.
+    Works with any invoker exposing converse(session_id=, deadline=, max_retries=, **kwargs),
+    so tests can pass a BedrockInvoker built around a fake client.
+    """
+
+    def __init__(self, invoker=None, tiers: Dict[str, str] = None, policy: RoutingPolicy = None):
+        self._invoker = invoker
+        self.tiers = tiers or dict(MODEL_TIERS)
+        self.policy = policy or RoutingPolicy(list(self.tiers))
+        self._stats = {tier: _TierStats() for tier in self.tiers}
+        self._lock = threading.Lock()
+
+    @property
+    def invoker(self):
+        # ถ้าไม่ได้ส่ง invoker มา ใช้ตัวกลางของ process (รองรับ set_bedrock_client ภายหลัง)
+        return self._invoker or get_bedrock_invoker()
+
+    @staticmethod
+    def step_for(conversation: List[Dict[str, Any]]) -> str:
+        last = conversation[-1]["content"] if conversation else []
+        return FINAL_PHRASING if any("toolResult" in block for block in last) else TOOL_SELECTION
+
+    @staticmethod
+    def query_for(conversation: List[Dict[str, Any]]) -> str:
+        for message in reversed(conversation):
+            if message["role"] == "user":
+                texts = [b["text"] for b in message["content"] if "text" in b]
+                if texts:
+                    return " ".join(texts)
+        return ""
+
+    def converse(self, conversation: List[Dict[str, Any]], deadline=None, session_id: str = "default", **kwargs):
+        step = self.step_for(conversation)
+        remaining = deadline.remaining() if deadline is not None else None
+        with self._lock:
+            p95 = {tier: s.p(95) for tier, s in self._stats.items()}
+        order = self.policy.order(step, self.query_for(conversation), remaining, p95)
+        # tier ที่ชี้ไป model เดียวกันไม่ช่วยเป็น fallback
+        seen = set()
+        order = [t for t in order if not (self.tiers[t] in seen or seen.add(self.tiers[t]))]
+
+        last_error = None
+        for attempt, tier in enumerate(order):
+            is_last = attempt == len(order) - 1
+            started = time.monotonic()
+            try:
+                # tier แรกไม่ retry throttle เอง (fallback ไป tier อื่นเร็วกว่า); tier สุดท้ายใช้ retry ปกติ
+                response = self.invoker.converse(
+                    session_id=session_id, deadline=deadline, max_retries=None if is_last else 0,
+                    modelId=self.tiers[tier], messages=conversation, **kwargs)
+            except (ClientError, BedrockQueueTimeout) as e:
+                throttled = isinstance(e, BedrockQueueTimeout) or \
+                    e.response.get("Error", {}).get("Code", "") in THROTTLE_CODES
+                with self._lock:
+                    stats = self._stats[tier]
+                    stats.calls += 1
+                    stats.errors += 1
+                    stats.throttled += int(throttled)
+                    if not is_last:
+                        stats.fallbacks_from += 1
+                last_error = e
+                if is_last or not throttled or (deadline is not None and deadline.expired()):
+                    raise
+                continue
+
+            elapsed = time.monotonic() - started
+            with self._lock:
+                stats = self._stats[tier]
+                stats.calls += 1
+                stats.latencies.append(elapsed)
+            response["routing"] = {"step": step, "tier": tier, "model": self.tiers[tier],
+                                   "fallback": attempt > 0, "latency_ms": round(elapsed * 1000, 1)}
+            return response
+        raise last_error
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                tier: {
+                    "model": self.tiers[tier],
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "throttled": s.throttled,
+                    "fallbacks_from": s.fallbacks_from,
+                    "p50_ms": round(s.p(50) * 1000, 1),
+                    "p95_ms": round(s.p(95) * 1000, 1),
+                }
+                for tier, s in self._stats.items()
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """Process-wide ModelRouter on top of the shared Bedrock invoker."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
@@ -0,0 +1,174 @@
+# streamlit_app/history.py
+# Bounded chat history สำหรับ Streamlit: เก็บ raw tool payload ไว้นอก session_state แล้วอ้างอิงด้วย id
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+from tools.serialization import ToolResult, dumps, loads
+
+
+class PayloadStore:
+    """
+    Process-wide store for raw tool results. Each chat session gets its own directory
+    under the store root, payloads are written there as JSON (a ToolResult's pre-encoded
+    bytes are written as-is) and a small LRU of recently read JSON texts is kept in memory.
+    Session state only holds the returned reference string ("<session>/<id>").
+    A session not touched for `idle_ttl` seconds is assumed abandoned (closed browser tab)
+    and its directory is swept; the whole root is removed at interpreter exit.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_items: int = 64,
+                 idle_ttl: float = 3600.0, sweep_every: float = 60.0):
+        self.directory = directory or tempfile.mkdtemp(prefix="rbh_payloads_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.memory_items = memory_items
+        self.idle_ttl = idle_ttl
+        self.sweep_every = sweep_every
+        self._memory = OrderedDict()
+        self._seen: Dict[str, float] = {}  # session -> last touch (monotonic)
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _session_dir(self, session: str) -> str:
+        return os.path.join(self.directory, session)
+
+    def _path(self, ref: str) -> str:
+        session, _, name = ref.partition("/")
+        return os.path.join(self._session_dir(session), f"{name}.json")
+
+    def touch(self, session: str):
+        """Mark a session as alive (call on every rerun) so its payloads are not swept."""
+        with self._lock:
+            self._seen[session] = time.monotonic()
+
+    def put(self, payload: Any, session: str = "default") -> str:
+        self.touch(session)
+        self._maybe_sweep()
+        os.makedirs(self._session_dir(session), exist_ok=True)
+        ref = f"{session}/{uuid.uuid4().hex}"
+        with open(self._path(ref), "wb") as fh:
+            fh.write(payload.encoded if isinstance(payload, ToolResult) else dumps(payload))
+        return ref
+
+    def get_text(self, ref: str) -> Optional[str]:
+        """The stored JSON text (what st.json renders), or None if it was dropped."""
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+                return self._memory[ref]
+        try:
+            with open(self._path(ref), encoding="utf-8") as fh:
+                text = fh.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._memory[ref] = text
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return text
+
+    def get(self, ref: str) -> Any:
+        text = self.get_text(ref)
+        return None if text is None else loads(text)
+
+    def delete(self, ref: str):
+        with self._lock:
+            self._memory.pop(ref, None)
+        try:
+            os.remove(self._path(ref))
+        except FileNotFoundError:
+            pass
+
+    def drop_session(self, session: str):
+        """Remove every payload of one session (memory LRU and directory)."""
+        prefix = f"{session}/"
+        with self._lock:
+            self._seen.pop(session, None)
+            for ref in [r for r in self._memory if r.startswith(prefix)]:
+                del self._memory[ref]
+        shutil.rmtree(self._session_dir(session), ignore_errors=True)
+
+    def sweep(self, now: float = None) -> List[str]:
+        """Drop sessions idle for longer than idle_ttl; returns the swept session keys."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._last_sweep = now
+            idle = [s for s, seen in self._seen.items() if now - seen > self.idle_ttl]
+        for session in idle:
+            self.drop_session(session)
+        return idle
+
+    def _maybe_sweep(self):
+        # sweep แบบ opportunistic ตอน put (ไม่ต้องมี thread แยก)
+        with self._lock:
+            due = time.monotonic() - self._last_sweep >= self.sweep_every
+        if due:
+            self.sweep()
+
+    def close(self):
+        with self._lock:
+            self._memory.clear()
+            self._seen.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ChatHistory:
+    """
+    Ring buffer of chat messages for one session. When a message falls off the end,
+    its raw payload is deleted from the store too, so memory and disk stay bounded.
+    Messages: {"role", "content", "caption"?, "tool_info": {"tool_called", "tool_input", "raw_ref"}, "profile_ref"?}.
+    """
+
+    def __init__(self, store: PayloadStore, max_messages: int = 200, session: str = None):
+        self.store = store
+        self.session = session or uuid.uuid4().hex
+        self.messages = deque(maxlen=max_messages)
+
+    def touch(self):
+        self.store.touch(self.session)
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, role: str, content: str, tool_called: str = None, tool_input: Dict[str, Any] = None,
+               raw_result: Any = None, caption: str = None, profile: str = None):
+        message = {"role": role, "content": content}
+        if caption:
+            message["caption"] = caption
+        if profile:
+            message["profile_ref"] = self.store.put(profile, self.session)
+        if tool_called:
+            message["tool_info"] = {
+                "tool_called": tool_called,
+                "tool_input": tool_input,
+                "raw_ref": self.store.put(raw_result, self.session) if raw_result is not None else None,
+            }
+        if len(self.messages) == self.messages.maxlen:
+            self._drop(self.messages[0])
+        self.messages.append(message)
+
+    def page_count(self, page_size: int) -> int:
+        return max(1, -(-len(self.messages) // page_size))
+
+    def page(self, index: int, page_size: int) -> List[Dict[str, Any]]:
+        """Page 0 is the newest messages; higher pages go back in time (oldest first within a page)."""
+        end = len(self.messages) - index * page_size
+        start = max(0, end - page_size)
+        if end <= 0:
+            return []
+        return [self.messages[i] for i in range(start, end)]
+
+    def clear(self):
+        self.messages.clear()
+        self.store.drop_session(self.session)
+
+    def _drop(self, message: Dict[str, Any]):
+        for ref in ((message.get("tool_info") or {}).get("raw_ref"), message.get("profile_ref")):
+            if ref:
+                self.store.delete(ref)
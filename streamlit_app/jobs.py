@@ -0,0 +1,107 @@
+# streamlit_app/jobs.py
+# รัน agent turn บน background worker pool (ใช้ร่วมกันทุก session) เพื่อไม่ให้ script run ของ Streamlit ค้าง
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from tools.deadline import Deadline
+from tools.profiling import profile_turn
+
+
+class Job:
+    """
+    One agent turn running in the background. Worker threads only write to the Job;
+    the Streamlit script reads it on each poll (never touch st.session_state from a worker).
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+    def __init__(self, prompt: str, deadline: Deadline):
+        self.id = uuid.uuid4().hex[:8]
+        self.prompt = prompt
+        self.deadline = deadline
+        self.status = Job.QUEUED
+        self.events: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.profile: Optional[Dict[str, Any]] = None
+        self.profile_text: Optional[str] = None
+        self.created_at = time.time()
+        self.future = None
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (Job.DONE, Job.CANCELLED, Job.ERROR)
+
+    def add_event(self, text: str):
+        with self._lock:
+            self.events.append(text)
+
+    def snapshot_events(self) -> List[str]:
+        with self._lock:
+            return list(self.events)
+
+    def cancel(self):
+        # ยังไม่เริ่ม -> ยกเลิกใน queue ได้ทันที; กำลังรัน -> agent loop จะหยุดที่ขั้นถัดไป
+        self.deadline.cancel()
+        if self.future is not None and self.future.cancel():
+            self.status = Job.CANCELLED
+
+
+class JobManager:
+    """Process-wide worker pool shared by all Streamlit sessions."""
+
+    def __init__(self, max_workers: int = 8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-turn")
+
+    def submit(self, agent, prompt: str, deadline_seconds: float, session_id: str = "default",
+               profile: bool = False) -> Job:
+        job = Job(prompt, Deadline(deadline_seconds))
+        job.future = self.executor.submit(self._run, agent, job, session_id, profile)
+        return job
+
+    @staticmethod
+    def _run(agent, job: Job, session_id: str, profile: bool = False):
+        job.status = Job.RUNNING
+        conversation = [{"role": "user", "content": [{"text": job.prompt}]}]
+        try:
+            # profile ทำงานใน worker thread เดียวกับ turn (cProfile เห็นเฉพาะ thread ที่เปิดมัน)
+            with profile_turn(f"streamlit_{session_id[:8]}", requested=profile) as turn:
+                result = agent.process_conversation(
+                    conversation, deadline=job.deadline, session_id=session_id,
+                    on_event=lambda kind, payload: JobManager._on_event(job, kind, payload))
+            if turn is not None:
+                job.profile = turn.summary()
+                job.profile_text = turn.text()
+            job.result = result
+            if job.deadline.cancelled:
+                job.status = Job.CANCELLED
+            else:
+                job.status = Job.DONE if result.get("success") else Job.ERROR
+            if not result.get("success"):
+                job.error = result.get("message", "Unknown error occurred")
+        except Exception as e:
+            job.error = f"An error occurred: {str(e)}"
+            job.status = Job.ERROR
+
+    @staticmethod
+    def _on_event(job: Job, kind: str, payload: Any):
+        # ข้อความเดียวกับที่ tool_use_demo.py แสดง
+        if kind == "call_to_bedrock":
+            if "toolResult" in payload[-1]["content"][0]:
+                job.add_event("📤 Returning tool response to model...")
+            else:
+                job.add_event("📤 Sending query to the model...")
+        elif kind == "tool_use":
+            job.add_event(f"🔧 Executing tool: {payload['name']} with input: {payload.get('input', {})}")
+        elif kind == "model_text":
+            job.add_event(f"🤖 {payload}")
+        elif kind == "routing":
+            fallback = " (fallback)" if payload.get("fallback") else ""
+            job.add_event(f"🧭 Model tier: {payload['tier']}{fallback} for {payload['step']} in {payload['latency_ms']} ms")
@@ -2,9 +2,11 @@
 import streamlit as st
 import requests
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable
 import sys
 import os
+import time
+import uuid
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,7 +14,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.weather_tool import WeatherTool
 from tools.time_tool import TimeTool
 from tools.output_helper import Output
-from bedrock_config import MODEL_ID, SYSTEM_PROMPT, AWS_REGION, MAX_RECURSIONS
+from tools.deadline import Deadline
+from bedrock_config import MODEL_ID, AWS_REGION, get_system_prompt, get_tool_config, MAX_RECURSIONS, AGENT_DEADLINE_SECONDS
+from agent_loop import AgentLoop, format_tool_answer
+from env_setup import Config
+from streamlit_app.history import PayloadStore, ChatHistory
+from streamlit_app.jobs import Job, JobManager
+from collections import deque
 
 # Page configuration
 st.set_page_config(
@@ -65,117 +73,66 @@ st.markdown("""
 
 class BedrockAgent:
     def __init__(self):
-        self.system_prompt = [{"text": SYSTEM_PROMPT}]
-        self.tool_config = {"tools": [WeatherTool.get_tool_spec(), TimeTool.get_tool_spec()]}
+        # system prompt + tool specs are built once per process (with optional cache points)
+        self.system_prompt = get_system_prompt()
+        self.tool_config = get_tool_config()
         try:
-            import boto3
-            self.bedrockRuntimeClient = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+            # shared process-wide invoker: one client/connection pool + AIMD concurrency limit
+            from bedrock_client import get_bedrock_invoker
+            from model_router import get_model_router
+            self.bedrock = get_bedrock_invoker()
+            self.router = get_model_router()
             self.use_bedrock = True
         except Exception as e:
             st.warning(f"⚠️ AWS Bedrock not available: {e}. Using simple logic instead.")
-            self.bedrockRuntimeClient = None
+            self.bedrock = None
+            self.router = None
             self.use_bedrock = False
 
-    def process_conversation(self, conversation: List[Dict[str, Any]], max_recursion: int = MAX_RECURSIONS) -> Dict[str, Any]:
+    def process_conversation(self, conversation: List[Dict[str, Any]], max_recursion: int = MAX_RECURSIONS,
+                             deadline: Deadline = None, on_event: Callable[[str, Any], None] = None,
+                             session_id: str = "default") -> Dict[str, Any]:
         """
-        Process conversation with Bedrock AI, handling tool use and recursion
+        Process conversation with Bedrock AI, handling tool use in an iterative loop
+        bounded by max_recursion converse rounds and an end-to-end deadline
         """
         if max_recursion <= 0:
             return {"error": "max_recursion", "message": "Maximum recursion reached."}
+        if deadline is None:
+            deadline = Deadline(AGENT_DEADLINE_SECONDS)
 
         try:
             if self.use_bedrock:
-                return self._process_with_bedrock(conversation, max_recursion)
+                return self._process_with_bedrock(conversation, max_recursion, deadline, on_event, session_id)
             else:
-                return self._process_simple_agent(conversation)
+                return self._process_simple_agent(conversation, deadline, on_event)
         except Exception as e:
             return {"error": "processing_error", "message": str(e)}
     
-    def _process_with_bedrock(self, conversation: List[Dict[str, Any]], max_recursion: int) -> Dict[str, Any]:
+    def _process_with_bedrock(self, conversation: List[Dict[str, Any]], max_recursion: int, deadline: Deadline,
+                              on_event: Callable[[str, Any], None] = None, session_id: str = "default") -> Dict[str, Any]:
         """Process using real AWS Bedrock AI"""
-        # Send conversation to Bedrock
-        bedrock_response = self._send_conversation_to_bedrock(conversation)
-        
-        # Process the response
-        return self._process_model_response(bedrock_response, conversation, max_recursion)
+        loop = AgentLoop(
+            send=lambda conv, dl: self._send_conversation_to_bedrock(conv, dl, session_id),
+            invoke_tool=self._invoke_tool,
+            max_rounds=max_recursion,
+            on_event=on_event,
+        )
+        return loop.run(conversation, deadline)
 
-    def _send_conversation_to_bedrock(self, conversation: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Send conversation to Bedrock AI"""
-        return self.bedrockRuntimeClient.converse(
-            modelId=MODEL_ID,
-            messages=conversation,
+    def _send_conversation_to_bedrock(self, conversation: List[Dict[str, Any]], deadline: Deadline = None,
+                                      session_id: str = "default") -> Dict[str, Any]:
+        """Send conversation to Bedrock AI via the model router (tier per round, fair queue, throttle retries)"""
+        return self.router.converse(
+            conversation,
+            deadline=deadline,
+            session_id=session_id,
             system=self.system_prompt,
             toolConfig=self.tool_config,
         )
 
-    def _process_model_response(self, model_response: Dict[str, Any], conversation: List[Dict[str, Any]], max_recursion: int) -> Dict[str, Any]:
-        """Process model response and handle tool use"""
-        message = model_response["output"]["message"]
-        conversation.append(message)
-
-        if model_response["stopReason"] == "tool_use":
-            return self._handle_tool_use(message, conversation, max_recursion)
-        elif model_response["stopReason"] == "end_turn":
-            return {
-                "success": True,
-                "response": message["content"][0]["text"] if message["content"] else "",
-                "conversation": conversation,
-                "tool_called": None,  # No tool used in final response
-                "tool_input": None,
-                "tool_result": None
-            }
-        else:
-            return {
-                "success": True,
-                "response": "Model response processed",
-                "conversation": conversation,
-                "tool_called": None,
-                "tool_input": None,
-                "tool_result": None
-            }
-
-    def _handle_tool_use(self, model_response: Dict[str, Any], conversation: List[Dict[str, Any]], max_recursion: int) -> Dict[str, Any]:
-        """Handle tool use from model response"""
-        tool_results = []
-        tool_info = {
-            "tool_called": None,
-            "tool_input": None,
-            "tool_result": None
-        }
-        
-        for content_block in model_response["content"]:
-            if "toolUse" in content_block:
-                tool_use = content_block["toolUse"]
-                tool_response = self._invoke_tool(tool_use)
-                
-                # Store tool information for display
-                tool_info = {
-                    "tool_called": tool_use["name"],
-                    "tool_input": tool_use.get("input", {}),
-                    "tool_result": tool_response["content"]
-                }
-                
-                tool_results.append({
-                    "toolResult": {
-                        "toolUseId": tool_response["toolUseId"],
-                        "content": [{"json": tool_response["content"]}],
-                    }
-                })
-
-        if tool_results:
-            conversation.append({"role": "user", "content": tool_results})
-            response = self._send_conversation_to_bedrock(conversation)
-            result = self._process_model_response(response, conversation, max_recursion - 1)
-            
-            # Add tool information to the result
-            if result.get("success"):
-                result.update(tool_info)
-            
-            return result
-        
-        return {"error": "no_tool_use", "message": "No tool use found in response"}
-    
-    def _process_simple_agent(self, conversation: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _process_simple_agent(self, conversation: List[Dict[str, Any]], deadline: Deadline = None,
+                              on_event: Callable[[str, Any], None] = None) -> Dict[str, Any]:
         """Simple agent processing - fallback when Bedrock is not available"""
         if not conversation:
             return {"error": "no_conversation", "message": "No conversation provided"}
@@ -190,7 +147,9 @@ class BedrockAgent:
         # Simple fallback logic - just use weather tool for any query
         import uuid
         tool_payload = {"name": "Weather_Tool", "input": {"city": "Bangkok", "cnt": 3}, "toolUseId": str(uuid.uuid4())}
-        tool_result = self._invoke_tool(tool_payload)
+        if on_event:
+            on_event("tool_use", tool_payload)
+        tool_result = self._invoke_tool(tool_payload, deadline)
         
         return {
             "success": True,
@@ -202,14 +161,14 @@ class BedrockAgent:
         }
     
 
-    def _invoke_tool(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def _invoke_tool(self, payload: Dict[str, Any], deadline: Deadline = None) -> Dict[str, Any]:
         """Invoke the specified tool"""
         tool_name = payload["name"]
         input_data = payload.get("input", {})
         tool_id = payload["toolUseId"]
         
         if tool_name == "Weather_Tool":
-            result = WeatherTool.fetch_weather_data(input_data)
+            result = WeatherTool.fetch_weather_data(input_data, deadline=deadline)
         elif tool_name == "Time_Tool":
             result = TimeTool.fetch_time_data(input_data)
         else:
@@ -222,67 +181,98 @@ class BedrockAgent:
         tool_name = tool_payload["name"]
         result = tool_result["content"]
         
-        if tool_name == "Time_Tool":
-            if result.get("error"):
-                return f"❌ Error getting time: {result.get('message', 'Unknown error')}"
-            return f"🕐 Current time in {result.get('timezone', 'Asia/Bangkok')}: {result.get('current_time', 'N/A')}"
-        
-        elif tool_name == "Weather_Tool":
-            if result.get("error"):
-                return f"❌ Error getting weather: {result.get('message', 'Unknown error')}"
-            
+        if tool_name == "Weather_Tool" and not result.get("error"):
             weather_data = result.get("weather_data", {})
-            
             # Check for API key error
-            if "daily_error" in weather_data and weather_data["daily_error"].get("error") == "request_error":
-                if "401" in weather_data["daily_error"].get("message", ""):
-                    return "❌ **API Key Error:** OpenWeather API key is invalid or expired. Please check your API key configuration."
-            
-            if "daily_forecast" in weather_data:
-                forecast = weather_data["daily_forecast"]
-                if "list" in forecast and forecast["list"]:
-                    # Format multi-day forecast
-                    forecast_text = "🌤️ **พยากรณ์อากาศ 3 วันข้างหน้า:**\n\n"
-                    for i, day in enumerate(forecast["list"][:3], 1):
-                        temp = day.get("temp", {})
-                        weather = day.get("weather", [{}])[0]
-                        date = day.get("dt_txt", f"Day {i}")
-                        
-                        forecast_text += f"**วันที่ {i}:** {weather.get('description', 'N/A')}\n"
-                        forecast_text += f"   อุณหภูมิ: {temp.get('day', 'N/A')}°C (สูงสุด {temp.get('max', 'N/A')}°C, ต่ำสุด {temp.get('min', 'N/A')}°C)\n"
-                        forecast_text += f"   ความชื้น: {day.get('humidity', 'N/A')}%\n"
-                        forecast_text += f"   ความเร็วลม: {day.get('speed', 'N/A')} m/s\n\n"
-                    
-                    return forecast_text
-                else:
-                    return "🌤️ Weather data received but no forecast available"
-            elif "current_weather" in weather_data:
-                current = weather_data["current_weather"]
-                if "weather" in current and current["weather"]:
-                    weather = current["weather"][0]
-                    temp = current.get("main", {}).get("temp", "N/A")
-                    feels_like = current.get("main", {}).get("feels_like", "N/A")
-                    humidity = current.get("main", {}).get("humidity", "N/A")
-                    pressure = current.get("main", {}).get("pressure", "N/A")
-                    wind_speed = current.get("wind", {}).get("speed", "N/A")
-                    
-                    return f"🌤️ **สภาพอากาศปัจจุบัน:** {weather.get('description', 'N/A')}\n" \
-                           f"   อุณหภูมิ: {temp}°C (รู้สึกเหมือน {feels_like}°C)\n" \
-                           f"   ความชื้น: {humidity}%\n" \
-                           f"   ความกดอากาศ: {pressure} hPa\n" \
-                           f"   ความเร็วลม: {wind_speed} m/s"
-                else:
-                    return "🌤️ Current weather data received"
-            else:
-                return "🌤️ Weather data received"
-        
-        return "✅ Tool executed successfully"
+            daily_error = weather_data.get("daily_error") or {}
+            if daily_error.get("error") == "unauthorized" or daily_error.get("status_code") == 401:
+                return "❌ **API Key Error:** OpenWeather API key is invalid or expired. Please check your API key configuration."
+
+        # ใช้ formatter เดียวกับคำตอบบางส่วนของ AgentLoop (One Call current/daily ผ่าน ToolResult.compact)
+        return format_tool_answer({"tool_called": tool_name, "tool_result": result})
 
 # Initialize the agent
 @st.cache_resource
 def get_agent():
     return BedrockAgent()
 
+# worker pool ที่ทุก session ใช้ร่วมกัน
+@st.cache_resource
+def get_job_manager():
+    return JobManager(max_workers=Config.STREAMLIT_WORKERS)
+
+# raw tool payloads ของทุก session เก็บไว้นอก session_state (แยก directory ต่อ session, ลบเมื่อ idle เกิน TTL)
+@st.cache_resource
+def get_payload_store():
+    return PayloadStore(idle_ttl=Config.STREAMLIT_PAYLOAD_TTL)
+
+def render_message(message: Dict[str, Any]):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        if message.get("caption"):
+            st.caption(message["caption"])
+
+        # Show tool information if available; raw payload is loaded only on request
+        tool_info = message.get("tool_info")
+        if tool_info:
+            with st.expander("🔧 Tool Details"):
+                st.write(f"**Tool:** {tool_info['tool_called']}")
+                st.write(f"**Input:** {tool_info['tool_input']}")
+                ref = tool_info.get("raw_ref")
+                if ref and st.toggle("Show raw result", key=f"raw_{ref}"):
+                    # ส่ง JSON text ที่ encode ไว้แล้วให้ st.json ตรง ๆ (ไม่ต้อง decode/encode ซ้ำทุก rerun)
+                    payload = get_payload_store().get_text(ref)
+                    if payload is None:
+                        st.caption("Raw result is no longer available.")
+                    else:
+                        st.json(payload)
+
+        # cProfile report of this turn (profiling toggle or sampled)
+        # อ่านจาก disk เฉพาะเมื่อเปิด toggle (expander ปิดอยู่ก็ยังถูก render ทุก rerun)
+        profile_ref = message.get("profile_ref")
+        if profile_ref:
+            with st.expander("⏱️ Profile"):
+                if st.toggle("Show profile", key=f"profile_{profile_ref}"):
+                    report = get_payload_store().get(profile_ref)
+                    if report is None:
+                        st.caption("Profile is no longer available.")
+                    else:
+                        st.code(report)
+
+def record_job_result(job: Job, history: ChatHistory):
+    """Move a finished background turn into chat history and the tool log."""
+    result = job.result or {}
+    reply_to = f"↳ {job.prompt}"
+    if job.status == Job.CANCELLED and not result.get("tool_called"):
+        history.append("assistant", "✖️ Request cancelled.", caption=reply_to)
+        return
+    if not result.get("success"):
+        history.append("assistant", f"❌ Error: {job.error or 'Unknown error occurred'}", caption=reply_to)
+        return
+
+    tool_called = result.get("tool_called")
+    tool_input = result.get("tool_input")
+    if tool_called:
+        st.session_state.tool_log.append({
+            "tool": tool_called,
+            "input": tool_input,
+            "timestamp": st.session_state.get("message_count", 0)
+        })
+
+    notes = [reply_to]
+    if job.profile:
+        notes.append(f"🧪 Profiled ({job.profile['reason']}, {job.profile['elapsed_ms']} ms) → {job.profile['file']}")
+    if result.get("partial"):
+        notes.append(f"⏱️ Partial answer ({result.get('stop_reason')}) after {result.get('elapsed')}s")
+    usage = result.get("usage")
+    if usage:
+        notes.append(f"Tokens: input {usage['inputTokens']} · output {usage['outputTokens']} · "
+                     f"cache read {usage['cacheReadInputTokens']} · cache write {usage['cacheWriteInputTokens']}")
+    history.append("assistant", result.get("response", "No response generated"), tool_called=tool_called,
+                   tool_input=tool_input,
+                   raw_result=(result.get("encoded_result") or result.get("tool_result")) if tool_called else None,
+                   caption=" · ".join(notes), profile=job.profile_text)
+
 def main():
     # Header
     st.markdown('<h1 class="main-header">🌤️ RBH Weather AI Agent</h1>', unsafe_allow_html=True)
@@ -312,10 +302,24 @@ def main():
         st.write("- Time in New York")
         st.write("- สภาพอากาศในอีก 3 วันข้างหน้า ที่บางแสน")
         
+        # Bedrock saturation metrics (shared by all sessions in this process)
+        agent = get_agent()
+        if agent.use_bedrock:
+            with st.expander("📈 Bedrock Saturation"):
+                st.json(agent.bedrock.metrics())
+            with st.expander("🧭 Model Tiers"):
+                st.json(agent.router.metrics())
+        
+        # Profiling: cProfile report for each of this session's next turns
+        st.header("🧪 Profiling")
+        st.toggle("Profile my next turns", key="profile_turns")
+        if Config.PROFILE_SAMPLE_RATE > 0:
+            st.caption(f"Sampling {Config.PROFILE_SAMPLE_RATE:.0%} of all turns into `{Config.PROFILE_DIR}/`")
+        
         # Tool Execution Log
         st.header("🔧 Tool Execution Log")
         if "tool_log" in st.session_state and st.session_state.tool_log:
-            for i, log_entry in enumerate(st.session_state.tool_log[-5:], 1):  # Show last 5 entries
+            for i, log_entry in enumerate(list(st.session_state.tool_log)[-5:], 1):  # Show last 5 entries
                 with st.expander(f"Tool {i}: {log_entry['tool']}"):
                     st.write(f"**Input:** {log_entry['input']}")
                     st.write(f"**Timestamp:** {log_entry['timestamp']}")
@@ -324,12 +328,26 @@ def main():
         
         # Clear tool log button
         if st.button("🗑️ Clear Tool Log"):
-            st.session_state.tool_log = []
+            st.session_state.tool_log.clear()
             st.rerun()
     
     # Initialize session state
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
+    if "history" not in st.session_state:
+        st.session_state.history = ChatHistory(get_payload_store(), Config.STREAMLIT_HISTORY_MAX)
+    # ทุก rerun นับว่า session ยังใช้งานอยู่ payload จะไม่ถูก sweep
+    st.session_state.history.touch()
+    
+    if "tool_log" not in st.session_state:
+        st.session_state.tool_log = deque(maxlen=Config.STREAMLIT_TOOL_LOG_MAX)
+    
+    if "history_page" not in st.session_state:
+        st.session_state.history_page = 0
+    
+    if "pending_jobs" not in st.session_state:
+        st.session_state.pending_jobs = []
+    
+    if "session_key" not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
     
     if "agent" not in st.session_state:
         st.session_state.agent = get_agent()
@@ -337,103 +355,68 @@ def main():
     if "message_count" not in st.session_state:
         st.session_state.message_count = 0
     
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-            
-            # Show tool information if available
-            if "tool_info" in message:
-                with st.expander("🔧 Tool Details"):
-                    st.json(message["tool_info"])
+    # Move background turns that have finished into history before rendering it
+    history = st.session_state.history
+    pending = st.session_state.pending_jobs
+    for job in [j for j in pending if j.finished]:
+        pending.remove(job)
+        record_job_result(job, history)
+    
+    # Display chat messages: one page at a time so each rerun costs the same
+    page_size = Config.STREAMLIT_PAGE_SIZE
+    pages = history.page_count(page_size)
+    page = min(st.session_state.history_page, pages - 1)
+    if pages > 1:
+        col_older, col_info, col_newer = st.columns([1, 2, 1])
+        if col_older.button("⬅️ Older", disabled=page >= pages - 1):
+            st.session_state.history_page = page + 1
+            st.rerun()
+        col_info.caption(f"Page {page + 1} of {pages} · {len(history)} messages kept")
+        if col_newer.button("Newer ➡️", disabled=page == 0):
+            st.session_state.history_page = page - 1
+            st.rerun()
+    for message in history.page(page, page_size):
+        render_message(message)
+    
+    # Background jobs still in flight: status, incremental updates and a cancel button
+    for job in pending:
+        with st.chat_message("assistant"):
+            st.caption(f"↳ {job.prompt}")
+            st.write(f"⏳ **{job.status}** · {job.deadline.elapsed():.1f}s")
+            for event in job.snapshot_events():
+                st.info(event)
+            if st.button("✖️ Cancel", key=f"cancel_{job.id}"):
+                job.cancel()
+                st.rerun()
     
     # Chat input
     if prompt := st.chat_input("Ask about weather or time..."):
         # Increment message count
         st.session_state.message_count += 1
         
-        # Add user message to chat history
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        
-        # Display user message
-        with st.chat_message("user"):
-            st.markdown(prompt)
+        # Add user message to chat history (jump back to the newest page)
+        history.append("user", prompt)
+        st.session_state.history_page = 0
         
-        # Process with agent
-        with st.chat_message("assistant"):
-            with st.spinner("Processing your request..."):
-                try:
-                    conversation = [{"role": "user", "content": [{"text": prompt}]}]
-                    
-                    # Show "Sending query to the model..." like tool_use_demo.py
-                    st.info("📤 Sending query to the model...")
-                    
-                    result = st.session_state.agent.process_conversation(conversation)
-                    
-                    if result.get("success"):
-                        # Show tool execution details if available
-                        tool_called = result.get("tool_called")
-                        tool_input = result.get("tool_input")
-                        
-                        if tool_called:
-                            # Show tool execution like tool_use_demo.py
-                            st.info(f"🔧 Executing tool: {tool_called} with input: {tool_input}")
-                            
-                            # Add tool execution to sidebar log
-                            if "tool_log" not in st.session_state:
-                                st.session_state.tool_log = []
-                            
-                            tool_log_entry = {
-                                "tool": tool_called,
-                                "input": tool_input,
-                                "timestamp": st.session_state.get("message_count", 0)
-                            }
-                            st.session_state.tool_log.append(tool_log_entry)
-                        
-                        response = result.get("response", "No response generated")
-                        
-                        # Show model response like tool_use_demo.py
-                        if st.session_state.agent.use_bedrock:
-                            st.info("🤖 Model response:")
-                        
-                        st.markdown(response)
-                        
-                        # Tool information will be shown in chat history, not here
-                        
-                        # Add assistant message to chat history
-                        message_data = {
-                            "role": "assistant", 
-                            "content": response
-                        }
-                        
-                        # Add tool info only if tool was used
-                        if tool_called:
-                            message_data["tool_info"] = {
-                                "tool_called": tool_called,
-                                "tool_input": tool_input,
-                                "raw_result": result.get("tool_result")
-                            }
-                        
-                        st.session_state.messages.append(message_data)
-                    else:
-                        error_msg = result.get("message", "Unknown error occurred")
-                        st.error(f"❌ Error: {error_msg}")
-                        st.session_state.messages.append({
-                            "role": "assistant", 
-                            "content": f"❌ Error: {error_msg}"
-                        })
-                        
-                except Exception as e:
-                    error_msg = f"An error occurred: {str(e)}"
-                    st.error(f"❌ {error_msg}")
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": f"❌ {error_msg}"
-                    })
+        # Queue the turn on the shared worker pool; several questions may run at once
+        job = get_job_manager().submit(st.session_state.agent, prompt, AGENT_DEADLINE_SECONDS,
+                                       session_id=st.session_state.session_key,
+                                       profile=st.session_state.get("profile_turns", False))
+        pending.append(job)
+        st.rerun()
     
     # Clear chat button
     if st.button("🗑️ Clear Chat"):
-        st.session_state.messages = []
+        for job in pending:
+            job.cancel()
+        pending.clear()
+        history.clear()
+        st.session_state.history_page = 0
+        st.rerun()
+    
+    # Poll while work is in flight; new input interrupts the sleep without affecting the workers
+    if pending:
+        time.sleep(Config.STREAMLIT_POLL_SECONDS)
         st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+# tests/test_agent_loop.py
+# AgentLoop: หยุดกลางคัน (deadline / max_rounds) แล้วต่อ conversation เดิมได้ + คำตอบบางส่วนจาก tool result
+import time
+import pytest
+from agent_loop import MIN_BEDROCK_BUDGET, MIN_TOOL_BUDGET, AgentLoop, format_tool_answer
+from tools.deadline import Deadline
+
+WEATHER_RESULT = {
+    "weather_data": {
+        "daily_forecast": {
+            "lat": 13.75, "lon": 100.5, "timezone": "Asia/Bangkok", "timezone_offset": 25200,
+            "current": {"dt": 1760000000, "temp": 31.0, "feels_like": 36.0, "humidity": 70, "wind_speed": 3.0,
+                        "weather": [{"description": "เมฆมาก"}]},
+            "daily": [{"dt": 1760000000, "temp": {"day": 32.0, "min": 26.0, "max": 34.0}, "humidity": 70,
+                       "wind_speed": 3.0, "pop": 0.6, "weather": [{"description": "ฝนเล็กน้อย"}]}],
+        },
+        "parts": ["current", "daily"],
+    },
+    "geocoding": {"name": "Bangkok", "country": "TH"},
+}
+
+
+def check_alternation(conversation):
+    # Converse ต้องการ user / assistant สลับกัน และเริ่มด้วย user
+    roles = [m["role"] for m in conversation]
+    assert roles[0] == "user"
+    for prev, cur in zip(roles, roles[1:]):
+        if prev == cur:
+            raise AssertionError(f"ValidationException: consecutive {cur} messages")
+
+
+def tool_use_reply(conversation, deadline):
+    check_alternation(conversation)
+    return {"stopReason": "tool_use", "usage": {},
+            "output": {"message": {"role": "assistant", "content": [
+                {"toolUse": {"toolUseId": f"t{len(conversation)}", "name": "Weather_Tool", "input": {"city": "Bangkok"}}}]}}}
+
+
+def end_turn_reply(conversation, deadline):
+    check_alternation(conversation)
+    return {"stopReason": "end_turn", "usage": {},
+            "output": {"message": {"role": "assistant", "content": [{"text": "done"}]}}}
+
+
+def invoke_weather(tool_use, deadline):
+    return {"toolUseId": tool_use["toolUseId"], "content": WEATHER_RESULT}
+
+
+def test_max_rounds_stop_closes_turn_and_next_turn_is_valid():
+    conversation = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+    result = AgentLoop(tool_use_reply, invoke_weather, max_rounds=1).run(conversation, Deadline(30))
+    assert result["stop_reason"] == "max_rounds"
+    assert result["partial"]
+    assert conversation[-1] == {"role": "assistant", "content": [{"text": result["response"]}]}
+    assert "Bangkok" in result["response"]
+
+    conversation.append({"role": "user", "content": [{"text": "พรุ่งนี้ล่ะ"}]})
+    resumed = AgentLoop(end_turn_reply, invoke_weather).run(conversation, Deadline(30))
+    assert resumed["stop_reason"] == "end_turn"
+    assert resumed["response"] == "done"
+
+
+def test_deadline_before_first_round_closes_turn():
+    conversation = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+    deadline = Deadline(0.1)
+    result = AgentLoop(end_turn_reply, invoke_weather).run(conversation, deadline)
+    assert result["stop_reason"] == "deadline"
+    assert result["rounds"] == 0
+    assert conversation[-1]["role"] == "assistant"
+    conversation.append({"role": "user", "content": [{"text": "again"}]})
+    check_alternation(conversation)
+
+
+def test_cancelled_turn_after_tool_results():
+    deadline = Deadline(30)
+
+    def invoke_and_cancel(tool_use, dl):
+        dl.cancel()
+        return invoke_weather(tool_use, dl)
+
+    conversation = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+    result = AgentLoop(tool_use_reply, invoke_and_cancel).run(conversation, deadline)
+    assert result["stop_reason"] == "cancelled"
+    assert [m["role"] for m in conversation] == ["user", "assistant", "user", "assistant"]
+    assert "toolResult" in conversation[2]["content"][0]
+
+
+def test_deadline_cut_off_after_tool_round_answers_from_tool_result():
+    deadline = Deadline(30)
+
+    def invoke_slow(tool_use, dl):
+        # เหลือเวลาน้อยกว่าที่ converse อีกรอบต้องใช้
+        dl.expires_at = time.monotonic() + MIN_BEDROCK_BUDGET / 2
+        return invoke_weather(tool_use, dl)
+
+    conversation = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+    result = AgentLoop(tool_use_reply, invoke_slow).run(conversation, deadline)
+    assert result["stop_reason"] == "deadline"
+    assert result["rounds"] == 1
+    assert result["partial"] and "Bangkok" in result["response"]
+    check_alternation(conversation)
+    assert conversation[-1]["role"] == "assistant"
+
+
+def test_tool_is_skipped_when_too_little_time_is_left():
+    deadline = Deadline(30)
+    invoked = []
+
+    def send_slow(conversation, dl):
+        dl.expires_at = time.monotonic() + MIN_TOOL_BUDGET / 2
+        return tool_use_reply(conversation, dl)
+
+    conversation = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+    result = AgentLoop(send_slow, lambda tool_use, dl: invoked.append(tool_use)).run(conversation, deadline)
+    assert invoked == []
+    assert result["stop_reason"] == "deadline"
+    tool_result = conversation[2]["content"][0]["toolResult"]
+    assert tool_result["content"][0]["json"]["error"] == "deadline_exceeded"
+
+
+def test_end_turn_leaves_conversation_untouched():
+    conversation = [{"role": "user", "content": [{"text": "hi"}]}]
+    AgentLoop(end_turn_reply, invoke_weather).run(conversation, Deadline(30))
+    assert [m["role"] for m in conversation] == ["user", "assistant"]
+
+
+def test_weather_partial_uses_one_call_daily():
+    text = format_tool_answer({"tool_called": "Weather_Tool", "tool_result": WEATHER_RESULT})
+    assert "no forecast available" not in text
+    assert "ฝนเล็กน้อย" in text and "26.0–34.0°C" in text and "60%" in text
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"results": [{"timezone": "Asia/Tokyo", "current_time": "2026-01-01 09:00:00", "label": "Tokyo"}],
+      "truncated": False}, "Tokyo: 2026-01-01 09:00:00"),
+    ({"timezone": "Asia/Bangkok", "current_time": "2026-01-01 07:00:00"}, "2026-01-01 07:00:00"),
+])
+def test_time_partial_handles_single_and_batch(result, expected):
+    text = format_tool_answer({"tool_called": "Time_Tool", "tool_result": result})
+    assert expected in text
+    assert "N/A" not in text
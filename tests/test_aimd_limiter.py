@@ -0,0 +1,97 @@
+# tests/test_aimd_limiter.py
+# AIMDLimiter: ให้ slot แบบ round-robin ระหว่าง session, queue timeout, และการปรับ limit (AIMD)
+import threading
+import time
+import pytest
+from bedrock_client import AIMDLimiter, BedrockQueueTimeout
+
+
+def wait_queued(limiter, n, timeout=1.0):
+    end = time.monotonic() + timeout
+    while limiter.snapshot()["queued"] < n:
+        assert time.monotonic() < end, "waiters did not queue"
+        time.sleep(0.001)
+
+
+def test_acquire_without_contention_is_immediate():
+    limiter = AIMDLimiter(initial=2)
+    assert limiter.acquire() == 0.0
+    assert limiter.acquire() == 0.0
+    assert limiter.snapshot()["in_flight"] == 2
+
+
+def test_queue_timeout_raises_and_leaves_no_ticket():
+    limiter = AIMDLimiter(initial=1, min_limit=1)
+    limiter.acquire()
+    with pytest.raises(BedrockQueueTimeout):
+        limiter.acquire("s", timeout=0.02)
+    snapshot = limiter.snapshot()
+    assert snapshot["queued"] == 0 and snapshot["sessions_waiting"] == 0
+    limiter.release()
+    assert limiter.acquire(timeout=0.02) == 0.0
+
+
+def test_waiters_are_granted_round_robin_across_sessions():
+    limiter = AIMDLimiter(initial=1, min_limit=1, max_limit=1)
+    limiter.acquire()
+    order, lock = [], threading.Lock()
+
+    def worker(session, label):
+        limiter.acquire(session, timeout=2)
+        with lock:
+            order.append(label)
+
+    threads = []
+    # session "busy" เข้าคิวก่อน 3 ครั้ง แล้ว "quiet" 1 ครั้ง
+    for session, label in (("busy", "b1"), ("busy", "b2"), ("busy", "b3"), ("quiet", "q1")):
+        t = threading.Thread(target=worker, args=(session, label))
+        t.start()
+        threads.append(t)
+        wait_queued(limiter, len(threads))
+    for _ in threads:
+        # success ไม่ดัน limit ให้เกิน 1 (max_limit) จึงปล่อยทีละคน
+        limiter.release()
+        time.sleep(0.02)
+    for t in threads:
+        t.join(1)
+    assert order == ["b1", "q1", "b2", "b3"]
+
+
+def test_success_increases_and_throttle_decreases():
+    limiter = AIMDLimiter(initial=4, min_limit=1, max_limit=16)
+    limiter.acquire()
+    limiter.release(success=True)
+    assert limiter.limit == pytest.approx(4.25)
+    limiter.acquire()
+    limiter.release(throttled=True, success=False, started_at=time.monotonic())
+    assert limiter.limit == pytest.approx(2.125)
+
+
+def test_limit_stays_within_bounds():
+    limiter = AIMDLimiter(initial=2, min_limit=1, max_limit=3)
+    for _ in range(50):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert limiter.limit == 3
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(throttled=True, success=False)
+    assert limiter.limit == 1
+
+
+def test_concurrent_throttles_decrease_once():
+    limiter = AIMDLimiter(initial=16, max_limit=16)
+    starts = []
+    for _ in range(8):
+        limiter.acquire()
+        starts.append(time.monotonic())
+    for started in starts:
+        limiter.release(throttled=True, success=False, started_at=started)
+    snapshot = limiter.snapshot()
+    assert snapshot["limit"] == 8
+    assert snapshot["throttles_ignored"] == 7
+
+    # call ที่ส่งหลังการลดครั้งล่าสุด ลดได้อีกครั้ง
+    limiter.acquire()
+    limiter.release(throttled=True, success=False, started_at=time.monotonic())
+    assert limiter.snapshot()["limit"] == 4
@@ -0,0 +1,99 @@
+# tests/test_alerts.py
+# evaluate / diff_states ของ alert scheduler: แจ้งเฉพาะเมื่อเงื่อนไขเริ่ม เปลี่ยน หรือหมดไป
+# ไม่ใช่ทุกครั้งที่ window ของพยากรณ์เลื่อนไป
+import pytest
+from backend.alerts import AlertScheduler, SubscriptionRegistry, Thresholds, diff_states, evaluate, trim_snapshot
+
+HOUR = 3600
+T0 = 1760000000
+
+
+def snapshot(pops, start=T0, temp=30.0, humidity=50, wind=3.0, alerts=()):
+    hourly = [{"dt": start + i * HOUR, "pop": pop, "temp": temp, "humidity": humidity, "wind_speed": wind}
+              for i, pop in enumerate(pops)]
+    return {"current": {"dt": start, "temp": temp, "humidity": humidity, "wind_speed": wind},
+            "hourly": hourly, "alerts": list(alerts)}
+
+
+def test_rain_onset_and_magnitude():
+    state = evaluate(snapshot([0.1, 0.2, 0.7, 0.9]), Thresholds(rain_probability=0.6))
+    assert state == {"rain": {"onset": T0 + 2 * HOUR, "from": T0 + 2 * HOUR, "max_probability": 0.9}}
+    assert evaluate(snapshot([0.7, 0.2]), Thresholds(rain_probability=0.6))["rain"]["onset"] == "ongoing"
+    assert evaluate(snapshot([0.1, 0.2]), Thresholds(rain_probability=0.6)) == {}
+
+
+def test_heat_wind_and_official_alerts():
+    alert = {"event": "Heavy rain", "sender_name": "TMD", "start": T0, "end": T0 + HOUR}
+    state = evaluate(snapshot([0.0], temp=35.0, humidity=70, wind=15.0, alerts=[alert]),
+                     Thresholds(heat_index=40, wind_speed=10, official_alerts=True))
+    assert state["heat"]["onset"] == "ongoing" and state["heat"]["peak_heat_index"] >= 40
+    assert state["wind"] == {"onset": "ongoing", "max_wind_speed": 15, "at": T0}
+    assert state["alerts"] == [{"event": "Heavy rain", "sender": "TMD", "start": T0, "end": T0 + HOUR}]
+    # official_alerts ปิด -> ไม่ดู alerts
+    assert "alerts" not in evaluate(snapshot([0.0], alerts=[alert]), Thresholds(rain_probability=0.9))
+
+
+def test_diff_started_changed_cleared():
+    assert diff_states({}, {"rain": {"onset": "ongoing", "max_probability": 0.7}}) == \
+        {"started": {"rain": {"onset": "ongoing", "max_probability": 0.7}}}
+    assert diff_states({"rain": {"onset": "ongoing", "max_probability": 0.7}},
+                       {"rain": {"onset": "ongoing", "max_probability": 0.9}}) == \
+        {"changed": {"rain": {"onset": "ongoing", "max_probability": 0.9}}}
+    assert diff_states({"rain": {"onset": "ongoing", "max_probability": 0.7}}, {}) == {"cleared": ["rain"]}
+    assert diff_states({}, {}) == {}
+
+
+def test_sliding_window_timestamps_are_not_a_change():
+    thresholds = Thresholds(rain_probability=0.6, wind_speed=10)
+    before = evaluate(snapshot([0.7, 0.8, 0.8], wind=12.0), thresholds)
+    # หนึ่งชั่วโมงต่อมา: ฝนยังตกอยู่ ชั่วโมงแรกของ window (from/at) เลื่อนไปแล้ว
+    after = evaluate(snapshot([0.8, 0.8, 0.7], start=T0 + HOUR, wind=12.0), thresholds)
+    assert before["rain"]["from"] != after["rain"]["from"]
+    assert diff_states(before, after) == {}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return SubscriptionRegistry(path=str(tmp_path / "alerts.db"))
+
+
+def run_passes(scheduler, n):
+    # pass แรกแค่สุ่มเวลาเริ่มของ cell ใหม่ (ภายใน poll interval) แล้วแต่ละ pass ห่างกันเกิน interval
+    scheduler.run_once(now=0.0)
+    return [scheduler.run_once(now=1000.0 + i * 1000) for i in range(n)]
+
+
+def test_one_rain_episode_notifies_start_and_clear_only(registry):
+    sub = registry.add(13.75, 100.5, Thresholds(rain_probability=0.6))
+    passes = [[0.1, 0.2, 0.7, 0.8], [0.2, 0.7, 0.8, 0.8], [0.7, 0.8, 0.8, 0.3], [0.8, 0.8, 0.3, 0.1],
+              [0.2, 0.1, 0.1, 0.1]]
+    feed = iter(snapshot(pops, start=T0 + i * HOUR) for i, pops in enumerate(passes))
+    scheduler = AlertScheduler(registry, poll_seconds=60, fetch=lambda lat, lon, alerts: next(feed))
+    assert run_passes(scheduler, len(passes)) == [1] * len(passes)
+    events = scheduler.events(sub.id)
+    kinds = [sorted(e["changes"]) for e in events]
+    # onset เลื่อนเข้ามา (T0+2h -> ongoing) นับเป็น changed หนึ่งครั้ง
+    assert kinds == [["started"], ["changed"], ["cleared"]]
+    assert [e["seq"] for e in events] == [0, 1, 2]
+    assert scheduler.events(sub.id, since=2) == events[2:]
+
+
+def test_fetch_error_keeps_previous_state(registry):
+    sub = registry.add(13.75, 100.5, Thresholds(rain_probability=0.6))
+    feed = iter([snapshot([0.9]), {"error": "request_error"}, snapshot([0.9], start=T0 + HOUR)])
+    scheduler = AlertScheduler(registry, poll_seconds=60, fetch=lambda lat, lon, alerts: next(feed))
+    run_passes(scheduler, 3)
+    assert len(scheduler.events(sub.id)) == 1
+    assert scheduler.stats()["fetch_errors"] == 1
+
+
+def test_cells_per_tick_are_capped(registry):
+    for i in range(5):
+        registry.add(10 + i, 100.0, Thresholds(rain_probability=0.6))
+    scheduler = AlertScheduler(registry, poll_seconds=60, max_cells_per_tick=2,
+                               fetch=lambda lat, lon, alerts: trim_snapshot(snapshot([0.1]), 12))
+    assert scheduler.run_once(now=0.0) == 0          # รอบแรกกระจายไปทั่ว poll interval
+    assert scheduler.run_once(now=60.0) == 2
+    assert scheduler.run_once(now=61.0) == 2
+    assert scheduler.run_once(now=62.0) == 1
+    assert scheduler.stats()["deferred"] == 4
@@ -0,0 +1,56 @@
+# tests/test_http_cache.py
+# ETag / If-None-Match / If-Modified-Since ของ weather routes
+from email.utils import formatdate
+from backend.http_cache import cache_headers, is_not_modified, make_etag
+
+TS = 1760000000
+
+
+def test_etag_is_weak_and_stable():
+    etag = make_etag(TS, "Bangkok", {"current": TS, "hourly": TS - 60})
+    assert etag.startswith('W/"')
+    assert etag == make_etag(TS, "Bangkok", {"hourly": TS - 60, "current": TS})
+
+
+def test_etag_changes_with_any_part():
+    base = make_etag(TS, "Bangkok", {"current": TS, "minutely": TS})
+    assert make_etag(TS, "Bangkok", {"current": TS, "minutely": TS + 120}) != base
+    assert make_etag(TS, "Chiang Mai", {"current": TS, "minutely": TS}) != base
+    assert make_etag(TS + 600, "Bangkok", {"current": TS, "minutely": TS}) != base
+
+
+def test_if_none_match_matches_weak_strong_lists_and_star():
+    etag = make_etag(TS, "Bangkok")
+    strong = etag[2:]
+    assert is_not_modified({"if-none-match": etag}, etag, TS)
+    assert is_not_modified({"if-none-match": strong}, etag, TS)
+    assert is_not_modified({"if-none-match": f'"other", {etag}'}, etag, TS)
+    assert is_not_modified({"if-none-match": "*"}, etag, TS)
+    assert not is_not_modified({"if-none-match": '"other"'}, etag, TS)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    etag = make_etag(TS, "Bangkok")
+    headers = {"if-none-match": '"other"', "if-modified-since": formatdate(TS + 60, usegmt=True)}
+    assert not is_not_modified(headers, etag, TS)
+
+
+def test_if_modified_since():
+    etag = make_etag(TS, "Bangkok")
+    assert is_not_modified({"if-modified-since": formatdate(TS, usegmt=True)}, etag, TS)
+    assert not is_not_modified({"if-modified-since": formatdate(TS - 1, usegmt=True)}, etag, TS)
+    assert not is_not_modified({"if-modified-since": "not a date"}, etag, TS)
+
+
+def test_if_modified_since_ignored_when_disabled():
+    # POST /chat_agent: เวลาอย่างเดียวแยกคำถามต่างกันไม่ได้
+    headers = {"if-modified-since": formatdate(TS, usegmt=True)}
+    assert not is_not_modified(headers, make_etag(TS, "q"), TS, use_modified_since=False)
+
+
+def test_max_age_counts_down_and_is_capped():
+    headers = cache_headers(TS, "W/\"x\"", ttl=600, now=TS + 100)
+    assert headers["Cache-Control"] == "public, max-age=500"
+    assert cache_headers(TS, "W/\"x\"", ttl=600, now=TS + 100, max_age_cap=119)["Cache-Control"] == "public, max-age=119"
+    assert cache_headers(TS, "W/\"x\"", ttl=600, now=TS + 900, shared=False)["Cache-Control"] == "private, max-age=0"
+    assert headers["Last-Modified"] == formatdate(TS, usegmt=True)
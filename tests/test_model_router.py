@@ -0,0 +1,81 @@
+# tests/test_model_router.py
+# ModelRouter บน BedrockInvoker จริง + StubBedrockClient (ไม่เรียก AWS)
+#   python -m pytest -q tests/test_model_router.py
+import unittest
+from botocore.exceptions import ClientError
+from backend.stubs import StubBedrockClient
+from bedrock_client import BedrockInvoker
+from model_router import FINAL_PHRASING, TOOL_SELECTION, ModelRouter
+
+TIERS = {"fast": "model-fast", "standard": "model-standard"}
+SIMPLE = [{"role": "user", "content": [{"text": "อากาศที่กรุงเทพ"}]}]
+COMPLEX = [{"role": "user", "content": [{"text": "weather and time in Bangkok, Chiang Mai and Phuket for 7 days"}]}]
+
+
+def make_router(**stub_kwargs):
+    client = StubBedrockClient(latency=0.0, jitter=0.0, seed=1, **stub_kwargs)
+    invoker = BedrockInvoker(client=client, max_retries=1, base_backoff=0.0, max_backoff=0.0)
+    return ModelRouter(invoker=invoker, tiers=dict(TIERS)), invoker, client
+
+
+class TierOrderTest(unittest.TestCase):
+    def test_simple_tool_selection_uses_fast_tier(self):
+        router, _, client = make_router()
+        response = router.converse(SIMPLE)
+        self.assertEqual(response["routing"]["step"], TOOL_SELECTION)
+        self.assertEqual(response["routing"]["tier"], "fast")
+        self.assertFalse(response["routing"]["fallback"])
+        self.assertEqual(client.model_calls, ["model-fast"])
+
+    def test_complex_tool_selection_uses_standard_tier(self):
+        router, _, client = make_router()
+        response = router.converse(COMPLEX)
+        self.assertEqual(response["routing"]["tier"], "standard")
+        self.assertEqual(client.model_calls, ["model-standard"])
+
+    def test_final_phrasing_uses_fast_tier(self):
+        router, _, _ = make_router()
+        conversation = COMPLEX + [
+            {"role": "assistant", "content": [{"toolUse": {"toolUseId": "t1", "name": "Weather_Tool", "input": {}}}]},
+            {"role": "user", "content": [{"toolResult": {"toolUseId": "t1", "content": [{"json": {}}]}}]},
+        ]
+        response = router.converse(conversation)
+        self.assertEqual(response["routing"]["step"], FINAL_PHRASING)
+        self.assertEqual(response["routing"]["tier"], "fast")
+
+
+class FallbackTest(unittest.TestCase):
+    def test_throttled_fast_tier_falls_back_without_retry(self):
+        router, invoker, client = make_router(throttle_rate=1.0, throttle_models={"model-fast"})
+        response = router.converse(SIMPLE)
+        self.assertEqual(response["routing"]["tier"], "standard")
+        self.assertTrue(response["routing"]["fallback"])
+        # tier แรกไม่ retry: fast ครั้งเดียวแล้วไป standard
+        self.assertEqual(client.model_calls, ["model-fast", "model-standard"])
+
+        metrics = invoker.metrics()
+        self.assertEqual(metrics["fail_fast"], 1)
+        self.assertEqual(metrics["gave_up"], 0)
+        self.assertEqual(router.metrics()["fast"]["fallbacks_from"], 1)
+
+    def test_throttle_only_shrinks_that_models_limit(self):
+        router, invoker, _ = make_router(throttle_rate=1.0, throttle_models={"model-fast"})
+        router.converse(SIMPLE)
+        fast = invoker.limiter_for("model-fast").snapshot()["limit"]
+        standard = invoker.limiter_for("model-standard").snapshot()["limit"]
+        self.assertLess(fast, standard)
+        self.assertGreaterEqual(standard, BedrockInvoker._new_limiter().limit)
+
+    def test_every_tier_throttled_raises_after_last_tier_retries(self):
+        router, invoker, client = make_router(throttle_rate=1.0)
+        with self.assertRaises(ClientError):
+            router.converse(SIMPLE)
+        # fast: fail fast (1 call), standard: 1 call + max_retries=1
+        self.assertEqual(client.model_calls, ["model-fast", "model-standard", "model-standard"])
+        metrics = invoker.metrics()
+        self.assertEqual(metrics["fail_fast"], 1)
+        self.assertEqual(metrics["gave_up"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
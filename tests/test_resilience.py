@@ -0,0 +1,115 @@
+# tests/test_resilience.py
+# CircuitBreaker transitions, timeout ที่เกิดจากงบเวลาของ request (ไม่นับเป็น failure) และ hedged_call
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from tools.resilience import CircuitBreaker, LatencyTracker, hedged_call
+from tools.weather_tool import WeatherTool
+
+TIMED_OUT = {"error": "request_error", "timed_out": True, "message": "read timeout"}
+
+
+def test_breaker_opens_after_threshold_then_half_open_trial_closes():
+    breaker = CircuitBreaker("t", failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()          # the one half-open trial
+    assert not breaker.allow()      # nobody else while it is in flight
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_failed_half_open_trial_reopens():
+    breaker = CircuitBreaker("t", failure_threshold=5, reset_timeout=0.05)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_release_gives_back_the_trial_without_closing():
+    breaker = CircuitBreaker("t", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    monkeypatch.setitem(WeatherTool._breakers, "test", CircuitBreaker("test", failure_threshold=1, reset_timeout=30))
+    monkeypatch.setitem(WeatherTool._latency, "test", LatencyTracker())
+    return "test"
+
+
+def test_budget_limited_timeout_does_not_open_breaker(endpoint):
+    for _ in range(3):
+        assert WeatherTool._guarded_call(endpoint, lambda: TIMED_OUT, budget_limited=True) is TIMED_OUT
+    assert WeatherTool._breakers[endpoint].state == CircuitBreaker.CLOSED
+
+
+def test_real_timeout_opens_breaker_and_skips_next_call(endpoint):
+    WeatherTool._guarded_call(endpoint, lambda: TIMED_OUT)
+    assert WeatherTool._breakers[endpoint].state == CircuitBreaker.OPEN
+    skipped = WeatherTool._guarded_call(endpoint, lambda: {"ok": True})
+    assert skipped["error"] == "circuit_open"
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def is_error(result):
+    return isinstance(result, dict) and bool(result.get("error"))
+
+
+def test_hedged_call_without_hedge_runs_inline(executor):
+    caller = threading.current_thread()
+    result = hedged_call(lambda: threading.current_thread() is caller, executor, None, is_error)
+    assert result == (True, False, False)
+
+
+def test_fast_primary_is_not_hedged(executor):
+    calls = itertools.count()
+    result = hedged_call(lambda: next(calls) or "primary", executor, 0.5, is_error)
+    assert result == ("primary", False, False)
+    assert next(calls) == 1
+
+
+def test_slow_primary_loses_to_hedge(executor):
+    calls = itertools.count()
+
+    def fn():
+        if next(calls) == 0:
+            time.sleep(0.3)
+            return "primary"
+        return "hedge"
+
+    assert hedged_call(fn, executor, 0.02, is_error) == ("hedge", True, True)
+
+
+def test_hedge_skips_error_and_waits_for_good_answer(executor):
+    calls = itertools.count()
+
+    def fn():
+        if next(calls) == 0:
+            time.sleep(0.1)
+            return "primary"
+        return {"error": "request_error"}
+
+    assert hedged_call(fn, executor, 0.02, is_error) == ("primary", True, False)
@@ -0,0 +1,57 @@
+# tests/test_serialization.py
+# compact weather struct ที่ส่งให้ model, ToolResult และ encode_with (ต้องได้ bytes เดียวกับ json.dumps)
+import json
+from tools.serialization import ToolResult, compact_weather, dumps, encode_with
+
+ONECALL = {
+    "weather_data": {
+        "daily_forecast": {
+            "lat": 13.75, "lon": 100.5, "timezone": "Asia/Bangkok", "timezone_offset": 25200,
+            "current": {"dt": 1760000000, "temp": 31.0, "feels_like": 36.0, "humidity": 70, "pressure": 1008,
+                        "wind_speed": 3.0, "weather": [{"description": "เมฆมาก"}]},
+            "daily": [],
+        },
+    },
+    "geocoding": {"name": "Bangkok", "country": "TH"},
+}
+
+FALLBACK = {
+    "weather_data": {
+        "fallback_to_current": True,
+        "current_weather": {"dt": 1760000000, "timezone": 25200, "name": "Bangkok", "coord": {"lat": 13.75, "lon": 100.5},
+                            "main": {"temp": 31.0, "feels_like": 36.0, "humidity": 70, "pressure": 1009},
+                            "wind": {"speed": 3.0}, "weather": [{"description": "เมฆมาก"}]},
+        "daily_error": {"error": "unauthorized", "status_code": 401, "message": "Unauthorized", "body": "<html>...</html>"},
+    },
+}
+
+
+def test_onecall_compact_keeps_offset_and_pressure():
+    compact = compact_weather(ONECALL)
+    assert compact.timezone_offset == 25200
+    assert compact.current.pressure == 1008
+    assert compact.errors == {}
+
+
+def test_fallback_compact_keeps_error_details_without_body():
+    content = ToolResult(FALLBACK).model_content(compact=True)["json"]
+    assert content["source"] == "current"
+    assert content["timezone_offset"] == 25200
+    assert content["current"]["pressure"] == 1009
+    assert content["errors"] == {"daily_error": {"error": "unauthorized", "status_code": 401, "message": "Unauthorized"}}
+
+
+def test_encode_with_matches_stdlib_key_order():
+    tool_result = ToolResult(ONECALL)
+    envelope = {"user_input": "อากาศที่กรุงเทพ", "tool_called": "Weather_Tool", "tool_result": tool_result,
+                "response": "ok", "meta": {"parts": ["current"], "empty": {}}}
+    body = encode_with(envelope, {"tool_result": tool_result.encoded})
+    expected = json.dumps(dict(envelope, tool_result=ONECALL), ensure_ascii=False, separators=(",", ":"))
+    assert body == expected.encode("utf-8")
+    assert body == dumps(dict(envelope, tool_result=ONECALL))
+
+
+def test_encode_with_fragment_first_and_only():
+    assert encode_with({"a": 1, "b": 2}, {"a": b"[1]"}) == b'{"a":[1],"b":2}'
+    assert encode_with({}, {"a": b"{}"}) == b'{"a":{}}'
+    assert encode_with({}, {}) == b"{}"
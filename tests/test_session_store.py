@@ -0,0 +1,76 @@
+# tests/test_session_store.py
+# SessionStore: hot tier ในหน่วยความจำ, reload จาก SQLite log (cold), และ purge ตาม retention
+import time
+import pytest
+from backend.session_store import SessionStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_append_and_get_in_order(db_path):
+    store = SessionStore(path=db_path)
+    assert [store.append("s", {"q": q}) for q in ("a", "b", "c")] == [0, 1, 2]
+    assert [t["q"] for t in store.get("s")] == ["a", "b", "c"]
+    assert [t["seq"] for t in store.get("s")] == [0, 1, 2]
+
+
+def test_unknown_session_is_not_cached(db_path):
+    store = SessionStore(path=db_path)
+    assert store.get("missing") == []
+    assert store.last_turn("missing") is None
+    assert store.stats()["hot_sessions"] == 0
+
+
+def test_evicted_session_reloads_from_log(db_path):
+    store = SessionStore(path=db_path, max_hot=1)
+    store.append("a", {"q": "a0"})
+    store.append("b", {"q": "b0"})            # a ถูกดันออกจาก hot tier
+    assert store.stats()["hot_sessions"] == 1
+    assert [t["q"] for t in store.get("a")] == ["a0"]
+    assert store.append("a", {"q": "a1"}) == 1   # seq ต่อจาก log ไม่เริ่มใหม่
+
+
+def test_idle_session_leaves_hot_tier(db_path):
+    store = SessionStore(path=db_path, idle_seconds=0.01)
+    store.append("a", {"q": "a0"})
+    time.sleep(0.02)
+    store.append("b", {"q": "b0"})
+    assert store.stats()["hot_sessions"] == 1
+    assert [t["q"] for t in store.get("a")] == ["a0"]
+
+
+def test_max_turns_keeps_the_newest(db_path):
+    store = SessionStore(path=db_path, max_turns=2)
+    for q in ("a", "b", "c"):
+        store.append("s", {"q": q})
+    assert [t["q"] for t in store.get("s")] == ["b", "c"]
+    assert [t["q"] for t in SessionStore(path=db_path, max_turns=2).get("s")] == ["b", "c"]
+
+
+def test_two_stores_on_one_log_never_reuse_seq(db_path):
+    first, second = SessionStore(path=db_path), SessionStore(path=db_path)
+    assert first.append("s", {"q": "a"}) == 0
+    assert second.append("s", {"q": "b"}) == 1
+    assert first.append("s", {"q": "c"}) == 2
+    assert [t["q"] for t in first.get("s")] == ["a", "b", "c"]
+
+
+def test_old_rows_are_purged(db_path):
+    store = SessionStore(path=db_path, retention_seconds=0.01, idle_seconds=0.01)
+    store.append("old", {"q": "x"})
+    time.sleep(0.02)
+    store._last_purge -= 301                 # ถึงรอบ purge (ทุก 5 นาที)
+    store.append("new", {"q": "y"})
+    assert store.get("old") == []
+    assert [t["q"] for t in store.get("new")] == ["y"]
+
+
+def test_delete_drops_hot_and_log(db_path):
+    store = SessionStore(path=db_path)
+    store.append("s", {"q": "a"})
+    store.delete("s")
+    assert store.get("s") == []
+    assert SessionStore(path=db_path).get("s") == []
@@ -0,0 +1,38 @@
+# tests/test_tool_choice.py
+# heuristic agent ของ agent_server: ชื่อสถานที่ต้องไม่ติดคำ intent (next hour, พรุ่งนี้, ...) หรือคำบุพบท (ที่/ใน/แถว)
+import pytest
+from backend.tool_choice import decide_tool_ai, has_location, is_follow_up, location_text
+
+
+@pytest.mark.parametrize("text, city, intent", [
+    ("will it rain in the next hour at Bangkok", "Bangkok", {"intent": "next_hour"}),
+    ("rain in 3 hours at Hat Yai", "Hat Yai", {"intent": "hourly", "hours": 3}),
+    ("forecast 5 days in Chiang Mai", "Chiang Mai", {"intent": "daily", "cnt": 5}),
+    ("weather alerts for Phuket", "Phuket", {"intent": "alerts"}),
+    ("weather tomorrow in Tokyo", "Tokyo", {"intent": "daily", "cnt": 2}),
+    ("อากาศที่เชียงใหม่", "เชียงใหม่", {}),
+    ("ฝนตกในกรุงเทพชั่วโมงหน้าไหม", "กรุงเทพ", {"intent": "next_hour"}),
+    ("แถวสีลมฝนจะตกไหม", "สีลม", {}),
+    ("ที่ภูเก็ตคืนนี้ฝนตกไหม", "ภูเก็ต", {"intent": "hourly", "hours": 12}),
+])
+def test_city_is_stripped_of_intent_words_and_prepositions(text, city, intent):
+    payload = decide_tool_ai(text)
+    assert payload["name"] == "Weather_Tool"
+    assert payload["input"]["city"] == city
+    for key, value in intent.items():
+        assert payload["input"][key] == value
+
+
+@pytest.mark.parametrize("text", ["พรุ่งนี้ล่ะ", "อากาศที่เดิมพรุ่งนี้", "what about the next hour?", "how about tonight"])
+def test_follow_up_without_place_has_no_location(text):
+    assert is_follow_up(text)
+    assert not has_location(decide_tool_ai(text))
+
+
+def test_removed_words_keep_places_apart():
+    assert location_text("Bangkok tomorrow Tokyo") == "Bangkok, Tokyo"
+
+
+def test_preposition_inside_a_name_is_kept():
+    # "ที่" ตัดเฉพาะหน้าชื่อ ไม่ตัดกลางชื่อ
+    assert location_text("อากาศที่บ้านที่ดิน") == "บ้านที่ดิน"
@@ -2,16 +2,22 @@
 from tools.weather_tool import WeatherTool
 from tools.time_tool import TimeTool
 from tools.output_helper import Output
-from bedrock_config import MODEL_ID, SYSTEM_PROMPT, AWS_REGION
-import boto3
+from tools.deadline import Deadline
+from tools.profiling import profile_turn
+from env_setup import Config
+from bedrock_config import get_system_prompt, get_tool_config, AGENT_DEADLINE_SECONDS
+from agent_loop import AgentLoop
+from model_router import get_model_router
 
 MAX_RECURSIONS = 5
 
 class ToolUseDemo:
     def __init__(self):
-        self.system_prompt = [{"text": SYSTEM_PROMPT}]
-        self.tool_config = {"tools": [WeatherTool.get_tool_spec(), TimeTool.get_tool_spec()]}
-        self.bedrockRuntimeClient = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+        # system prompt + tool specs are built once per process (with optional cache points)
+        self.system_prompt = get_system_prompt()
+        self.tool_config = get_tool_config()
+        self.router = get_model_router()
+        self.profile = Config.AGENT_PROFILE
 
     def run(self):
         Output.header()
@@ -19,60 +25,58 @@ class ToolUseDemo:
 
         user_input = self._get_user_input()
         while user_input is not None:
+            if user_input.strip().lower() == "/profile":
+                self.profile = not self.profile
+                print(f"Profiling {'on' if self.profile else 'off'}")
+                user_input = self._get_user_input()
+                continue
             message = {"role": "user", "content": [{"text": user_input}]}
             conversation.append(message)
-            bedrock_response = self._send_conversation_to_bedrock(conversation)
-            self._process_model_response(bedrock_response, conversation, MAX_RECURSIONS)
+            with profile_turn("cli", requested=self.profile) as turn:
+                result = self._run_turn(conversation)
+            if result["stop_reason"] == "end_turn" or result["partial"]:
+                Output.model_response(result["response"])
+            Output.usage(result["usage"])
+            if turn is not None:
+                Output.profile(turn)
             user_input = self._get_user_input()
 
         Output.footer()
 
-    def _send_conversation_to_bedrock(self, conversation):
-        Output.call_to_bedrock(conversation)
-        return self.bedrockRuntimeClient.converse(
-            modelId=MODEL_ID,
-            messages=conversation,
-            system=self.system_prompt,
-            toolConfig=self.tool_config,
+    def _run_turn(self, conversation):
+        loop = AgentLoop(
+            send=self._send_conversation_to_bedrock,
+            invoke_tool=self._invoke_tool,
+            max_rounds=MAX_RECURSIONS,
+            on_event=self._on_event,
         )
+        return loop.run(conversation, Deadline(AGENT_DEADLINE_SECONDS))
 
-    def _process_model_response(self, model_response, conversation, max_recursion):
-        if max_recursion <= 0:
-            print("Maximum recursion reached.")
-            return
-
-        message = model_response["output"]["message"]
-        conversation.append(message)
-
-        if model_response["stopReason"] == "tool_use":
-            self._handle_tool_use(message, conversation, max_recursion)
-        elif model_response["stopReason"] == "end_turn":
-            Output.model_response(message["content"][0]["text"])
-
-    def _handle_tool_use(self, model_response, conversation, max_recursion):
-        tool_results = []
-        for content_block in model_response["content"]:
-            if "text" in content_block:
-                Output.model_response(content_block["text"])
-            if "toolUse" in content_block:
-                tool_response = self._invoke_tool(content_block["toolUse"])
-                tool_results.append({
-                    "toolResult": {
-                        "toolUseId": tool_response["toolUseId"],
-                        "content": [{"json": tool_response["content"]}],
-                    }
-                })
+    @staticmethod
+    def _on_event(kind, payload):
+        if kind == "call_to_bedrock":
+            Output.call_to_bedrock(payload)
+        elif kind == "model_text":
+            Output.model_response(payload)
+        elif kind == "routing":
+            Output.routing(payload)
 
-        conversation.append({"role": "user", "content": tool_results})
-        response = self._send_conversation_to_bedrock(conversation)
-        self._process_model_response(response, conversation, max_recursion - 1)
+    def _send_conversation_to_bedrock(self, conversation, deadline=None):
+        # model tier is chosen per round by the router (tool selection vs. final phrasing)
+        return self.router.converse(
+            conversation,
+            deadline=deadline,
+            session_id="cli",
+            system=self.system_prompt,
+            toolConfig=self.tool_config,
+        )
 
-    def _invoke_tool(self, payload):
+    def _invoke_tool(self, payload, deadline=None):
         tool_name = payload["name"]
         if tool_name == "Weather_Tool":
             input_data = payload["input"]
             Output.tool_use(tool_name, input_data)
-            response = WeatherTool.fetch_weather_data(input_data)
+            response = WeatherTool.fetch_weather_data(input_data, deadline=deadline)
         elif tool_name == "Time_Tool":
             input_data = payload.get("input", {})
             Output.tool_use(tool_name, input_data)
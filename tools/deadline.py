@@ -0,0 +1,39 @@
+# tools/deadline.py
+import time
+
+
+class Deadline:
+    """
+    End-to-end time budget for one request.
+    Passed down from the agent loop to tools so HTTP timeouts shrink to fit what is left.
+    """
+
+    def __init__(self, seconds):
+        self.budget = float(seconds)
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.budget
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel the request: remaining() drops to 0 so every pending step stops early."""
+        self.cancelled = True
+
+    def remaining(self):
+        if self.cancelled:
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def expired(self, margin=0.0):
+        return self.remaining() <= margin
+
+    def timeout(self, default):
+        """Return min(default, remaining) — the timeout to use for the next blocking call."""
+        return min(float(default), self.remaining())
+
+    @staticmethod
+    def timeout_for(deadline, default):
+        # helper สำหรับฟังก์ชันที่ deadline เป็น optional
+        return default if deadline is None else deadline.timeout(default)
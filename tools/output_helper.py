@@ -9,6 +9,7 @@ class Output:
         print("Example queries:")
         print("- What's the weather like in New York?")
         print("- Current weather for latitude 40.70, longitude -74.01")
+        print("- To profile the following turns, type '/profile' (again to stop).")
         print("- To exit, type 'x' and press Enter.\n")
 
     @staticmethod
@@ -36,3 +37,18 @@ class Output:
     def model_response(message):
         print("Model response:")
         print(message)
+
+    @staticmethod
+    def routing(routing):
+        fallback = " (fallback)" if routing.get("fallback") else ""
+        print(f"Model tier: {routing['tier']}{fallback} for {routing['step']} in {routing['latency_ms']} ms")
+
+    @staticmethod
+    def profile(turn, limit=15):
+        print(f"Profile ({turn.reason}, {turn.elapsed * 1000:.0f} ms) saved as {turn.file}")
+        print(turn.text(limit))
+
+    @staticmethod
+    def usage(usage):
+        print(f"Tokens: input={usage.get('inputTokens', 0)} output={usage.get('outputTokens', 0)} "
+              f"cache_read={usage.get('cacheReadInputTokens', 0)} cache_write={usage.get('cacheWriteInputTokens', 0)}")
@@ -0,0 +1,149 @@
+# tools/profiling.py
+# cProfile ต่อหนึ่ง agent turn: เปิดเมื่อขอ (header / flag / toggle) หรือสุ่มตาม sample rate
+# แล้วเก็บไฟล์ .prof ลง directory แบบหมุนเวียน (เก็บแค่ N ไฟล์ล่าสุด)
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from env_setup import Config
+
+
+class ProfileStore:
+    """
+    Rotating directory of .prof files (open with `python -m pstats <file>` or snakeviz).
+    Only the newest `keep` files are kept.
+    """
+
+    def __init__(self, directory: str = None, keep: int = None):
+        self.directory = directory or Config.PROFILE_DIR
+        self.keep = keep or Config.PROFILE_KEEP
+        self._lock = threading.Lock()
+
+    def save(self, profile: cProfile.Profile, label: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe_label = re.sub(r"[^A-Za-z0-9_-]+", "_", label)[:40] or "turn"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}_{uuid.uuid4().hex[:6]}.prof"
+        profile.dump_stats(os.path.join(self.directory, name))
+        self._rotate()
+        return name
+
+    def _rotate(self):
+        with self._lock:
+            files = self.list()
+            for name in files[self.keep:]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[str]:
+        """Profile file names, newest first."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".prof")]
+        except FileNotFoundError:
+            return []
+        dated = []
+        for name in names:
+            try:
+                dated.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except FileNotFoundError:
+                # ถูก _rotate ของอีก thread ลบไประหว่าง listdir กับ getmtime
+                continue
+        return [name for _, name in sorted(dated, reverse=True)]
+
+    def path(self, name: str) -> Optional[str]:
+        # ชื่อไฟล์ต้องเป็นไฟล์ใน directory นี้เท่านั้น (กัน path traversal)
+        if os.path.basename(name) != name or not name.endswith(".prof"):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+class TurnProfile:
+    """Result of one profiled turn: the cProfile data plus a short top-N summary."""
+
+    def __init__(self, label: str, reason: str):
+        self.label = label
+        self.reason = reason          # "requested" | "sampled"
+        self.profile = cProfile.Profile()
+        self.elapsed = 0.0
+        self.file = None
+
+    def top(self, limit: int = 15, sort: str = "cumulative") -> List[Dict[str, Any]]:
+        stats = pstats.Stats(self.profile)
+        stats.sort_stats(sort)
+        rows = []
+        for func in stats.fcn_list[:limit]:
+            cc, nc, tt, ct, _ = stats.stats[func]
+            filename, line, name = func
+            rows.append({
+                "function": f"{os.path.basename(filename)}:{line}({name})" if line else name,
+                "calls": nc,
+                "tottime_ms": round(tt * 1000, 2),
+                "cumtime_ms": round(ct * 1000, 2),
+            })
+        return rows
+
+    def text(self, limit: int = 25, sort: str = "cumulative") -> str:
+        """pstats report, as printed by `python -m cProfile -s cumulative`."""
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def summary(self, limit: int = 15) -> Dict[str, Any]:
+        return {
+            "file": self.file,
+            "reason": self.reason,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+            "top": self.top(limit),
+        }
+
+
+def should_sample(rate: float = None) -> bool:
+    rate = Config.PROFILE_SAMPLE_RATE if rate is None else rate
+    return rate > 0 and random.random() < rate
+
+
+_store = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        _store = ProfileStore()
+    return _store
+
+
+@contextmanager
+def profile_turn(label: str, requested: bool = False, sample_rate: float = None, store: ProfileStore = None):
+    """
+    Profile the block when requested, or for a sampled fraction of calls (PROFILE_SAMPLE_RATE).
+    Yields the TurnProfile (None when not profiling); the .prof file is saved on exit.
+    cProfile only sees the calling thread, so work handed to other threads (e.g. hedged
+    weather requests) shows up as the time spent waiting for it.
+    """
+    reason = "requested" if requested else ("sampled" if should_sample(sample_rate) else None)
+    if reason is None:
+        yield None
+        return
+    turn = TurnProfile(label, reason)
+    started = time.perf_counter()
+    try:
+        turn.profile.enable()
+    except ValueError:
+        # Python 3.12+ อนุญาต profiler ได้ทีละตัวต่อ process: ถ้ามี turn อื่นกำลังถูก profile อยู่ ให้ข้ามไป
+        yield None
+        return
+    try:
+        yield turn
+    finally:
+        turn.profile.disable()
+        turn.elapsed = time.perf_counter() - started
+        turn.file = (store or get_profile_store()).save(turn.profile, label)
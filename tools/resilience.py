@@ -0,0 +1,143 @@
+# tools/resilience.py
+# Circuit breaker, latency tracking และ hedged requests สำหรับ endpoint ภายนอก (OpenWeather)
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class CircuitBreaker:
+    """
+    Per-endpoint circuit breaker.
+    - closed: calls pass through; consecutive failures are counted
+    - open: calls are skipped until reset_timeout has elapsed
+    - half_open: a single trial call is allowed; success closes, failure re-opens
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return CircuitBreaker.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may be attempted now."""
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = CircuitBreaker.HALF_OPEN
+                self._trial_in_flight = False
+            # half-open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Give back a half-open trial without counting it as a success or a failure."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == CircuitBreaker.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            return {"state": state, "consecutive_failures": self._failures}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds) used to pick the hedge delay."""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Return the pct-th percentile, or None until min_samples have been seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+
+class PathCounters:
+    """Thread-safe counters for which code path served a request."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, key, n=1):
+        with self._lock:
+            self._counts[key] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def hedged_call(fn, executor, hedge_after, is_error):
+    """
+    Run fn() on executor; if it has not returned after hedge_after seconds, start a
+    second attempt and return whichever non-error result arrives first.
+    Returns (result, hedged, hedge_won). hedge_after=None disables hedging.
+    """
+    if hedge_after is None:
+        # ไม่ hedge -> เรียกใน thread ของผู้เรียกเลย ไม่ต้องรอคิวของ executor (ซึ่งจำกัดจำนวน worker)
+        return fn(), False, False
+
+    primary = executor.submit(fn)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result(), False, False
+
+    hedge = executor.submit(fn)
+    pending = {primary, hedge}
+    first_error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            res = fut.result()
+            if not is_error(res):
+                return res, True, fut is hedge
+            if first_error is None:
+                first_error = res
+    return first_error, True, False
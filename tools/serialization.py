@@ -0,0 +1,230 @@
+# tools/serialization.py
+# JSON encode/decode ที่เร็ว (orjson ถ้าติดตั้งไว้, fallback เป็น json ในตัว) + compact weather structs
+# และ ToolResult ที่เก็บ bytes ที่ encode แล้วไว้ใช้ซ้ำ (API response, payload store, st.json)
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON bytes. Dataclasses are encoded as objects."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def loads(data) -> Any:
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(obj):
+    # stdlib fallback สำหรับ dataclass (orjson รองรับเองอยู่แล้ว)
+    if hasattr(obj, "__dataclass_fields__"):
+        return asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_with(envelope: Dict[str, Any], fragments: Dict[str, bytes]) -> bytes:
+    """
+    Encode a dict whose values for `fragments` keys are already JSON bytes.
+    The pre-encoded values are spliced in as-is, at their key's position in the envelope, so the
+    output is byte-for-byte what dumps() gives for the decoded dict. Fragment keys that are not
+    in the envelope are appended after its keys.
+    """
+    parts = []
+    for key, value in envelope.items():
+        parts.append(dumps(key) + b":" + (fragments[key] if key in fragments else dumps(value)))
+    for key, raw in fragments.items():
+        if key not in envelope:
+            parts.append(dumps(key) + b":" + raw)
+    return b"{" + b",".join(parts) + b"}"
+
+
+# ---------------- Compact weather result ----------------
+@dataclass(slots=True)
+class CurrentConditions:
+    dt: Optional[int]
+    temp: Optional[float]
+    feels_like: Optional[float]
+    humidity: Optional[int]
+    wind_speed: Optional[float]
+    description: Optional[str]
+    pressure: Optional[int] = None   # hPa
+
+
+@dataclass(slots=True)
+class DailyForecast:
+    dt: Optional[int]
+    temp_day: Optional[float]
+    temp_min: Optional[float]
+    temp_max: Optional[float]
+    humidity: Optional[int]
+    wind_speed: Optional[float]
+    pop: Optional[float]
+    rain: Optional[float]
+    description: Optional[str]
+
+
+@dataclass(slots=True)
+class HourlyForecast:
+    dt: Optional[int]
+    temp: Optional[float]
+    feels_like: Optional[float]
+    humidity: Optional[int]
+    wind_speed: Optional[float]
+    pop: Optional[float]
+    rain: Optional[float]            # mm in that hour
+    description: Optional[str]
+
+
+@dataclass(slots=True)
+class NextHourPrecipitation:
+    minutes_with_precipitation: int
+    first_precipitation_dt: Optional[int]
+    max_mm_per_hour: float
+
+
+@dataclass(slots=True)
+class WeatherAlert:
+    event: Optional[str]
+    sender: Optional[str]
+    start: Optional[int]
+    end: Optional[int]
+    description: Optional[str]
+
+
+@dataclass(slots=True)
+class CompactWeather:
+    source: str                      # "onecall" | "current" (+ from_cache เมื่อเป็นข้อมูลเก่า)
+    lat: Optional[float]
+    lon: Optional[float]
+    timezone: Optional[str]
+    location: Optional[str]
+    current: Optional[CurrentConditions]
+    daily: List[DailyForecast] = field(default_factory=list)
+    from_cache: bool = False
+    cache_age_seconds: Optional[int] = None
+    hourly: List[HourlyForecast] = field(default_factory=list)
+    next_hour: Optional[NextHourPrecipitation] = None
+    alerts: List[WeatherAlert] = field(default_factory=list)
+    timezone_offset: Optional[int] = None   # seconds from UTC (ใช้คำนวณเวลาท้องถิ่นของ dt)
+    # endpoint ที่ล้มเหลวระหว่างทาง เช่น {"daily_error": {...}} ตอน fallback ไป current weather
+    errors: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+# field ของ error dict ที่ส่งต่อให้ model (body ของ HTTP error ยาวและไม่ช่วยในการตอบ จึงตัดออก)
+_ERROR_FIELDS = ("error", "status_code", "message", "timed_out", "endpoint")
+
+
+def _errors(weather: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {key: {f: value[f] for f in _ERROR_FIELDS if f in value}
+            for key, value in weather.items() if key.endswith("_error") and isinstance(value, dict)}
+
+
+def _description(block: Dict[str, Any]) -> Optional[str]:
+    weather = block.get("weather") or [{}]
+    return weather[0].get("description")
+
+
+def _location_name(geocoding: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not isinstance(geocoding, dict) or not geocoding.get("name"):
+        return None
+    return ", ".join(p for p in (geocoding.get("name"), geocoding.get("state"), geocoding.get("country")) if p)
+
+
+def compact_weather(result: Dict[str, Any]) -> Optional[CompactWeather]:
+    """
+    Compact form of a WeatherTool.fetch_weather_data() result: only the fields the agent phrases
+    answers from, plus the UTC offset and the errors of endpoints that failed on the way.
+    None for errors or results without usable weather data (those stay as-is).
+    """
+    weather = (result or {}).get("weather_data")
+    if not isinstance(weather, dict) or result.get("error"):
+        return None
+    location = _location_name(result.get("geocoding"))
+    cache = {"from_cache": bool(weather.get("from_cache")), "cache_age_seconds": weather.get("cache_age_seconds"),
+             "errors": _errors(weather)}
+
+    onecall = weather.get("daily_forecast")
+    if isinstance(onecall, dict) and not onecall.get("error"):
+        cur = onecall.get("current") or {}
+        current = CurrentConditions(cur.get("dt"), cur.get("temp"), cur.get("feels_like"), cur.get("humidity"),
+                                    cur.get("wind_speed"), _description(cur), cur.get("pressure")) if cur else None
+        daily = []
+        for day in onecall.get("daily") or []:
+            temp = day.get("temp") or {}
+            daily.append(DailyForecast(day.get("dt"), temp.get("day"), temp.get("min"), temp.get("max"),
+                                       day.get("humidity"), day.get("wind_speed"), day.get("pop"),
+                                       day.get("rain"), _description(day)))
+        hourly = [HourlyForecast(h.get("dt"), h.get("temp"), h.get("feels_like"), h.get("humidity"),
+                                 h.get("wind_speed"), h.get("pop"), (h.get("rain") or {}).get("1h"), _description(h))
+                  for h in onecall.get("hourly") or []]
+        next_hour = None
+        if "minutely" in onecall:
+            wet = [m for m in onecall["minutely"] or [] if (m.get("precipitation") or 0) > 0]
+            next_hour = NextHourPrecipitation(len(wet), wet[0].get("dt") if wet else None,
+                                              max((m["precipitation"] for m in wet), default=0.0))
+        alerts = [WeatherAlert(a.get("event"), a.get("sender_name"), a.get("start"), a.get("end"), a.get("description"))
+                  for a in onecall.get("alerts") or []]
+        return CompactWeather("onecall", onecall.get("lat"), onecall.get("lon"), onecall.get("timezone"),
+                              location, current, daily, **cache, hourly=hourly, next_hour=next_hour, alerts=alerts,
+                              timezone_offset=onecall.get("timezone_offset"))
+
+    cur = weather.get("current_weather")
+    if isinstance(cur, dict) and not cur.get("error"):
+        main, coord = cur.get("main") or {}, cur.get("coord") or {}
+        current = CurrentConditions(cur.get("dt"), main.get("temp"), main.get("feels_like"), main.get("humidity"),
+                                    (cur.get("wind") or {}).get("speed"), _description(cur), main.get("pressure"))
+        # /weather: "timezone" คือ offset จาก UTC เป็นวินาที
+        return CompactWeather("current", coord.get("lat"), coord.get("lon"), None,
+                              location or cur.get("name"), current, **cache, timezone_offset=cur.get("timezone"))
+    return None
+
+
+# ---------------- Pre-encoded tool result ----------------
+class ToolResult:
+    """
+    One tool result together with its JSON bytes. The bytes are encoded once on first use
+    and shared by every consumer (HTTP body, payload store, st.json).
+    """
+
+    __slots__ = ("value", "_encoded", "_compact")
+
+    _UNSET = object()
+
+    def __init__(self, value: Dict[str, Any]):
+        self.value = value
+        self._encoded = None
+        self._compact = ToolResult._UNSET
+
+    @property
+    def encoded(self) -> bytes:
+        if self._encoded is None:
+            self._encoded = dumps(self.value)
+        return self._encoded
+
+    @property
+    def text(self) -> str:
+        return self.encoded.decode("utf-8")
+
+    @property
+    def compact(self) -> Optional[CompactWeather]:
+        if self._compact is ToolResult._UNSET:
+            self._compact = compact_weather(self.value)
+        return self._compact
+
+    def model_content(self, compact: bool = True) -> Dict[str, Any]:
+        """toolResult content block for Bedrock converse (boto3 encodes the request body itself)."""
+        if compact and self.compact is not None:
+            # round-trip ผ่าน encoder เร็วกว่า dataclasses.asdict (ซึ่ง deepcopy ทุก field)
+            return {"json": loads(dumps(self.compact))}
+        return {"json": self.value}
@@ -1,6 +1,11 @@
 # tools/time_tool.py
 from datetime import datetime
 import pytz
+from tools.timezone_index import get_zone, resolve_timezone
+
+DEFAULT_TIMEZONE = "Asia/Bangkok"
+# จำนวน location สูงสุดต่อหนึ่ง batch call
+MAX_BATCH_LOCATIONS = 50
 
 class TimeTool:
     @staticmethod
@@ -8,7 +13,7 @@ class TimeTool:
         return {
             "toolSpec": {
                 "name": "Time_Tool",
-                "description": "Get the current local time for Thailand or any specified timezone.",
+                "description": "Get the current local time for Thailand, a specified timezone, or a latitude/longitude (resolved offline). Use 'locations' to get many places in one call.",
                 "inputSchema": {
                     "json": {
                         "type": "object",
@@ -16,6 +21,21 @@ class TimeTool:
                             "timezone": {
                                 "type": "string",
                                 "description": "Timezone in TZ format, e.g., Asia/Bangkok. Default is Asia/Bangkok."
+                            },
+                            "latitude": {"type": "string", "description": "Latitude; used to resolve the timezone when 'timezone' is not given."},
+                            "longitude": {"type": "string", "description": "Longitude; used to resolve the timezone when 'timezone' is not given."},
+                            "locations": {
+                                "type": "array",
+                                "description": "Batch mode: list of places, each with 'timezone' or 'latitude'/'longitude' and an optional 'label'.",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "label": {"type": "string"},
+                                        "timezone": {"type": "string"},
+                                        "latitude": {"type": "string"},
+                                        "longitude": {"type": "string"}
+                                    }
+                                }
                             }
                         },
                         "required": []
@@ -25,13 +45,54 @@ class TimeTool:
         }
 
     @staticmethod
-    def fetch_time_data(input_data):
-        tz_name = input_data.get("timezone", "Asia/Bangkok")
-        tz = pytz.timezone(tz_name)
-        now = datetime.now(tz)
-        return {
+    def _time_for(item, now_utc):
+        """Format now_utc for one location dict (timezone or latitude/longitude)."""
+        if not isinstance(item, dict):
+            return {"error": "invalid_input", "message": "Each location must be an object with 'timezone' or 'latitude'/'longitude'."}
+        tz_name = item.get("timezone")
+        resolved_from = "timezone"
+        approximate = False
+        try:
+            if not tz_name and item.get("latitude") is not None and item.get("longitude") is not None:
+                tz_name, approximate = resolve_timezone(item["latitude"], item["longitude"])
+                resolved_from = "coordinates"
+            tz_name = tz_name or DEFAULT_TIMEZONE
+            tz = get_zone(tz_name)
+        except pytz.UnknownTimeZoneError:
+            return {"error": "unknown_timezone", "message": f"Unknown timezone '{tz_name}'"}
+        except (TypeError, ValueError) as e:
+            return {"error": "invalid_coordinates", "message": str(e)}
+
+        now = now_utc.astimezone(tz)
+        result = {
             "current_time": now.strftime("%Y-%m-%d %H:%M:%S"),
             "date": now.strftime("%d-%m-%Y"),
             "time": now.strftime("%H:%M:%S"),
             "timezone": tz_name
-        }
\ No newline at end of file
+        }
+        if resolved_from == "coordinates":
+            result["resolved_from"] = resolved_from
+        if approximate:
+            # ไม่มีข้อมูลขอบเขต timezone ครอบพิกัดนี้ -> บอก model ว่าเวลาอาจคลาดเคลื่อน
+            result["approximate"] = True
+            result["utc_offset"] = now.strftime("%z")
+            result["note"] = ("Timezone estimated from the nearest tz reference point, not a boundary lookup; "
+                              "it may be wrong near borders. Pass 'timezone' if the exact local time matters.")
+        return result
+
+    @staticmethod
+    def fetch_time_data(input_data):
+        now_utc = datetime.now(pytz.utc)
+        locations = input_data.get("locations")
+        if locations is not None and not isinstance(locations, list):
+            return {"error": "invalid_input", "message": "'locations' must be a list of objects with 'timezone' or 'latitude'/'longitude'."}
+        if locations:
+            # batch: ใช้เวลาอ้างอิงเดียวกันสำหรับทุก location
+            results = []
+            for item in locations[:MAX_BATCH_LOCATIONS]:
+                res = TimeTool._time_for(item, now_utc)
+                if isinstance(item, dict) and item.get("label"):
+                    res["label"] = item["label"]
+                results.append(res)
+            return {"results": results, "truncated": len(locations) > MAX_BATCH_LOCATIONS}
+        return TimeTool._time_for(input_data, now_utc)
@@ -0,0 +1,212 @@
+# tools/timezone_index.py
+# Offline lat/lon -> timezone resolver (ไม่ต้องเรียก API / model เพิ่ม)
+import math
+import re
+import threading
+from functools import lru_cache
+import pytz
+
+# ขนาด cell ของ grid index (องศา)
+GRID_DEG = 5.0
+# ถ้าจุดอ้างอิงที่ใกล้ที่สุดไกลเกินนี้ (กม.) ถือว่าอยู่กลางทะเล -> ใช้ Etc/GMT ตามลองจิจูด
+MAX_REFERENCE_KM = 1500.0
+EARTH_RADIUS_KM = 6371.0
+
+# จุดอ้างอิงเพิ่มเติม (ไทย + ประเทศเพื่อนบ้าน) เพื่อให้ nearest-point แม่นขึ้นบริเวณชายแดน
+# zone.tab มีแค่จุดเดียวต่อ zone (เช่น Asia/Bangkok = กรุงเทพฯ) ทำให้เชียงใหม่ใกล้ย่างกุ้งมากกว่า
+EXTRA_REFERENCE_POINTS = (
+    (18.79, 98.98, "Asia/Bangkok"),       # Chiang Mai
+    (19.91, 99.83, "Asia/Bangkok"),       # Chiang Rai
+    (19.30, 97.97, "Asia/Bangkok"),       # Mae Hong Son
+    (16.71, 98.57, "Asia/Bangkok"),       # Mae Sot
+    (18.78, 100.78, "Asia/Bangkok"),      # Nan
+    (16.82, 100.26, "Asia/Bangkok"),      # Phitsanulok
+    (17.41, 102.79, "Asia/Bangkok"),      # Udon Thani
+    (17.88, 102.74, "Asia/Bangkok"),      # Nong Khai
+    (16.44, 102.83, "Asia/Bangkok"),      # Khon Kaen
+    (14.97, 102.10, "Asia/Bangkok"),      # Nakhon Ratchasima
+    (15.24, 104.85, "Asia/Bangkok"),      # Ubon Ratchathani
+    (14.02, 99.53, "Asia/Bangkok"),       # Kanchanaburi
+    (12.57, 99.96, "Asia/Bangkok"),       # Hua Hin
+    (10.49, 99.18, "Asia/Bangkok"),       # Chumphon
+    (9.96, 98.64, "Asia/Bangkok"),        # Ranong
+    (9.14, 99.33, "Asia/Bangkok"),        # Surat Thani
+    (7.88, 98.39, "Asia/Bangkok"),        # Phuket
+    (7.01, 100.47, "Asia/Bangkok"),       # Hat Yai
+    (6.43, 101.82, "Asia/Bangkok"),       # Narathiwat
+    (12.24, 102.51, "Asia/Bangkok"),      # Trat
+    (12.93, 100.88, "Asia/Bangkok"),      # Pattaya
+    (19.89, 102.14, "Asia/Vientiane"),    # Luang Prabang
+    (15.12, 105.78, "Asia/Vientiane"),    # Pakse
+    (21.97, 96.08, "Asia/Yangon"),        # Mandalay
+    (16.69, 98.51, "Asia/Yangon"),        # Myawaddy
+    (13.36, 103.86, "Asia/Phnom_Penh"),   # Siem Reap
+    (13.10, 103.20, "Asia/Phnom_Penh"),   # Battambang
+    (5.41, 100.33, "Asia/Kuala_Lumpur"),  # George Town
+    (6.13, 102.24, "Asia/Kuala_Lumpur"),  # Kota Bharu
+    (21.03, 105.85, "Asia/Ho_Chi_Minh"),  # Hanoi
+    (16.05, 108.20, "Asia/Ho_Chi_Minh"),  # Da Nang
+)
+
+_ISO6709 = re.compile(r"^([+-]\d{4,6})([+-]\d{5,7})$")
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    """Cached pytz zone object (pytz.timezone re-validates the name on every call)."""
+    return pytz.timezone(name)
+
+
+def _parse_coord(value, deg_digits):
+    sign = -1.0 if value[0] == "-" else 1.0
+    digits = value[1:]
+    deg = int(digits[:deg_digits])
+    minutes = int(digits[deg_digits:deg_digits + 2])
+    seconds = int(digits[deg_digits + 2:] or 0)
+    return sign * (deg + minutes / 60.0 + seconds / 3600.0)
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _ocean_zone(lon):
+    # Etc/GMT ใช้เครื่องหมายกลับด้าน: Etc/GMT-7 = UTC+7
+    offset = int(round(lon / 15.0))
+    offset = max(-12, min(14, offset))
+    return "Etc/GMT" if offset == 0 else f"Etc/GMT{-offset:+d}"
+
+
+class TimezoneIndex:
+    """
+    Grid index over the reference point of every zone in the tz database's zone.tab
+    (bundled with pytz) plus EXTRA_REFERENCE_POINTS. A lookup returns the zone whose reference location is nearest,
+    searching outward ring by ring from the query's grid cell.
+
+    This is only an approximation of the true zone polygons (nearest reference point is not a
+    boundary lookup: Chengdu lands on Asia/Ho_Chi_Minh, Patna on Asia/Kathmandu), so results from it
+    are flagged approximate. `timezonefinder` (requirements.txt) provides the boundary polygons.
+    """
+
+    def __init__(self, points, grid_deg=GRID_DEG):
+        self.grid_deg = grid_deg
+        self.n_rows = int(math.ceil(180.0 / grid_deg))
+        self.n_cols = int(math.ceil(360.0 / grid_deg))
+        self.cells = {}
+        for lat, lon, zone in points:
+            self.cells.setdefault(self._cell(lat, lon), []).append((lat, lon, zone))
+        self.size = len(points)
+
+    @classmethod
+    def from_zone_tab(cls):
+        points = []
+        with pytz.open_resource("zone.tab") as fh:
+            for raw in fh:
+                line = raw.decode("utf-8").strip()
+                if not line or line.startswith("#"):
+                    continue
+                fields = line.split("\t")
+                if len(fields) < 3:
+                    continue
+                m = _ISO6709.match(fields[1])
+                if not m:
+                    continue
+                points.append((_parse_coord(m.group(1), 2), _parse_coord(m.group(2), 3), fields[2]))
+        points.extend(EXTRA_REFERENCE_POINTS)
+        return cls(points)
+
+    def _cell(self, lat, lon):
+        row = min(self.n_rows - 1, int((lat + 90.0) // self.grid_deg))
+        col = int(((lon + 180.0) % 360.0) // self.grid_deg)
+        return row, col
+
+    def nearest(self, lat, lon):
+        """Return (zone_name, distance_km) of the nearest reference point, or (None, inf)."""
+        row, col = self._cell(lat, lon)
+        best_zone, best_km = None, float("inf")
+        # ring r อยู่ห่างอย่างน้อย (r-1) cell; cell แนวตะวันออก-ตะวันตกหดลงตาม cos(lat)
+        km_per_ring = self.grid_deg * 111.0
+        for r in range(max(self.n_rows, self.n_cols // 2) + 1):
+            if best_zone is not None and (r - 1) * km_per_ring * max(0.2, math.cos(math.radians(lat))) > best_km:
+                break
+            for dr in range(-r, r + 1):
+                rr = row + dr
+                if rr < 0 or rr >= self.n_rows:
+                    continue
+                for dc in range(-r, r + 1):
+                    if max(abs(dr), abs(dc)) != r:
+                        continue
+                    for plat, plon, zone in self.cells.get((rr, (col + dc) % self.n_cols), ()):
+                        km = _haversine_km(lat, lon, plat, plon)
+                        if km < best_km:
+                            best_zone, best_km = zone, km
+        return best_zone, best_km
+
+
+_index = None
+_index_lock = threading.Lock()
+
+# TimezoneFinder โหลด polygon ทั้งหมดเข้าหน่วยความจำ -> สร้างเมื่อมีการค้นด้วยพิกัดครั้งแรกเท่านั้น
+_finder = None
+_finder_loaded = False
+_finder_lock = threading.Lock()
+
+
+def _get_finder():
+    """The shared TimezoneFinder, or None when timezonefinder is not installed."""
+    global _finder, _finder_loaded
+    if not _finder_loaded:
+        with _finder_lock:
+            if not _finder_loaded:
+                try:
+                    from timezonefinder import TimezoneFinder
+                    _finder = TimezoneFinder(in_memory=True)
+                except ImportError:
+                    _finder = None
+                _finder_loaded = True
+    return _finder
+
+
+def _get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = TimezoneIndex.from_zone_tab()
+    return _index
+
+
+@lru_cache(maxsize=4096)
+def _resolve_cell(lat_key, lon_key):
+    lat, lon = lat_key / 100.0, lon_key / 100.0
+    finder = _get_finder()
+    if finder is not None:
+        zone = finder.timezone_at(lat=lat, lng=lon)
+        if zone:
+            return zone, False
+    # ไม่มี polygon ครอบจุดนี้ -> เป็นแค่การประมาณ (จุดอ้างอิงที่ใกล้ที่สุด หรือ Etc/GMT ตามลองจิจูด)
+    zone, km = _get_index().nearest(lat, lon)
+    if zone is None or km > MAX_REFERENCE_KM:
+        return _ocean_zone(lon), True
+    return zone, True
+
+
+def resolve_timezone(lat, lon):
+    """
+    Resolve latitude/longitude (degrees) to (IANA zone name, approximate), offline.
+    approximate is False only when a timezone boundary polygon contains the point.
+    """
+    lat, lon = float(lat), float(lon)
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError(f"coordinates out of range: {lat}, {lon}")
+    # ปัดเป็น 0.01° (~1 กม.) เพื่อให้ cache ใช้ซ้ำได้
+    return _resolve_cell(int(round(lat * 100)), int(round(lon * 100)))
+
+
+def timezone_for(lat, lon):
+    """Resolve latitude/longitude (degrees) to an IANA zone name, offline (see resolve_timezone)."""
+    return resolve_timezone(lat, lon)[0]
@@ -1,11 +1,71 @@
 # tools/weather_tool.py
 # WeatherTool ที่ใช้ OpenWeather Geocoding + One Call API 3.0
 import requests
-from requests.exceptions import RequestException
+from requests.exceptions import RequestException, Timeout
 from env_setup import Config
+from tools.deadline import Deadline
+from tools.resilience import CircuitBreaker, LatencyTracker, PathCounters, hedged_call
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import os
+import re
+
+
+def _parse_ttls(spec):
+    # "current=600,minutely=120,..." -> {"current": 600.0, ...}
+    ttls = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            ttls[name.strip()] = float(value)
+    return ttls
+
 
 class WeatherTool:
+    # circuit breaker ต่อ endpoint: ถ้า One Call ล้มเหลวติดกันจะข้ามไป fallback ทันที
+    # "onecall_alerts" = One Call ที่ alert scheduler เรียก แยก breaker/latency จาก chat เพื่อไม่ให้ background poll
+    # ที่ล้มเหลวเปิด breaker ใส่ผู้ใช้ (และกลับกัน)
+    _breakers = {
+        "onecall": CircuitBreaker("onecall", Config.WEATHER_BREAKER_FAILURES, Config.WEATHER_BREAKER_RESET_SECONDS),
+        "current": CircuitBreaker("current", Config.WEATHER_BREAKER_FAILURES, Config.WEATHER_BREAKER_RESET_SECONDS),
+        "onecall_alerts": CircuitBreaker("onecall_alerts", Config.ALERT_BREAKER_FAILURES, Config.ALERT_BREAKER_RESET_SECONDS),
+    }
+    _latency = {"onecall": LatencyTracker(), "current": LatencyTracker(), "onecall_alerts": LatencyTracker()}
+    _path_counters = PathCounters()
+    _hedge_executor = ThreadPoolExecutor(max_workers=Config.WEATHER_HEDGE_WORKERS, thread_name_prefix="weather-hedge")
+
+    # last good result per location, served (stale) when every endpoint is unavailable
+    _last_good = OrderedDict()
+    _last_good_lock = threading.Lock()
+    _LAST_GOOD_MAX = 256
+
+    # One Call parts และ part ที่แต่ละ intent ต้องใช้ (current ใส่เสมอเพื่อใช้เป็นเวลาอ้างอิงของข้อมูล)
+    ONECALL_PARTS = ("current", "minutely", "hourly", "daily", "alerts")
+    INTENT_PARTS = {
+        "current": ("current",),
+        "next_hour": ("current", "minutely"),
+        "hourly": ("current", "hourly"),
+        "daily": ("current", "daily"),
+        "alerts": ("current", "alerts"),
+    }
+    MAX_HOURS = 48
+    # คำที่ parse_intent ใช้เดา intent (agent_server ตัดคำเหล่านี้ออกก่อนหาชื่อเมืองด้วย)
+    ALERT_WORDS = ("alert", "warning", "เตือนภัย", "ประกาศเตือน", "คำเตือน")
+    NEXT_HOUR_WORDS = ("next hour", "this hour", "next 60 min", "ชั่วโมงนี้", "ชั่วโมงหน้า", "อีกสักครู่", "เดี๋ยวนี้")
+    HOURLY_WORDS = ("tonight", "this evening", "this afternoon", "hourly", "คืนนี้", "เย็นนี้", "บ่ายนี้", "รายชั่วโมง")
+    TOMORROW_WORDS = ("tomorrow", "พรุ่งนี้")
+    CURRENT_WORDS = ("right now", "currently", "ตอนนี้", "ขณะนี้", "ปัจจุบัน")
+    HOURS_PATTERN = r"(\d+)\s*(?:hours?|hrs?|ชั่วโมง|ชม)"
+    DAYS_PATTERN = r"(\d+)\s*(?:days?|วัน)"
+    INTENT_WORDS = ALERT_WORDS + NEXT_HOUR_WORDS + HOURLY_WORDS + TOMORROW_WORDS + CURRENT_WORDS
+    # cache ต่อ (location, part): {key: (fetched_at, value)} + meta (lat/lon/timezone) ต่อ location
+    _part_cache = OrderedDict()
+    _part_meta = OrderedDict()
+    _part_cache_lock = threading.Lock()
+    _part_ttls = _parse_ttls(Config.WEATHER_PART_TTLS)
+
     @staticmethod
     def get_tool_spec():
         """
@@ -24,7 +84,16 @@ class WeatherTool:
                             "longitude": {"type": "string", "description": "Longitude of the location."},
                             "city": {"type": "string", "description": "City name for OpenWeather geocoding (optional)."},
                             "province": {"type": "string", "description": "Province name (optional). Will be used as 'city' for geocoding)."},
-                            "cnt": {"type": "integer", "description": "Number of days for daily forecast (1-16). Optional."}
+                            "cnt": {"type": "integer", "description": "Number of days for daily forecast (1-16). Optional."},
+                            "intent": {
+                                "type": "string",
+                                "enum": list(WeatherTool.INTENT_PARTS),
+                                "description": "What is asked: 'current' conditions, rain in the 'next_hour' (minute-by-minute), "
+                                               "'hourly' forecast (use with 'hours'), 'daily' forecast (use with 'cnt', default) "
+                                               "or official weather 'alerts'. Optional."
+                            },
+                            "hours": {"type": "integer", "description": "Hours ahead for the hourly forecast (1-48). Optional."},
+                            "include_alerts": {"type": "boolean", "description": "Also return official weather alerts. Optional."}
                         },
                         "required": []
                     }
@@ -32,13 +101,226 @@ class WeatherTool:
             }
         }
 
+    @staticmethod
+    def _http_get(url, params=None, timeout=10):
+        return requests.get(url, params=params, timeout=timeout)
+
+    @staticmethod
+    def _guarded_call(endpoint, fn, budget_limited=False, hedge=True):
+        """
+        Call fn() through the endpoint's circuit breaker (and optional hedging).
+        Returns the endpoint's result dict, or a 'circuit_open' error dict when skipped.
+        budget_limited=True means fn's timeout was cut short by the caller's deadline: a timeout
+        then says nothing about the endpoint and is not counted as a breaker failure.
+        hedge=False never sends a second attempt (background callers with nobody waiting).
+        """
+        breaker = WeatherTool._breakers[endpoint]
+        counters = WeatherTool._path_counters
+        if not breaker.allow():
+            counters.incr(f"{endpoint}_skipped")
+            return {"error": "circuit_open", "endpoint": endpoint, "message": f"Skipped {endpoint}: circuit open after repeated failures."}
+
+        tracker = WeatherTool._latency[endpoint]
+        hedge_after = tracker.percentile(Config.WEATHER_HEDGE_PERCENTILE) if hedge and Config.WEATHER_HEDGE_ENABLED else None
+
+        def _timed():
+            t0 = time.monotonic()
+            res = fn()
+            if not (isinstance(res, dict) and res.get("error")):
+                tracker.record(time.monotonic() - t0)
+            return res
+
+        res, hedged, hedge_won = hedged_call(
+            _timed, WeatherTool._hedge_executor, hedge_after,
+            is_error=lambda r: isinstance(r, dict) and bool(r.get("error")),
+        )
+        if hedged:
+            counters.incr(f"{endpoint}_hedged")
+        if hedge_won:
+            counters.incr(f"{endpoint}_hedge_won")
+
+        if isinstance(res, dict) and res.get("error"):
+            if res.get("error") == "deadline_exceeded" or (budget_limited and res.get("timed_out")):
+                # หมดเวลาเพราะงบเวลาของ request นี้เหลือน้อย ไม่ใช่ endpoint เสีย -> ไม่เปิด breaker ให้ client อื่น
+                breaker.release()
+                counters.incr(f"{endpoint}_budget_timeout")
+            else:
+                breaker.record_failure()
+                counters.incr(f"{endpoint}_error")
+        else:
+            breaker.record_success()
+            counters.incr(f"{endpoint}_ok")
+        return res
+
+    @staticmethod
+    def _location_key(lat, lon):
+        try:
+            return (round(float(lat), 2), round(float(lon), 2))
+        except (TypeError, ValueError):
+            return (str(lat), str(lon))
+
+    @staticmethod
+    def _remember(lat, lon, result):
+        key = WeatherTool._location_key(lat, lon)
+        with WeatherTool._last_good_lock:
+            WeatherTool._last_good[key] = (time.time(), result)
+            WeatherTool._last_good.move_to_end(key)
+            while len(WeatherTool._last_good) > WeatherTool._LAST_GOOD_MAX:
+                WeatherTool._last_good.popitem(last=False)
+
+    @staticmethod
+    def _recall(lat, lon):
+        key = WeatherTool._location_key(lat, lon)
+        with WeatherTool._last_good_lock:
+            return WeatherTool._last_good.get(key)
+
+    @staticmethod
+    def parse_intent(text):
+        """
+        Heuristic intent/horizon from a free-text question (for callers without a model, e.g. agent_server).
+        Returns a dict of Weather_Tool inputs ({} = default daily forecast).
+        """
+        text = (text or "").lower()
+        if any(w in text for w in WeatherTool.ALERT_WORDS):
+            return {"intent": "alerts"}
+        if any(w in text for w in WeatherTool.NEXT_HOUR_WORDS):
+            return {"intent": "next_hour"}
+        m = re.search(WeatherTool.HOURS_PATTERN, text)
+        if m:
+            return {"intent": "hourly", "hours": int(m.group(1))}
+        if any(w in text for w in WeatherTool.HOURLY_WORDS):
+            return {"intent": "hourly", "hours": 12}
+        m = re.search(WeatherTool.DAYS_PATTERN, text)
+        if m:
+            return {"intent": "daily", "cnt": int(m.group(1))}
+        if any(w in text for w in WeatherTool.TOMORROW_WORDS):
+            return {"intent": "daily", "cnt": 2}
+        if any(w in text for w in WeatherTool.CURRENT_WORDS):
+            return {"intent": "current"}
+        return {}
+
+    @staticmethod
+    def select_parts(input_data):
+        """
+        Smallest set of One Call parts for the request, plus the hourly horizon.
+        No intent and no hours -> current + daily (the previous behaviour).
+        """
+        intent = input_data.get("intent")
+        hours = input_data.get("hours")
+        try:
+            hours = min(WeatherTool.MAX_HOURS, max(1, int(hours))) if hours is not None else None
+        except (TypeError, ValueError):
+            hours = None
+        if intent not in WeatherTool.INTENT_PARTS:
+            intent = "hourly" if hours is not None else "daily"
+        if intent == "hourly" and hours is None:
+            hours = 12
+        parts = list(WeatherTool.INTENT_PARTS[intent])
+        if input_data.get("include_alerts") and "alerts" not in parts:
+            parts.append("alerts")
+        return tuple(parts), hours
+
+    @staticmethod
+    def _cached_parts(lat, lon, parts):
+        """Fresh cached parts for this location: ({part: value}, {part: fetched_at}, meta)."""
+        loc = WeatherTool._location_key(lat, lon)
+        now = time.time()
+        found, fetched_at = {}, {}
+        with WeatherTool._part_cache_lock:
+            for part in parts:
+                entry = WeatherTool._part_cache.get((loc, part))
+                if entry and now - entry[0] < WeatherTool._part_ttl(part):
+                    WeatherTool._part_cache.move_to_end((loc, part))
+                    found[part] = entry[1]
+                    fetched_at[part] = int(entry[0])
+            return found, fetched_at, WeatherTool._part_meta.get(loc)
+
+    @staticmethod
+    def _part_ttl(part):
+        return WeatherTool._part_ttls.get(part, 600)
+
+    @staticmethod
+    def parts_max_age(parts_fetched_at, now=None):
+        """
+        Seconds until the first of these parts expires from the part cache (None if no parts):
+        a response built from them may not be cached longer than that.
+        """
+        if not parts_fetched_at:
+            return None
+        now = time.time() if now is None else now
+        return max(0, int(min(WeatherTool._part_ttl(p) - (now - ts) for p, ts in parts_fetched_at.items())))
+
+    @staticmethod
+    def _store_parts(lat, lon, data, parts):
+        loc = WeatherTool._location_key(lat, lon)
+        now = time.time()
+        with WeatherTool._part_cache_lock:
+            WeatherTool._part_meta[loc] = {k: data.get(k) for k in ("lat", "lon", "timezone", "timezone_offset")}
+            WeatherTool._part_meta.move_to_end(loc)
+            for part in parts:
+                # One Call ไม่ส่ง key มาเลยเมื่อไม่มี alerts / minutely -> เก็บเป็น list ว่าง
+                WeatherTool._part_cache[(loc, part)] = (now, data.get(part, {} if part == "current" else []))
+                WeatherTool._part_cache.move_to_end((loc, part))
+            while len(WeatherTool._part_cache) > Config.WEATHER_PART_CACHE_MAX:
+                WeatherTool._part_cache.popitem(last=False)
+            while len(WeatherTool._part_meta) > Config.WEATHER_PART_CACHE_MAX:
+                WeatherTool._part_meta.popitem(last=False)
+
+    @staticmethod
+    def _onecall_parts(lat, lon, api_key, parts, cnt=3, hours=None, timeout=10, budget_limited=False):
+        """
+        One Call data with only `parts`, served from the per-part cache when possible.
+        Only the parts that are missing or expired are requested upstream (exclude = everything else).
+        Returns (data, {part: fetched_at}); on error data is the error dict.
+        """
+        found, fetched_at, meta = WeatherTool._cached_parts(lat, lon, parts)
+        missing = [p for p in parts if p not in found]
+        counters = WeatherTool._path_counters
+        for part in found:
+            counters.incr(f"part_{part}_cached")
+        if missing:
+            exclude = ",".join(p for p in WeatherTool.ONECALL_PARTS if p not in missing)
+            data = WeatherTool._guarded_call(
+                "onecall", lambda: WeatherTool._call_daily_forecast(lat, lon, api_key, cnt=8, timeout=timeout,
+                                                                    exclude=exclude),
+                budget_limited=budget_limited)
+            if isinstance(data, dict) and data.get("error"):
+                return data, {}
+            now = int(time.time())
+            WeatherTool._store_parts(lat, lon, data, missing)
+            for part in missing:
+                counters.incr(f"part_{part}_fetched")
+                found[part] = data.get(part, {} if part == "current" else [])
+                fetched_at[part] = now
+            meta = {k: data.get(k) for k in ("lat", "lon", "timezone", "timezone_offset")}
+        else:
+            counters.incr("onecall_served_from_parts")
+
+        result = dict(meta or {})
+        for part in parts:
+            result[part] = found[part]
+        if "daily" in result:
+            result["daily"] = result["daily"][:max(1, min(8, int(cnt)))]
+        if "hourly" in result and hours:
+            result["hourly"] = result["hourly"][:hours]
+        return result, fetched_at
+
+    @staticmethod
+    def get_path_stats():
+        """Counters for each path taken (ok/error/skipped/hedged/fallback/cache) plus breaker states."""
+        return {
+            "counters": WeatherTool._path_counters.snapshot(),
+            "breakers": {name: b.snapshot() for name, b in WeatherTool._breakers.items()},
+            "p95_latency": {name: t.percentile(95) for name, t in WeatherTool._latency.items()},
+        }
+
     @staticmethod
     def _get_api_key():
         # อ่าน API key จาก Colab userdata หรือ environment variable
         return Config.API_OPEN_WEATHER or os.getenv('API_OPEN_WEATHER')
 
     @staticmethod
-    def _geocode_location(name, api_key, limit=1):
+    def _geocode_location(name, api_key, limit=1, timeout=10):
         """
         Use OpenWeather Geocoding API to get latitude & longitude for a city/province name.
         Returns dict: {'lat': ..., 'lon': ...} or error dict.
@@ -47,7 +329,7 @@ class WeatherTool:
         base = "https://api.openweathermap.org/geo/1.0/direct"
         params = {"q": name, "limit": limit, "appid": api_key}
         try:
-            r = requests.get(base, params=params, timeout=10)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             r.raise_for_status()
             arr = r.json()
             if not arr:
@@ -60,18 +342,19 @@ class WeatherTool:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def _call_daily_forecast(lat, lon, api_key, cnt=3, units="metric", lang="th"):
+    def _call_daily_forecast(lat, lon, api_key, cnt=3, units="metric", lang="th", timeout=10,
+                             exclude="minutely,hourly,alerts"):
         """
         Call OpenWeather One Call API 3.0:
         https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude={part}&appid={API key}
         - One Call 3.0 ไม่รับ 'cnt' เป็นพารามิเตอร์; เราจะขอ daily แล้ว slice ผลลัพธ์ตาม cnt (แต่จำกัดสูงสุดเป็น 8)
-        - เพื่อประหยัด payload ตั้งค่า exclude เป็น minutely,hourly,alerts (ยังคงได้ current + daily)
+        - เพื่อประหยัด payload ค่า default ของ exclude คือ minutely,hourly,alerts (ยังคงได้ current + daily)
+          ส่วน alert scheduler (backend/alerts.py) ขอ hourly + alerts แทน
         """
         base = "https://api.openweathermap.org/data/3.0/onecall"
-        exclude = "minutely,hourly,alerts"
         params = {"lat": lat, "lon": lon, "exclude": exclude, "appid": api_key, "units": units, "lang": lang}
         try:
-            r = requests.get(base, params=params, timeout=10)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             # ชี้ชัดกรณี unauthorized (มักเพราะคีย์ไม่มีสิทธิ์ One Call by Call)
             if r.status_code == 401:
                 return {"error": "unauthorized", "status_code": 401, "message": "Unauthorized: API key invalid or lacks One Call 3.0 access (One Call by Call subscription required).", "body": r.text}
@@ -91,13 +374,15 @@ class WeatherTool:
             except Exception:
                 pass
             return data
+        except Timeout as e:
+            return {"error": "request_error", "timed_out": True, "message": str(e)}
         except RequestException as e:
             return {"error": "request_error", "message": str(e)}
         except Exception as e:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def _call_current_weather(lat, lon, api_key, units="metric", lang="th"):
+    def _call_current_weather(lat, lon, api_key, units="metric", lang="th", timeout=10):
         """
         Fallback: call current weather endpoint if daily forecast not available.
         ใช้ endpoint current weather ตามมาตรฐาน: /data/2.5/weather
@@ -105,16 +390,18 @@ class WeatherTool:
         base = "https://api.openweathermap.org/data/2.5/weather"
         params = {"lat": lat, "lon": lon, "appid": api_key, "units": units, "lang": lang}
         try:
-            r = requests.get(base, params=params, timeout=10)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             r.raise_for_status()
             return r.json()
+        except Timeout as e:
+            return {"error": "request_error", "timed_out": True, "message": str(e)}
         except RequestException as e:
             return {"error": "request_error", "message": str(e)}
         except Exception as e:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def _call_timemachine(lat, lon, dt, api_key, units="metric", lang="th"):
+    def _call_timemachine(lat, lon, dt, api_key, units="metric", lang="th", timeout=12):
         """
         Call: /data/3.0/onecall/timemachine?lat={lat}&lon={lon}&dt={time}&appid={API key}
         dt = unix timestamp (UTC). Data available from 1979-01-01 to 4 days ahead.
@@ -122,7 +409,7 @@ class WeatherTool:
         base = "https://api.openweathermap.org/data/3.0/onecall/timemachine"
         params = {"lat": lat, "lon": lon, "dt": int(dt), "appid": api_key, "units": units, "lang": lang}
         try:
-            r = requests.get(base, params=params, timeout=12)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             if r.status_code in (401, 403, 429):
                 return {"error": "http_error", "status_code": r.status_code, "body": r.text}
             r.raise_for_status()
@@ -133,7 +420,7 @@ class WeatherTool:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def _call_day_summary(lat, lon, date_str, api_key, tz=None, units="metric", lang="th"):
+    def _call_day_summary(lat, lon, date_str, api_key, tz=None, units="metric", lang="th", timeout=12):
         """
         Call: /data/3.0/onecall/day_summary?lat={lat}&lon={lon}&date={YYYY-MM-DD}&appid={API key}
         date available from 1979-01-02 up to 1.5 years ahead.
@@ -144,7 +431,7 @@ class WeatherTool:
         if tz:
             params["tz"] = tz
         try:
-            r = requests.get(base, params=params, timeout=12)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             if r.status_code in (401, 403, 429):
                 return {"error": "http_error", "status_code": r.status_code, "body": r.text}
             r.raise_for_status()
@@ -155,7 +442,7 @@ class WeatherTool:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def _call_overview(lat, lon, api_key, date_str=None, units="metric", lang="th"):
+    def _call_overview(lat, lon, api_key, date_str=None, units="metric", lang="th", timeout=12):
         """
         Call: /data/3.0/onecall/overview?lat={lat}&lon={lon}&date={YYYY-MM-DD}&appid={API key}
         Returns human-readable summary (today or tomorrow). If date omitted -> today.
@@ -165,7 +452,7 @@ class WeatherTool:
         if date_str:
             params["date"] = date_str
         try:
-            r = requests.get(base, params=params, timeout=12)
+            r = WeatherTool._http_get(base, params=params, timeout=timeout)
             if r.status_code in (401, 403, 429):
                 return {"error": "http_error", "status_code": r.status_code, "body": r.text}
             r.raise_for_status()
@@ -176,14 +463,18 @@ class WeatherTool:
             return {"error": type(e).__name__, "message": str(e)}
 
     @staticmethod
-    def fetch_weather_data(input_data):
+    def fetch_weather_data(input_data, deadline=None):
         """
         New behavior (OpenWeather-based):
          - If 'city' provided -> geocode city -> call daily forecast with cnt (default 3)
          - Else if 'province' provided -> treat as city name for geocoding -> same as above
          - Else if 'latitude' and 'longitude' provided -> call daily forecast directly
          - Else -> return invalid_input
+        Optional 'intent' / 'hours' / 'include_alerts' choose which One Call parts are requested
+        (see select_parts); 'daily_forecast' then holds just those parts, 'parts' lists them and
+        'parts_fetched_at' gives each part's upstream fetch time (unix seconds).
         Returns: {"weather_data": <openweather_json>} or {"error":..., "message":...}
+        deadline (optional tools.deadline.Deadline): every HTTP timeout is clamped to the remaining budget.
         """
         api_key = WeatherTool._get_api_key()
         if not api_key:
@@ -200,6 +491,8 @@ class WeatherTool:
         except Exception:
             cnt = 3
 
+        parts, hours = WeatherTool.select_parts(input_data)
+
         # Priority: city -> province -> coords
         city = input_data.get("city")
         province = input_data.get("province")
@@ -208,18 +501,52 @@ class WeatherTool:
 
         # helper to call forecast for given coords
         def _forecast_for_coords(lat_val, lon_val):
-            # try One Call endpoint first (ปัจจุบันใช้ URL และ exclude ตามเอกสาร)
-            daily = WeatherTool._call_daily_forecast(lat_val, lon_val, api_key, cnt=cnt)
-            if isinstance(daily, dict) and daily.get("error"):
-                # fallback to current weather
-                current = WeatherTool._call_current_weather(lat_val, lon_val, api_key)
-                return {"fallback_to_current": True, "current_weather": current, "daily_error": daily}
-            else:
-                return {"daily_forecast": daily}
+            if deadline is not None and deadline.expired(margin=0.5):
+                return {"error": "deadline_exceeded", "message": "Time budget exhausted before calling OpenWeather."}
+            # try One Call endpoint first: ขอเฉพาะ part ที่ intent ต้องใช้ และใช้ part ที่ cache ไว้ถ้ายังไม่หมดอายุ
+            # ถ้า breaker ของ One Call เปิดอยู่ จะข้ามไป current weather ทันทีโดยไม่ต้องรอ timeout
+            timeout = Deadline.timeout_for(deadline, 10)
+            daily, fetched_at = WeatherTool._onecall_parts(lat_val, lon_val, api_key, parts, cnt=cnt, hours=hours,
+                                                           timeout=timeout, budget_limited=timeout < 10)
+            if not (isinstance(daily, dict) and daily.get("error")):
+                # parts_fetched_at: แต่ละ part มี TTL ของตัวเอง -> ใช้สร้าง ETag / max-age (backend/http_cache.py)
+                res = {"daily_forecast": daily, "parts": list(parts), "parts_fetched_at": fetched_at}
+                WeatherTool._remember(lat_val, lon_val, res)
+                return res
+
+            # fallback to current weather (ถ้ายังมีเวลาเหลือ)
+            if deadline is not None and deadline.expired(margin=0.5):
+                WeatherTool._path_counters.incr("deadline_exceeded")
+                return {"error": "deadline_exceeded", "message": "Time budget exhausted before fallback to current weather.", "daily_error": daily}
+            WeatherTool._path_counters.incr("fallback_current")
+            timeout = Deadline.timeout_for(deadline, 10)
+            current = WeatherTool._guarded_call(
+                "current", lambda: WeatherTool._call_current_weather(lat_val, lon_val, api_key, timeout=timeout),
+                budget_limited=timeout < 10)
+            if not (isinstance(current, dict) and current.get("error")):
+                res = {"fallback_to_current": True, "current_weather": current, "daily_error": daily}
+                WeatherTool._remember(lat_val, lon_val, res)
+                return res
+
+            # ทั้งสอง endpoint ใช้ไม่ได้ -> ใช้ผลลัพธ์ล่าสุดที่เคยได้ (ถ้ามี)
+            cached = WeatherTool._recall(lat_val, lon_val)
+            if cached:
+                WeatherTool._path_counters.incr("stale_cache")
+                fetched_at, res = cached
+                return dict(res, from_cache=True, cache_age_seconds=int(time.time() - fetched_at), daily_error=daily, current_error=current)
+            WeatherTool._path_counters.incr("unavailable")
+            return {"fallback_to_current": True, "current_weather": current, "daily_error": daily}
+
+        def _geocode(name):
+            # เหมือน One Call: หมดงบเวลาแล้วไม่เรียก (timeout 0 ทำให้ requests โยน ValueError แทนที่จะบอกว่าหมดเวลา)
+            if deadline is not None and deadline.expired(margin=0.5):
+                WeatherTool._path_counters.incr("deadline_exceeded")
+                return {"error": "deadline_exceeded", "message": "Time budget exhausted before geocoding."}
+            return WeatherTool._geocode_location(name, api_key, timeout=Deadline.timeout_for(deadline, 10))
 
         # 1) city provided
         if city:
-            ge = WeatherTool._geocode_location(city, api_key)
+            ge = _geocode(city)
             if ge.get("error"):
                 return {"error": ge.get("error"), "message": ge.get("message")}
             lat_val, lon_val = ge["lat"], ge["lon"]
@@ -228,7 +555,7 @@ class WeatherTool:
 
         # 2) province provided (use geocoding too)
         if province:
-            ge = WeatherTool._geocode_location(province, api_key)
+            ge = _geocode(province)
             if ge.get("error"):
                 return {"error": ge.get("error"), "message": ge.get("message")}
             lat_val, lon_val = ge["lat"], ge["lon"]